@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'Live Chat AI Integration',
-    'version': '18.0.1.0.0',
+    'version': '18.0.1.1.0',
     'category': 'Website/Live Chat',
     'summary': 'Integrate Odoo livechat with OpenAI-compatible LLM APIs',
     'description': """
@@ -16,6 +16,7 @@ Features:
 * Direct LLM API calls (OpenAI, MiniMax, DeepSeek, Ollama, etc.)
 * Per-channel AI configuration (API key, model, system prompt)
 * Conversation history context for multi-turn dialogue
+* Knowledge base articles, searched per question so only relevant passages are sent
 * Per-channel bot partner with custom name
 * Configurable retry logic with error fallback messages
 * API call logging with token usage tracking
@@ -45,6 +46,9 @@ Settings > Live Chat > Channels > AI Integration tab
         # Views
         'views/im_livechat_channel_views.xml',
         'views/llm_api_log_views.xml',
+        'views/im_livechat_ai_job_views.xml',
+        'views/im_livechat_ai_knowledge_views.xml',
+        'views/llm_rate_limit_views.xml',
 
         # Data
         'data/ai_data.xml',
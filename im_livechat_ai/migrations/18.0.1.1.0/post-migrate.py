@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import api, SUPERUSER_ID
+from odoo.tools.sql import column_exists
+
+_logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def migrate(cr, version):
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    _migrate_payloads(env)
+    _sync_bot_partners(env)
+
+
+def _migrate_payloads(env):
+    """Move the payloads stored inline in llm_api_log to llm.api.payload."""
+    cr = env.cr
+    if not column_exists(cr, 'llm_api_log', 'request_payload'):
+        return
+    Payload = env['llm.api.payload']
+    migrated = 0
+    while True:
+        cr.execute("""
+            SELECT id, request_payload, response_payload FROM llm_api_log
+             WHERE request_payload IS NOT NULL OR response_payload IS NOT NULL
+             ORDER BY id
+             LIMIT %s
+        """, [BATCH_SIZE])
+        rows = cr.fetchall()
+        if not rows:
+            break
+        references = Payload._store([row[1] for row in rows] + [row[2] for row in rows])
+        cr.execute("""
+            UPDATE llm_api_log AS log
+               SET request_payload_ref = ref.request_ref,
+                   response_payload_ref = ref.response_ref,
+                   request_payload = NULL,
+                   response_payload = NULL
+              FROM (VALUES %s) AS ref (id, request_ref, response_ref)
+             WHERE log.id = ref.id
+        """ % ', '.join(['%s'] * len(rows)), [
+            (row[0], request_ref, response_ref)
+            for row, request_ref, response_ref in zip(rows, references, references[len(rows):])
+        ])
+        migrated += len(rows)
+    cr.execute("ALTER TABLE llm_api_log DROP COLUMN request_payload, DROP COLUMN response_payload")
+    _logger.info("Moved the payloads of %s LLM API logs to the payload store", migrated)
+
+
+def _sync_bot_partners(env):
+    """
+    Create or rename the bot partners of AI-enabled channels.
+
+    Partners are now synced when the config is saved rather than when a
+    reply is posted; channels enabled before that would otherwise keep
+    no (or a stale) bot partner until they are saved again.
+    """
+    channels = env['im_livechat.channel'].search([('ai_enabled', '=', True)])
+    channels._sync_ai_bot_partner()
+    _logger.info("Synced the bot partners of %s AI livechat channels", len(channels))
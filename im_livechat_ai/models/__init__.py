@@ -3,3 +3,10 @@
 from . import im_livechat_channel
 from . import discuss_channel
 from . import llm_api_log
+from . import llm_api_payload
+from . import im_livechat_ai_job
+from . import llm_circuit_breaker
+from . import mail_message
+from . import im_livechat_ai_knowledge
+from . import im_livechat_ai_endpoint
+from . import llm_rate_limit
@@ -1,16 +1,54 @@
 # -*- coding: utf-8 -*-
 
+import functools
 import html as html_lib
 import logging
 import re
+import threading
+import time
 
-from odoo import models
+import requests
+
+from odoo import fields, models
+
+from ..tools import circuit_breaker, context_cache, rate_limiter, tokenizer
 
 _logger = logging.getLogger(__name__)
 
 # Regex to strip HTML tags for building clean LLM context
 _HTML_TAG_RE = re.compile(r'<[^>]+>')
 
+# Messages that are part of the conversation sent to the LLM
+_CONTEXT_MESSAGE_DOMAIN_SQL = """
+    model = 'discuss.channel' AND res_id = %s AND message_type IN ('comment', 'email')
+"""
+
+
+# Summaries requested by this process and not finished yet, by (db, session)
+_summaries_in_flight = set()
+_summaries_lock = threading.Lock()
+
+SUMMARY_MAX_TOKENS = 512
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a customer support chat. Merge the previous "
+    "summary (if any) with the new messages into one concise summary, in the language "
+    "of the conversation. Keep the visitor's questions, facts they gave (names, order "
+    "numbers, products), what was answered and what is still open. Reply with the "
+    "summary only."
+)
+SUMMARY_CONTEXT_PREFIX = "Summary of the earlier conversation:\n"
+# The history window starts on multiples of max_history / HISTORY_WINDOW_STEPS
+HISTORY_WINDOW_STEPS = 4
+KNOWLEDGE_CONTEXT_PREFIX = (
+    "Knowledge base excerpts that may answer the visitor's latest question. "
+    "Rely on them when they are relevant:\n"
+)
+
+
+def _clean_body(body):
+    """Strip HTML tags and decode HTML entities for clean text."""
+    return html_lib.unescape(_HTML_TAG_RE.sub('', body or '')).strip()
+
 
 class DiscussChannel(models.Model):
     """
@@ -21,6 +59,19 @@ class DiscussChannel(models.Model):
     """
     _inherit = 'discuss.channel'
 
+    ai_summary = fields.Text(
+        string='AI Conversation Summary',
+        readonly=True,
+        copy=False,
+        help='Condensed older turns of the session, sent to the LLM instead of them',
+    )
+    ai_summary_message_id = fields.Integer(
+        string='AI Summary Covers Up To',
+        readonly=True,
+        copy=False,
+        help='Technical: ID of the last message condensed into the AI summary',
+    )
+
     def _notify_thread(self, message, msg_vals=False, **kwargs):
         """
         Override _notify_thread to trigger AI responses for visitor messages.
@@ -75,7 +126,7 @@ class DiscussChannel(models.Model):
         Bot exclusion checks come FIRST to prevent response loops,
         then visitor detection follows.
 
-        Exclusions (checked first):
+        Exclusions (checked first, see _get_ai_bot_partner_ids):
         - The channel's AI bot partner (prevents response loops)
         - The default AI bot partner (fallback)
         - OdooBot (base.partner_root)
@@ -89,21 +140,10 @@ class DiscussChannel(models.Model):
 
         # Exclude by author_id (partner-based bots)
         if message.author_id:
-            # Exclude the channel's AI bot partner
-            if self.livechat_channel_id.ai_bot_partner_id:
-                if message.author_id.id == self.livechat_channel_id.ai_bot_partner_id.id:
-                    return False
-
-            # Exclude default AI bot partner
-            default_bot = self.env.ref(
-                'im_livechat_ai.partner_ai_bot', raise_if_not_found=False,
+            bot_partner_ids = self.env['im_livechat.channel']._get_ai_bot_partner_ids(
+                self.livechat_channel_id.id, include_odoobot=True,
             )
-            if default_bot and message.author_id.id == default_bot.id:
-                return False
-
-            # Exclude OdooBot
-            odoobot = self.env.ref('base.partner_root', raise_if_not_found=False)
-            if odoobot and message.author_id.id == odoobot.id:
+            if message.author_id.id in bot_partner_ids:
                 return False
 
         # --- Visitor detection ---
@@ -125,7 +165,19 @@ class DiscussChannel(models.Model):
 
         Fetches the most recent N messages from this discuss.channel,
         determines the role for each (user vs assistant), and prepends
-        the system prompt.
+        the system prompt. When summarization is enabled, messages covered
+        by the session summary are replaced by it. The knowledge base chunks
+        most relevant to the visitor's latest messages are added as a system
+        message. With a context token budget on the channel,
+        older messages that do not fit are dropped as well (see
+        _fit_llm_messages_to_budget).
+
+        The layout keeps the start of the array identical from one turn to
+        the next, so providers' prompt caches can reuse it: the system
+        prompt and summary come first, the history window only moves in
+        steps (see _get_llm_history_window), and the knowledge snippets,
+        which change with every question, sit right before the visitor's
+        latest messages.
 
         Args:
             livechat_channel (im_livechat.channel): The livechat channel config
@@ -135,30 +187,11 @@ class DiscussChannel(models.Model):
         """
         max_history = max(1, min(livechat_channel.ai_max_history or 50, 200))
 
-        # Get bot partner ID for role assignment
-        bot_partner_id = None
-        if livechat_channel.ai_bot_partner_id:
-            bot_partner_id = livechat_channel.ai_bot_partner_id.id
+        # Bot partner IDs for role assignment (channel bot and default bot)
+        bot_partner_ids = self.env['im_livechat.channel']._get_ai_bot_partner_ids(livechat_channel.id)
 
-        # Also check default bot partner
-        default_bot = self.env.ref(
-            'im_livechat_ai.partner_ai_bot', raise_if_not_found=False,
-        )
-        default_bot_id = default_bot.id if default_bot else None
-
-        # Fetch recent messages ordered by id (chronological)
-        recent_messages = self.env['mail.message'].search(
-            [
-                ('res_id', '=', self.id),
-                ('model', '=', 'discuss.channel'),
-                ('message_type', 'in', ['comment', 'email']),
-            ],
-            order='id desc',
-            limit=max_history,
-        )
-
-        # Reverse to chronological order
-        recent_messages = recent_messages.sorted('id')
+        # Cleaned history, only new messages are read and cleaned
+        entry = self._get_llm_context_entry()
 
         # Build messages array
         llm_messages = []
@@ -170,26 +203,380 @@ class DiscussChannel(models.Model):
                 'content': livechat_channel.ai_system_prompt,
             })
 
-        for msg in recent_messages:
-            # Determine role
-            is_bot = False
-            if msg.author_id:
-                if bot_partner_id and msg.author_id.id == bot_partner_id:
-                    is_bot = True
-                elif default_bot_id and msg.author_id.id == default_bot_id:
-                    is_bot = True
-
-            role = 'assistant' if is_bot else 'user'
-
-            # Strip HTML tags and decode HTML entities for clean text
-            body = msg.body or ''
-            clean_body = html_lib.unescape(_HTML_TAG_RE.sub('', body)).strip()
-            if not clean_body:
-                continue
-
+        summarized_up_to = 0
+        if livechat_channel.ai_summary_enabled and self.ai_summary:
+            summarized_up_to = self.ai_summary_message_id
             llm_messages.append({
+                'role': 'system',
+                'content': SUMMARY_CONTEXT_PREFIX + self.ai_summary,
+            })
+
+        history = []
+        for message_id, author_id, clean_body in self._get_llm_history_window(entry, max_history):
+            if not clean_body or message_id <= summarized_up_to:
+                continue
+            role = 'assistant' if author_id in bot_partner_ids else 'user'
+            history.append({
                 'role': role,
                 'content': clean_body,
             })
 
+        knowledge = self._get_llm_knowledge_message(livechat_channel, history)
+        if livechat_channel.ai_context_token_budget:
+            history = self._fit_llm_messages_to_budget(
+                livechat_channel, llm_messages + ([knowledge] if knowledge else []), history,
+                step=self._get_llm_history_step(max_history),
+            )
+        if knowledge:
+            history.insert(len(history) - len(self._get_trailing_user_messages(history)), knowledge)
+        llm_messages.extend(history)
         return llm_messages
+
+    @staticmethod
+    def _get_llm_history_step(max_history):
+        return max(1, max_history // HISTORY_WINDOW_STEPS)
+
+    def _get_llm_history_window(self, entry, max_history):
+        """
+        Return the newest messages of the history window, oldest first.
+
+        Instead of sliding by one message every turn, the window starts at
+        a multiple of a step counted from the first message of the session.
+        It holds between max_history - step + 1 and max_history messages
+        and its first message stays the same for step turns, so the
+        messages sent before the new ones do not change in between.
+
+        Args:
+            entry (ContextEntry): Cleaned history of the session
+            max_history (int): Maximum number of messages in the window
+
+        Returns:
+            list: (message_id, author_id, clean_body) tuples
+        """
+        step = self._get_llm_history_step(max_history)
+        first = max(0, entry.count - max_history)
+        start = -(-first // step) * step
+        # entry.messages holds the last messages of the session only
+        offset = entry.count - len(entry.messages)
+        return entry.messages[max(0, start - offset):]
+
+    @staticmethod
+    def _get_trailing_user_messages(history):
+        """Return the visitor messages posted since the last bot reply."""
+        trailing = []
+        for message in reversed(history):
+            if message['role'] != 'user':
+                break
+            trailing.insert(0, message)
+        return trailing
+
+    def _get_llm_knowledge_message(self, livechat_channel, history):
+        """
+        Return a system message with the knowledge base chunks relevant to
+        the visitor's latest messages, or None if nothing matches.
+
+        Args:
+            livechat_channel (im_livechat.channel): The livechat channel config
+            history (list): Conversation messages, oldest first
+        """
+        question = '\n'.join(m['content'] for m in self._get_trailing_user_messages(history))
+        results = livechat_channel._search_ai_knowledge(question)
+        if not results:
+            return None
+        excerpts = '\n\n'.join('### %s\n%s' % (title, text) for title, text, _score in results)
+        return {'role': 'system', 'content': KNOWLEDGE_CONTEXT_PREFIX + excerpts}
+
+    def _fit_llm_messages_to_budget(self, livechat_channel, system_messages, history, step=1):
+        """
+        Keep the newest history messages that fit in the channel's token budget.
+
+        The budget is the channel's context window minus the reply
+        (ai_max_tokens), the system messages and the chat format overhead.
+        The newest message is always kept, truncated if it alone exceeds
+        the budget. Older messages are dropped by multiples of step, so
+        the first message sent only changes every few turns.
+
+        Args:
+            livechat_channel (im_livechat.channel): The livechat channel config
+            system_messages (list): Messages sent besides the history
+            history (list): Conversation messages in chronological order
+            step (int): Number of messages dropped at a time
+
+        Returns:
+            list: The messages of history to send, in chronological order
+        """
+        counter = tokenizer.get_tokenizer(livechat_channel.ai_model)
+        available = (
+            livechat_channel.ai_context_token_budget
+            - (livechat_channel.ai_max_tokens or 0)
+            - tokenizer.REPLY_OVERHEAD
+            - sum(tokenizer.count_message_tokens(counter, message) for message in system_messages)
+        )
+        kept = []
+        for message in reversed(history):
+            cost = tokenizer.count_message_tokens(counter, message)
+            if cost > available:
+                if not kept and available > tokenizer.MESSAGE_OVERHEAD:
+                    # A single oversized message (e.g. a pasted log): send its beginning
+                    kept.append(dict(message, content=counter.truncate(
+                        message['content'], available - tokenizer.MESSAGE_OVERHEAD,
+                    )))
+                break
+            kept.append(message)
+            available -= cost
+        dropped = -(-(len(history) - len(kept)) // step) * step
+        if len(history) - dropped >= 1:
+            kept = kept[:len(history) - dropped]
+        if len(kept) < len(history):
+            _logger.debug(
+                "AI context of session %s trimmed to %d/%d messages to fit %d tokens",
+                self.id, len(kept), len(history), livechat_channel.ai_context_token_budget,
+            )
+        kept.reverse()
+        return kept
+
+    def _get_llm_context_entry(self):
+        """
+        Return the cleaned message history of this session.
+
+        Histories are kept in a process-wide LRU cache. On each turn only
+        the messages posted since the last call are read and cleaned. The
+        cached part is checked against a count and max(write_date)
+        aggregate of the database, so an edited or deleted message (in
+        any process) causes a rebuild.
+
+        Returns:
+            ContextEntry: messages as (id, author_id, clean_body) tuples
+        """
+        self.ensure_one()
+        self.env['mail.message'].flush_model(['model', 'res_id', 'message_type', 'body', 'author_id'])
+        cr = self.env.cr
+        key = (cr.dbname, self.id)
+        cache = context_cache.conversation_cache
+        entry = cache.get(key)
+        if entry is not None:
+            cr.execute(
+                "SELECT count(*), max(write_date) FROM mail_message WHERE id <= %s AND "
+                + _CONTEXT_MESSAGE_DOMAIN_SQL,
+                [entry.last_id, self.id],
+            )
+            if tuple(cr.fetchone()) != (entry.count, entry.max_write_date):
+                entry = None
+        cache.record(hit=entry is not None)
+
+        if entry is None:
+            cr.execute(
+                "SELECT count(*), max(write_date), max(id) FROM mail_message WHERE " + _CONTEXT_MESSAGE_DOMAIN_SQL,
+                [self.id],
+            )
+            count, max_write_date, last_id = cr.fetchone()
+            cr.execute(
+                "SELECT id, author_id, body FROM mail_message WHERE id <= %s AND "
+                + _CONTEXT_MESSAGE_DOMAIN_SQL
+                + " ORDER BY id DESC LIMIT %s",
+                [last_id or 0, self.id, context_cache.MAX_MESSAGES_PER_SESSION],
+            )
+            messages = [(mid, author_id, _clean_body(body)) for mid, author_id, body in reversed(cr.fetchall())]
+            entry = context_cache.ContextEntry(last_id or 0, count, max_write_date, messages)
+        else:
+            cr.execute(
+                "SELECT id, author_id, body, write_date FROM mail_message WHERE id > %s AND "
+                + _CONTEXT_MESSAGE_DOMAIN_SQL
+                + " ORDER BY id",
+                [entry.last_id, self.id],
+            )
+            entry = entry.extended([
+                (mid, author_id, _clean_body(body), write_date)
+                for mid, author_id, body, write_date in cr.fetchall()
+            ])
+        cache.put(key, entry)
+        return entry
+
+    # --- Conversation Summary ---
+
+    def _get_messages_to_summarize(self, livechat_channel):
+        """
+        Return the messages to condense into the summary, if it needs a refresh.
+
+        Nothing is returned until more than ai_summary_threshold messages
+        are not covered by the summary; then all but the most recent half
+        of them are returned.
+
+        Returns:
+            list: (message_id, author_id, clean_body) tuples, oldest first
+        """
+        self.ensure_one()
+        threshold = livechat_channel.ai_summary_threshold or 40
+        pending = [
+            message for message in self._get_llm_context_entry().messages
+            if message[0] > self.ai_summary_message_id and message[2]
+        ]
+        if len(pending) <= threshold:
+            return []
+        return pending[:-(threshold // 2) or None]
+
+    def _schedule_ai_summary_refresh(self, livechat_channel):
+        """Refresh the summary in the AI worker pool once the current transaction commits."""
+        self.ensure_one()
+        if not self._get_messages_to_summarize(livechat_channel):
+            return
+        pool = livechat_channel._get_ai_worker_pool()
+        self.env.cr.postcommit.add(functools.partial(
+            pool.submit, self._refresh_ai_summary, livechat_channel.id, self.id,
+        ))
+
+    def _refresh_ai_summary(self, livechat_channel_id, discuss_channel_id):
+        """
+        Summarize older turns of a session, off the reply path.
+
+        Runs in a worker thread like the replies: the LLM call is made
+        between two short transactions, without holding a cursor. A
+        concurrent refresh of the same session is skipped in this process
+        and discarded when saving in the others.
+        """
+        key = (self.pool.db_name, discuss_channel_id)
+        with _summaries_lock:
+            if key in _summaries_in_flight:
+                return
+            _summaries_in_flight.add(key)
+        Channel = self.env['im_livechat.channel']
+        try:
+            request = Channel._run_ai_transaction(
+                self._prepare_ai_summary, livechat_channel_id, discuss_channel_id,
+            )
+            if not request:
+                return
+            result = self._execute_ai_summary(
+                request,
+                reserve_rate_limit=lambda config, tokens: Channel._run_ai_transaction(
+                    Channel._reserve_rate_limit, config, tokens,
+                ),
+            )
+            if result:
+                Channel._run_ai_transaction(self._save_ai_summary, request, *result)
+        except Exception as e:
+            _logger.error("Unexpected error refreshing AI summary of session %s: %s",
+                          discuss_channel_id, e, exc_info=True)
+        finally:
+            with _summaries_lock:
+                _summaries_in_flight.discard(key)
+
+    def _execute_ai_summary(self, request, reserve_rate_limit):
+        """
+        Make the summarization call, like a reply, through the circuit
+        breaker and the rate limit of the endpoint. Must not touch the
+        database.
+
+        The summary is postponed to a later message while the circuit is
+        not closed or the rate limit is saturated (or could not be
+        reserved).
+
+        Args:
+            request (dict): Request returned by _prepare_ai_summary; receives
+                'response_time' and 'rate_limit_release' (unused tokens)
+            reserve_rate_limit (callable): See im_livechat.channel._execute_ai_request
+
+        Returns:
+            tuple|None: (summary, response_data, error), or None if postponed
+        """
+        Channel = self.env['im_livechat.channel']
+        config = request['config']
+        breaker = Channel._get_request_breaker(request)
+        if breaker.state != circuit_breaker.STATE_CLOSED:
+            _logger.info("AI summary of session %s postponed: circuit not closed", request['discuss_channel_id'])
+            return None
+        tokens = 0
+        if config.get('rpm_limit') or config.get('tpm_limit'):
+            tokens = rate_limiter.estimate_tokens(config, request['messages'])
+            wait = reserve_rate_limit(config, tokens)
+            if wait is None or wait is False:
+                _logger.info("AI summary of session %s postponed: rate limit saturated",
+                             request['discuss_channel_id'])
+                return None
+            if wait:
+                time.sleep(wait)
+        start_time = time.time()
+        try:
+            response_data = Channel._send_llm_request(config, request['messages'])
+            summary = Channel._strip_think_tags(
+                response_data.get('choices', [{}])[0].get('message', {}).get('content', ''),
+            )
+            error = None if summary else 'Empty summary from LLM API'
+            breaker.record_success()
+            used = (response_data.get('usage') or {}).get('total_tokens') or tokens
+        except Exception as e:
+            response_data, summary, error = None, None, str(e)
+            if circuit_breaker.is_provider_failure(e):
+                breaker.record_failure()
+            elif isinstance(e, (requests.RequestException, ValueError)):
+                breaker.record_success()  # the provider answered
+            # A failed call uses a request but (almost) no tokens
+            used = 0
+        request['response_time'] = time.time() - start_time
+        request['rate_limit_release'] = tokens - used
+        return summary, response_data, error
+
+    def _prepare_ai_summary(self, env, livechat_channel_id, discuss_channel_id):
+        """Build the summarization request; returns None if no refresh is needed."""
+        livechat_channel = env['im_livechat.channel'].browse(livechat_channel_id).exists()
+        session = env['discuss.channel'].browse(discuss_channel_id).exists()
+        if not livechat_channel or not session:
+            return None
+        to_summarize = session._get_messages_to_summarize(livechat_channel)
+        if not to_summarize:
+            return None
+
+        bot_partner_ids = env['im_livechat.channel']._get_ai_bot_partner_ids(livechat_channel.id)
+        transcript = '\n'.join(
+            '%s: %s' % ('Assistant' if author_id in bot_partner_ids else 'Visitor', body)
+            for _message_id, author_id, body in to_summarize
+        )
+        content = transcript
+        if session.ai_summary:
+            content = 'Previous summary:\n%s\n\nNew messages:\n%s' % (session.ai_summary, transcript)
+        config = dict(livechat_channel._get_llm_request_config(), max_tokens=SUMMARY_MAX_TOKENS)
+        return {
+            'channel_id': livechat_channel.id,
+            'discuss_channel_id': session.id,
+            'config': config,
+            'circuit': env['llm.circuit.breaker']._get_settings(),
+            'messages': [
+                {'role': 'system', 'content': SUMMARY_INSTRUCTIONS},
+                {'role': 'user', 'content': content},
+            ],
+            'covered_message_id': to_summarize[-1][0],
+            'previous_message_id': session.ai_summary_message_id,
+        }
+
+    def _save_ai_summary(self, env, request, summary, response_data, error):
+        """
+        Store a new summary unless another refresh got there first, log the
+        call and mirror its outcome to the shared breaker and rate limit.
+        """
+        Channel = env['im_livechat.channel']
+        config = request['config']
+        env['llm.circuit.breaker']._save_breaker(config, Channel._get_request_breaker(request))
+        if request.get('rate_limit_release'):
+            env['llm.rate.limit']._release(config, tokens=request['rate_limit_release'])
+        session = env['discuss.channel'].browse(request['discuss_channel_id']).exists()
+        if summary and session and session.ai_summary_message_id == request['previous_message_id']:
+            session.write({
+                'ai_summary': summary,
+                'ai_summary_message_id': request['covered_message_id'],
+            })
+        usage = (response_data or {}).get('usage', {})
+        Channel._create_api_log(
+            env,
+            channel_id=request['channel_id'],
+            discuss_channel_id=request['discuss_channel_id'],
+            model_name=request['config']['model'],
+            api_base_url=request['config']['base_url'],
+            status='success' if summary else 'error',
+            request_payload=request['messages'],
+            response_payload=response_data,
+            prompt_tokens=usage.get('prompt_tokens', 0),
+            completion_tokens=usage.get('completion_tokens', 0),
+            total_tokens=usage.get('total_tokens', 0),
+            response_time=request.get('response_time'),
+            error_message=error,
+        )
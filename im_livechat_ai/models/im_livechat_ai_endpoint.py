@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError, ValidationError
+
+from ..tools import endpoint_router, http_session
+
+
+class ImLivechatAiEndpoint(models.Model):
+    """
+    Additional LLM endpoint of a livechat channel.
+
+    The channel's own API settings are its first endpoint; these records
+    add fallbacks, tried when a call times out or the provider answers
+    with a 5xx or 429 error. With the latency routing policy, calls are
+    sent to the endpoint with the lowest average response time instead.
+    """
+    _name = 'im_livechat_ai.endpoint'
+    _description = 'AI Endpoint'
+    _order = 'sequence, id'
+    _rec_name = 'base_url'
+
+    sequence = fields.Integer(string='Sequence', default=10)
+    active = fields.Boolean(string='Active', default=True)
+    livechat_channel_id = fields.Many2one(
+        comodel_name='im_livechat.channel',
+        string='Livechat Channel',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    base_url = fields.Char(
+        string='API Base URL',
+        required=True,
+        help='Base URL for the OpenAI-compatible API (e.g., https://api.openai.com/v1)',
+    )
+    api_key = fields.Char(
+        string='API Key',
+        groups='base.group_system',
+        copy=False,
+    )
+    model = fields.Char(
+        string='Model',
+        help='Model to request from this endpoint (defaults to the channel model)',
+    )
+    weight = fields.Integer(
+        string='Weight',
+        default=1,
+        help='With latency routing, an endpoint of weight 2 is preferred until it is twice as slow',
+    )
+    rate_limit_rpm = fields.Integer(
+        string='Requests per Minute',
+        default=0,
+        help='Limit of requests per minute of this API key (0 = no limit)',
+    )
+    rate_limit_tpm = fields.Integer(
+        string='Tokens per Minute',
+        default=0,
+        help='Limit of tokens per minute of this API key (0 = no limit)',
+    )
+    average_response_time = fields.Float(
+        string='Avg. Response Time (s)',
+        compute='_compute_average_response_time',
+        digits=(16, 2),
+        help='Moving average of the response times measured by this server process',
+    )
+
+    @api.constrains('base_url')
+    def _check_base_url(self):
+        """Validate API base URL format."""
+        for record in self:
+            if not (record.base_url or '').strip().startswith(('http://', 'https://')):
+                raise UserError(_('API Base URL must start with http:// or https://'))
+
+    @api.constrains('weight')
+    def _check_weight(self):
+        """Validate weight is within reasonable bounds."""
+        for record in self:
+            if record.weight < 1 or record.weight > 100:
+                raise ValidationError(_('Endpoint weight must be between 1 and 100.'))
+
+    @api.constrains('rate_limit_rpm', 'rate_limit_tpm')
+    def _check_rate_limit(self):
+        """Validate the rate limits are not negative."""
+        for record in self:
+            if record.rate_limit_rpm < 0 or record.rate_limit_tpm < 0:
+                raise ValidationError(_('Rate limits cannot be negative.'))
+
+    @api.depends('base_url', 'model', 'livechat_channel_id.ai_model')
+    def _compute_average_response_time(self):
+        for record in self:
+            config = {'base_url': record.base_url, 'model': record.model or record.livechat_channel_id.ai_model}
+            record.average_response_time = endpoint_router.latency_tracker.get(config) or 0.0
+
+    def write(self, vals):
+        endpoints = set()
+        if 'base_url' in vals or 'api_key' in vals:
+            endpoints = set(self.mapped('base_url'))
+        res = super().write(vals)
+        # Drop pooled connections that were opened with the old URL or key
+        for base_url in endpoints:
+            if base_url:
+                http_session.session_pool.invalidate(base_url)
+        return res
+
+    def _get_request_config(self, channel_config):
+        """
+        Return the request settings of this endpoint.
+
+        Args:
+            channel_config (dict): Settings of the channel, from
+                im_livechat.channel._get_llm_request_config
+
+        Returns:
+            dict: channel_config with this endpoint's URL, key, model,
+                weight and rate limits
+        """
+        self.ensure_one()
+        endpoint = self.sudo()
+        return dict(
+            channel_config,
+            base_url=endpoint.base_url,
+            api_key=endpoint.api_key,
+            model=endpoint.model or channel_config['model'],
+            weight=endpoint.weight,
+            rpm_limit=endpoint.rate_limit_rpm,
+            tpm_limit=endpoint.rate_limit_tpm,
+            endpoint_id=endpoint.id,
+        )
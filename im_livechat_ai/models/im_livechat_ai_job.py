@@ -0,0 +1,432 @@
+# -*- coding: utf-8 -*-
+
+import functools
+import logging
+import time
+from datetime import timedelta
+
+from odoo import api, fields, models, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+# First key of the two-key advisory locks serializing claims per session
+SESSION_LOCK_NAMESPACE = 0x4c434149  # 'LCAI'
+
+
+class ImLivechatAiJob(models.Model):
+    """
+    Durable queue of pending AI replies.
+
+    A job is created in the same transaction as the visitor's message, so
+    it survives worker restarts, prefork recycling and limit_time_real
+    kills. Jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED, which
+    lets every Odoo process (and node) work the queue concurrently without
+    two of them picking the same job. A claimed job holds a lease; if its
+    worker dies, the lease expires and the job is claimed again until
+    max_attempts is reached.
+
+    At most one job per chat session runs at a time (single-flight): a job
+    whose session already has a running job waits in the queue behind it,
+    so replies are generated one after the other and posted in order.
+    """
+    _name = 'im_livechat_ai.job'
+    _description = 'AI Reply Job'
+    _order = 'id desc'
+
+    livechat_channel_id = fields.Many2one(
+        comodel_name='im_livechat.channel',
+        string='Livechat Channel',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    discuss_channel_id = fields.Many2one(
+        comodel_name='discuss.channel',
+        string='Chat Session',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    message_id = fields.Many2one(
+        comodel_name='mail.message',
+        string='Visitor Message',
+        ondelete='set null',
+        help='The visitor message that triggered this job',
+    )
+    state = fields.Selection(
+        selection=[
+            ('pending', 'Pending'),
+            ('running', 'Running'),
+            ('done', 'Done'),
+            ('cancelled', 'Cancelled'),
+            ('failed', 'Failed'),
+        ],
+        string='State',
+        default='pending',
+        required=True,
+        index=True,
+    )
+    scheduled_at = fields.Datetime(
+        string='Scheduled At',
+        default=fields.Datetime.now,
+        required=True,
+        index=True,
+        help='The job is not claimed before this time; visitor messages arriving '
+             'before it are coalesced into the same job',
+    )
+    coalesced_count = fields.Integer(
+        string='Coalesced Messages',
+        default=1,
+        help='Number of visitor messages answered by this job',
+    )
+    attempt_count = fields.Integer(
+        string='Attempts',
+        default=0,
+        help='Number of times this job has been claimed by a worker',
+    )
+    max_attempts = fields.Integer(
+        string='Max Attempts',
+        default=3,
+        help='The job fails once it has been claimed this many times without completing',
+    )
+    lease_expiry = fields.Datetime(
+        string='Lease Expiry',
+        help='A running job whose lease has expired is considered abandoned and claimed again',
+    )
+    date_done = fields.Datetime(string='Finished On')
+    last_error = fields.Text(string='Last Error')
+
+    # --- Enqueue / Dispatch ---
+
+    @api.model
+    def _enqueue(self, livechat_channel, discuss_channel, message=None):
+        """
+        Queue an AI reply for a livechat session.
+
+        With a debounce window configured on the livechat channel, the job
+        is scheduled at the end of the window, and messages arriving before
+        then are coalesced into the same pending job, which is pushed back
+        each time. The job becomes visible to workers when the current
+        transaction commits; a worker of this process is woken up when it
+        is due.
+
+        Returns:
+            im_livechat_ai.job: The new or coalesced job
+        """
+        delay = max(0.0, livechat_channel.ai_debounce_delay or 0.0)
+        scheduled_at = fields.Datetime.now() + timedelta(seconds=delay)
+        job = self._find_pending_job(discuss_channel) if delay else self.browse()
+        if job:
+            job.write({
+                'scheduled_at': scheduled_at,
+                'message_id': message.id if message else job.message_id.id,
+                'coalesced_count': job.coalesced_count + 1,
+            })
+        else:
+            job = self.sudo().create({
+                'livechat_channel_id': livechat_channel.id,
+                'discuss_channel_id': discuss_channel.id,
+                'message_id': message.id if message else False,
+                'scheduled_at': scheduled_at,
+            })
+        postcommit = self.env.cr.postcommit
+        dispatch_key = 'im_livechat_ai.dispatch.%s' % delay
+        if not postcommit.data.get(dispatch_key):
+            postcommit.data[dispatch_key] = True
+            # Resolve the pool now: the cursor must not be used after commit
+            pool = self.env['im_livechat.channel']._get_ai_worker_pool()
+            postcommit.add(functools.partial(self._dispatch, pool, delay))
+        return job
+
+    @api.model
+    def _find_pending_job(self, discuss_channel):
+        """
+        Return the pending job of a session, locked for coalescing.
+
+        A job being claimed right now is skipped: the visitor's new message
+        then gets its own job, which supersedes the running one.
+        """
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT id FROM im_livechat_ai_job
+             WHERE discuss_channel_id = %s AND state = 'pending'
+             ORDER BY id DESC
+             LIMIT 1
+               FOR UPDATE SKIP LOCKED
+        """, [discuss_channel.id])
+        row = self.env.cr.fetchone()
+        return self.sudo().browse(row[0]) if row else self.browse()
+
+    def _is_superseded(self):
+        """
+        Whether a newer job exists for the same session.
+
+        The newer job answers the whole conversation, including the
+        messages this job was created for, so this job's reply is dropped.
+        """
+        self.ensure_one()
+        return bool(self.search_count([
+            ('discuss_channel_id', '=', self.discuss_channel_id.id),
+            ('id', '>', self.id),
+            ('state', 'in', ('pending', 'running')),
+        ], limit=1))
+
+    def _dispatch(self, pool=None, delay=0):
+        """
+        Hand queue processing to the AI worker pool of this process.
+
+        If the pool is saturated the jobs simply stay pending and are
+        picked up by another process or by the scheduled action.
+        """
+        pool = pool or self.env['im_livechat.channel']._get_ai_worker_pool()
+        # Wake up slightly after the due time: scheduled_at has second precision
+        if not pool.schedule(delay + 1 if delay else 0, self._drain_queue):
+            _logger.warning("AI job dispatch deferred: worker pool saturated (%s)", pool.format_stats())
+
+    def _drain_queue(self, max_jobs=20, time_budget=None):
+        """
+        Claim and process jobs one by one until the queue is empty.
+
+        Runs outside of any request cursor (worker thread or cron); every
+        step opens its own short transaction.
+
+        With the async engine, claimed jobs are handed to its event loop
+        instead of being run here, and claiming continues until the queue
+        is empty or the engine is full; max_jobs then does not apply. A
+        new drain is triggered as soon as one of its jobs ends, to claim
+        the next job of its session or fill the freed slot.
+
+        Args:
+            max_jobs (int): Maximum number of jobs to process in this call
+            time_budget (float|None): Stop claiming new jobs after this many seconds
+
+        Returns:
+            int: Number of jobs processed
+        """
+        started = time.monotonic()
+        processed = 0
+        engine = pool = None
+        while engine is not None or processed < max_jobs:
+            if time_budget is not None and time.monotonic() - started > time_budget:
+                break
+            with self.pool.cursor() as cr:
+                # The single-flight check must see claims committed while
+                # this transaction waited for the session lock
+                cr.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                if not processed:
+                    engine = env['im_livechat.channel']._get_ai_async_engine()
+                    if engine is not None:
+                        pool = env['im_livechat.channel']._get_ai_worker_pool()
+                if engine is not None and not engine.has_capacity():
+                    engine.notify_when_free(functools.partial(pool.submit, self._drain_queue))
+                    break
+                claimed = env['im_livechat_ai.job']._claim(limit=1)
+                cr.commit()
+            if not claimed:
+                break
+            if engine is None or not engine.submit(self._run_claimed_job_async, engine, pool, claimed[0]):
+                self._run_claimed_job(claimed[0])
+            processed += 1
+        return processed
+
+    def _run_claimed_job(self, job_data):
+        """Run the AI pipeline for a job returned by _claim."""
+        self.env['im_livechat.channel']._process_ai_response(
+            self.pool.db_name,
+            job_data['livechat_channel_id'],
+            job_data['discuss_channel_id'],
+            job_id=job_data['id'],
+        )
+
+    async def _run_claimed_job_async(self, engine, pool, job_data):
+        """
+        Run the AI pipeline for a job returned by _claim on the async engine.
+
+        Once the job ends, the queue is drained again through the worker
+        pool, as the thread path does after each job: a follow-up job of
+        the same session, skipped while this one was running, is claimed
+        right away rather than by the next run of the scheduled action.
+        """
+        try:
+            await self.env['im_livechat.channel']._process_ai_response_async(
+                engine,
+                job_data['livechat_channel_id'],
+                job_data['discuss_channel_id'],
+                job_id=job_data['id'],
+            )
+        finally:
+            # The pool may block when full: keep it off the loop thread
+            await engine.run_db(self._dispatch, pool)
+
+    # --- Claiming ---
+
+    @api.model
+    def _get_lease_seconds(self):
+        """
+        Initial lease of a claimed job.
+
+        It only has to cover the preparation and first call of the job:
+        the worker renews the lease before each LLM call and retry wait
+        (see _renew_lease), however long the retries of the job take.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        try:
+            return max(60, int(ICP.get_param('im_livechat_ai.job_lease_seconds', 1200)))
+        except ValueError:
+            return 1200
+
+    @api.model
+    def _claim(self, limit=1):
+        """
+        Atomically claim runnable jobs for the current transaction's worker.
+
+        Due pending jobs and running jobs whose lease expired are eligible; rows
+        locked by a concurrent claimer are skipped rather than waited on.
+        Abandoned jobs that already used all their attempts are failed.
+
+        A job is only claimed if no other job of its session is running.
+        Claimers of the same session are serialized by a transaction-level
+        advisory lock, and the running check is a separate statement issued
+        after the lock is taken, so under READ COMMITTED it sees any claim
+        committed by the previous lock holder.
+
+        Returns:
+            list: dicts with id, livechat_channel_id, discuss_channel_id and attempt_count
+        """
+        cr = self.env.cr
+        self.flush_model()
+        cr.execute("""
+            UPDATE im_livechat_ai_job
+               SET state = 'failed',
+                   date_done = (now() at time zone 'UTC'),
+                   last_error = 'Lease expired after the last attempt',
+                   write_date = (now() at time zone 'UTC')
+             WHERE id IN (
+                   SELECT id FROM im_livechat_ai_job
+                    WHERE state = 'running'
+                      AND lease_expiry < (now() at time zone 'UTC')
+                      AND attempt_count >= max_attempts
+                      FOR UPDATE SKIP LOCKED)
+        """)
+        # Fetch more candidates than needed: some may belong to busy sessions
+        cr.execute("""
+            SELECT id, discuss_channel_id FROM im_livechat_ai_job
+             WHERE (state = 'pending'
+                    OR (state = 'running' AND lease_expiry < (now() at time zone 'UTC')))
+               -- scheduled_at is set from the wall clock, not the transaction start
+               AND scheduled_at <= (statement_timestamp() at time zone 'UTC')
+             ORDER BY id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, [max(limit * 4, 20)])
+        candidates = cr.fetchall()
+
+        claimed = []
+        busy_sessions = set()
+        lease_seconds = self._get_lease_seconds()
+        for job_id, session_id in candidates:
+            if len(claimed) >= limit:
+                break
+            if session_id in busy_sessions:
+                continue
+            busy_sessions.add(session_id)
+            if not self._try_lock_session(session_id) or self._session_has_running_job(session_id, job_id):
+                continue
+            cr.execute("""
+                UPDATE im_livechat_ai_job
+                   SET state = 'running',
+                       attempt_count = attempt_count + 1,
+                       lease_expiry = (now() at time zone 'UTC') + make_interval(secs => %s),
+                       write_date = (now() at time zone 'UTC')
+                 WHERE id = %s
+             RETURNING id, livechat_channel_id, discuss_channel_id, attempt_count
+            """, [lease_seconds, job_id])
+            claimed.extend(cr.dictfetchall())
+        self.invalidate_model(['state', 'attempt_count', 'lease_expiry'])
+        return claimed
+
+    @api.model
+    def _try_lock_session(self, session_id):
+        """Take the session's claim lock until the end of the transaction, without waiting."""
+        self.env.cr.execute(
+            "SELECT pg_try_advisory_xact_lock(%s, %s)", [SESSION_LOCK_NAMESPACE, session_id],
+        )
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _session_has_running_job(self, session_id, exclude_job_id):
+        """
+        Whether another job of the session is running with a live lease.
+
+        Live workers renew their lease before each call and retry wait
+        (see _renew_lease), so only a job whose worker died lets the
+        next job of its session start.
+        """
+        self.env.cr.execute("""
+            SELECT 1 FROM im_livechat_ai_job
+             WHERE discuss_channel_id = %s
+               AND id != %s
+               AND state = 'running'
+               AND lease_expiry >= (now() at time zone 'UTC')
+             LIMIT 1
+        """, [session_id, exclude_job_id])
+        return bool(self.env.cr.fetchone())
+
+    # --- State Transitions ---
+
+    def _mark_done(self, state='done'):
+        """Complete the job; called in the transaction that posts the reply."""
+        self.write({
+            'state': state,
+            'date_done': fields.Datetime.now(),
+            'lease_expiry': False,
+        })
+
+    def _renew_lease(self, seconds):
+        """
+        Extend the lease of running jobs to at least seconds from now.
+
+        Called by the worker, in its own short transaction, before each
+        LLM call and retry wait, so that a job retrying for longer than
+        its initial lease is neither reclaimed and answered twice nor
+        joined by a second job of its session.
+        """
+        if not self:
+            return
+        self.flush_recordset(['state', 'lease_expiry'])
+        self.env.cr.execute("""
+            UPDATE im_livechat_ai_job
+               SET lease_expiry = greatest(lease_expiry, (now() at time zone 'UTC') + make_interval(secs => %s))
+             WHERE id IN %s AND state = 'running'
+        """, [seconds, tuple(self.ids)])
+        self.invalidate_recordset(['lease_expiry'])
+
+    def _release(self, error):
+        """Give a job back to the queue after an unexpected error, or fail it."""
+        for job in self:
+            if job.attempt_count < job.max_attempts:
+                job.write({'state': 'pending', 'lease_expiry': False, 'last_error': error})
+            else:
+                job.write({
+                    'state': 'failed',
+                    'lease_expiry': False,
+                    'last_error': error,
+                    'date_done': fields.Datetime.now(),
+                })
+
+    # --- Scheduled Actions ---
+
+    @api.model
+    def _cron_process_jobs(self):
+        """Pick up jobs left behind by saturated pools or dead workers."""
+        return self._drain_queue(max_jobs=100, time_budget=50)
+
+    @api.autovacuum
+    def _gc_finished_jobs(self):
+        """Delete finished jobs after a week."""
+        cutoff = fields.Datetime.now() - timedelta(days=7)
+        self.search([
+            ('state', 'in', ('done', 'cancelled', 'failed')),
+            ('write_date', '<', cutoff),
+        ]).unlink()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, fields, models
+
+# Changing any of these requires rebuilding the channel's index
+INDEXED_FIELDS = {'name', 'content', 'active', 'livechat_channel_id'}
+
+
+class ImLivechatAiKnowledge(models.Model):
+    """
+    Knowledge base article of a livechat channel.
+
+    Articles are split into chunks and indexed for BM25 search when they
+    are saved (see im_livechat.channel._rebuild_ai_knowledge_index); at
+    reply time only the chunks most relevant to the visitor's question
+    are sent to the LLM, instead of the whole knowledge base.
+    """
+    _name = 'im_livechat_ai.knowledge'
+    _description = 'AI Knowledge Base Article'
+    _order = 'sequence, id'
+
+    name = fields.Char(string='Title', required=True)
+    sequence = fields.Integer(string='Sequence', default=10)
+    active = fields.Boolean(string='Active', default=True)
+    livechat_channel_id = fields.Many2one(
+        comodel_name='im_livechat.channel',
+        string='Livechat Channel',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    content = fields.Text(
+        string='Content',
+        required=True,
+        help='Plain text; blank lines separate paragraphs, which are kept together when chunking',
+    )
+    chunk_count = fields.Integer(
+        string='Chunks',
+        readonly=True,
+        help='Number of indexed chunks the article was split into',
+    )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        articles = super().create(vals_list)
+        articles.livechat_channel_id._rebuild_ai_knowledge_index()
+        return articles
+
+    def write(self, vals):
+        channels = self.livechat_channel_id
+        res = super().write(vals)
+        if INDEXED_FIELDS.intersection(vals):
+            (channels | self.livechat_channel_id)._rebuild_ai_knowledge_index()
+        return res
+
+    def unlink(self):
+        channels = self.livechat_channel_id
+        res = super().unlink()
+        channels.exists()._rebuild_ai_knowledge_index()
+        return res
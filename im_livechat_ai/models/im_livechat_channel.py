@@ -1,20 +1,39 @@
 # -*- coding: utf-8 -*-
 
-import json
+import asyncio
+import base64
+import functools
 import logging
 import re
-import threading
 import time
 
 import psycopg2
 import requests
 from markupsafe import Markup
 
-from odoo import api, fields, models, _, SUPERUSER_ID
+from odoo import api, fields, models, tools, _, SUPERUSER_ID
 from odoo.exceptions import UserError, ValidationError
 
+from ..tools import (
+    async_engine, circuit_breaker, endpoint_router, http_session, knowledge_index, rate_limiter, response_cache,
+    retry, semantic_cache, streaming, worker_pool,
+)
+
 _logger = logging.getLogger(__name__)
 
+# Changing any of these makes the replies stored for similar questions stale
+SEMANTIC_CACHE_KEY_FIELDS = {'ai_system_prompt', 'ai_model', 'ai_semantic_cache_embedder'}
+
+# Seconds to wait for a reply from the LLM API
+LLM_REQUEST_TIMEOUT = 180
+# Seconds added to the lease a queued job renews before each call or wait
+JOB_LEASE_MARGIN = 60
+
+# Steps yielded by _iter_ai_request, carried out by the engine driving it
+STEP_SLEEP = 'sleep'
+STEP_RESERVE = 'reserve'
+STEP_CALL = 'call'
+
 
 class ImLivechatChannel(models.Model):
     """
@@ -55,6 +74,116 @@ class ImLivechatChannel(models.Model):
         default=50,
         help='Maximum number of recent messages to include as conversation context (1-200)',
     )
+    ai_context_token_budget = fields.Integer(
+        string='Context Window (tokens)',
+        default=0,
+        help='Token limit of the model context window. The newest messages that fit in it, '
+             'after reserving Max Tokens for the reply and the system prompt, are sent '
+             '(0 = no limit, only Max History Messages applies)',
+    )
+    ai_summary_enabled = fields.Boolean(
+        string='Summarize Long Conversations',
+        default=False,
+        help='Condense older turns of long sessions into a summary sent instead of them. '
+             'The summary is refreshed in the background after a reply',
+    )
+    ai_summary_threshold = fields.Integer(
+        string='Summarize After (messages)',
+        default=40,
+        help='Refresh the summary once this many messages are not covered by it; '
+             'the most recent half of them stays verbatim (10-200)',
+    )
+    ai_response_cache_enabled = fields.Boolean(
+        string='Cache Replies',
+        default=False,
+        help='Answer a repeated question from a cache of previous replies, keyed on the '
+             'system prompt, model, temperature and the last turns of the conversation',
+    )
+    ai_response_cache_ttl = fields.Integer(
+        string='Cache Lifetime (seconds)',
+        default=3600,
+        help='How long a cached reply may be reused (60-604800)',
+    )
+    ai_response_cache_turns = fields.Integer(
+        string='Cache Key Turns',
+        default=3,
+        help='Number of trailing conversation messages that must match for a cache hit (1-20)',
+    )
+    ai_semantic_cache_enabled = fields.Boolean(
+        string='Answer Similar Questions',
+        default=False,
+        help='Answer the opening question of a session with the reply given to a similar '
+             'previous question, compared by embedding similarity (requires numpy)',
+    )
+    ai_semantic_cache_threshold = fields.Float(
+        string='Similarity Threshold',
+        default=semantic_cache.DEFAULT_THRESHOLD,
+        help='Minimum cosine similarity with a previous question to reuse its reply (0.5-1.0)',
+    )
+    ai_semantic_cache_embedder = fields.Selection(
+        selection='_get_semantic_embedder_selection',
+        string='Embedding Backend',
+        default='hashing',
+        help='Computes the question vectors; the local hashing backend works offline',
+    )
+    ai_semantic_cache_data = fields.Binary(
+        string='Similar Questions Cache',
+        attachment=True,
+        copy=False,
+        groups='base.group_system',
+    )
+    ai_rate_limit_rpm = fields.Integer(
+        string='Requests per Minute',
+        default=0,
+        help='Limit of requests per minute of the API key; calls above it wait for their turn '
+             'instead of failing with HTTP 429 (0 = no limit)',
+    )
+    ai_rate_limit_tpm = fields.Integer(
+        string='Tokens per Minute',
+        default=0,
+        help='Limit of tokens per minute of the API key, counted from the prompt and Max Tokens '
+             'and corrected with the reported usage (0 = no limit)',
+    )
+    ai_endpoint_ids = fields.One2many(
+        comodel_name='im_livechat_ai.endpoint',
+        inverse_name='livechat_channel_id',
+        string='Fallback Endpoints',
+        help='Other OpenAI-compatible endpoints, called when the API above times out or fails',
+    )
+    ai_routing_policy = fields.Selection(
+        selection=[
+            (endpoint_router.POLICY_PRIORITY, 'Failover in Order'),
+            (endpoint_router.POLICY_LATENCY, 'Lowest Latency'),
+        ],
+        string='Endpoint Routing',
+        default=endpoint_router.POLICY_PRIORITY,
+        required=True,
+        help='Failover in Order: the API above serves every call, fallback endpoints are tried in '
+             'order when it fails. Lowest Latency: calls go to the endpoint with the lowest '
+             'average response time divided by its weight',
+    )
+    ai_knowledge_ids = fields.One2many(
+        comodel_name='im_livechat_ai.knowledge',
+        inverse_name='livechat_channel_id',
+        string='Knowledge Base',
+        help='Articles searched for every question; only the most relevant chunks are sent to the LLM',
+    )
+    ai_knowledge_top_k = fields.Integer(
+        string='Knowledge Snippets',
+        default=knowledge_index.DEFAULT_TOP_K,
+        help='Number of knowledge base chunks most relevant to the question sent with it (1-10)',
+    )
+    ai_knowledge_index = fields.Binary(
+        string='Knowledge Base Index',
+        attachment=True,
+        copy=False,
+        groups='base.group_system',
+    )
+    ai_knowledge_index_version = fields.Integer(
+        string='Knowledge Base Index Version',
+        readonly=True,
+        copy=False,
+    )
     ai_temperature = fields.Float(
         string='Temperature',
         default=0.7,
@@ -73,13 +202,36 @@ class ImLivechatChannel(models.Model):
     ai_retry_delay = fields.Integer(
         string='Retry Delay (seconds)',
         default=2,
-        help='Delay between retry attempts in seconds (1-30)',
+        help='Base delay of the exponential backoff between retry attempts in seconds (1-30); '
+             'a Retry-After header sent by the provider takes precedence',
     )
     ai_error_message = fields.Text(
         string='Error Message',
         default='Sorry, the AI assistant is temporarily unavailable. Please try again later or leave your contact information.',
         help='Message sent to visitor when the AI API call fails after all retries',
     )
+    ai_circuit_state = fields.Selection(
+        selection=[
+            ('closed', 'Closed'),
+            ('open', 'Open'),
+            ('half_open', 'Half-Open'),
+        ],
+        string='Circuit Breaker',
+        compute='_compute_ai_circuit_state',
+        help='Closed: the LLM endpoint is healthy. Open: it failed repeatedly and replies '
+             'fail fast with the error message. Half-Open: a probe request is allowed',
+    )
+    ai_debounce_delay = fields.Float(
+        string='Debounce Window (seconds)',
+        default=0.0,
+        help='Wait this long after a visitor message before answering; messages sent '
+             'in the meantime are answered together in a single LLM call (0-30, 0 = off)',
+    )
+    ai_stream_enabled = fields.Boolean(
+        string='Stream Replies',
+        default=False,
+        help='Request a streamed response and show the reply in the chat while it is being generated',
+    )
     ai_bot_partner_id = fields.Many2one(
         comodel_name='res.partner',
         string='Bot Partner',
@@ -111,6 +263,56 @@ class ImLivechatChannel(models.Model):
                 if record.ai_max_history < 0 or record.ai_max_history > 200:
                     raise ValidationError(_('Max History Messages must be between 0 and 200.'))
 
+    @api.constrains('ai_context_token_budget', 'ai_max_tokens')
+    def _check_ai_context_token_budget(self):
+        """Validate the context window leaves room for the conversation."""
+        for record in self:
+            if record.ai_enabled and record.ai_context_token_budget:
+                if record.ai_context_token_budget <= record.ai_max_tokens:
+                    raise ValidationError(_('Context Window must be larger than Max Tokens.'))
+
+    @api.constrains('ai_summary_threshold')
+    def _check_ai_summary_threshold(self):
+        """Validate summary threshold range."""
+        for record in self:
+            if record.ai_enabled and record.ai_summary_enabled:
+                if record.ai_summary_threshold < 10 or record.ai_summary_threshold > 200:
+                    raise ValidationError(_('Summarize After must be between 10 and 200 messages.'))
+
+    @api.constrains('ai_response_cache_ttl', 'ai_response_cache_turns')
+    def _check_ai_response_cache(self):
+        """Validate response cache settings."""
+        for record in self:
+            if record.ai_enabled and record.ai_response_cache_enabled:
+                if record.ai_response_cache_ttl < 60 or record.ai_response_cache_ttl > 604800:
+                    raise ValidationError(_('Cache Lifetime must be between 60 and 604800 seconds.'))
+                if record.ai_response_cache_turns < 1 or record.ai_response_cache_turns > 20:
+                    raise ValidationError(_('Cache Key Turns must be between 1 and 20.'))
+
+    @api.constrains('ai_semantic_cache_enabled', 'ai_semantic_cache_threshold')
+    def _check_ai_semantic_cache(self):
+        """Validate the similar questions settings."""
+        for record in self:
+            if record.ai_enabled and record.ai_semantic_cache_enabled:
+                if not semantic_cache.is_available():
+                    raise ValidationError(_('Answering similar questions requires the numpy Python package.'))
+                if record.ai_semantic_cache_threshold < 0.5 or record.ai_semantic_cache_threshold > 1.0:
+                    raise ValidationError(_('Similarity threshold must be between 0.5 and 1.0.'))
+
+    @api.constrains('ai_rate_limit_rpm', 'ai_rate_limit_tpm')
+    def _check_ai_rate_limit(self):
+        """Validate the rate limits are not negative."""
+        for record in self:
+            if record.ai_rate_limit_rpm < 0 or record.ai_rate_limit_tpm < 0:
+                raise ValidationError(_('Rate limits cannot be negative.'))
+
+    @api.constrains('ai_knowledge_top_k')
+    def _check_ai_knowledge_top_k(self):
+        """Validate the number of knowledge snippets is within reasonable bounds."""
+        for record in self:
+            if record.ai_enabled and (record.ai_knowledge_top_k < 1 or record.ai_knowledge_top_k > 10):
+                raise ValidationError(_('Knowledge snippets must be between 1 and 10.'))
+
     @api.constrains('ai_temperature')
     def _check_ai_temperature(self):
         """Validate temperature range."""
@@ -143,6 +345,21 @@ class ImLivechatChannel(models.Model):
                 if record.ai_retry_delay < 1 or record.ai_retry_delay > 30:
                     raise ValidationError(_('Retry Delay must be between 1 and 30 seconds.'))
 
+    @api.depends('ai_api_base_url', 'ai_model')
+    def _compute_ai_circuit_state(self):
+        Breaker = self.env['llm.circuit.breaker']
+        for record in self:
+            breaker = Breaker._find(record.ai_api_base_url, record.ai_model)
+            record.ai_circuit_state = breaker._get_current_state() if breaker else 'closed'
+
+    @api.constrains('ai_debounce_delay')
+    def _check_ai_debounce_delay(self):
+        """Validate debounce window range."""
+        for record in self:
+            if record.ai_enabled:
+                if record.ai_debounce_delay < 0 or record.ai_debounce_delay > 30:
+                    raise ValidationError(_('Debounce Window must be between 0 and 30 seconds.'))
+
     @api.constrains('ai_enabled', 'ai_api_base_url', 'ai_api_key', 'ai_model')
     def _check_ai_required_fields(self):
         """Validate required fields when AI is enabled."""
@@ -155,8 +372,91 @@ class ImLivechatChannel(models.Model):
                 if not record.ai_model:
                     raise UserError(_('Model is required when AI integration is enabled.'))
 
+    # --- CRUD ---
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        channels = super().create(vals_list)
+        if any('ai_bot_partner_id' in vals for vals in vals_list):
+            self.env.registry.clear_cache()
+        channels.filtered('ai_enabled')._sync_ai_bot_partner()
+        return channels
+
+    def write(self, vals):
+        endpoints = set()
+        if 'ai_api_base_url' in vals or 'ai_api_key' in vals:
+            endpoints = set(self.sudo().mapped('ai_api_base_url'))
+        res = super().write(vals)
+        # Drop pooled connections that were opened with the old URL or key
+        for base_url in endpoints:
+            if base_url:
+                http_session.session_pool.invalidate(base_url)
+        if 'ai_bot_partner_id' in vals:
+            # Invalidate _get_ai_bot_partner_ids in every worker
+            self.env.registry.clear_cache()
+        if 'ai_enabled' in vals or 'ai_bot_name' in vals:
+            self.filtered('ai_enabled')._sync_ai_bot_partner()
+        if SEMANTIC_CACHE_KEY_FIELDS.intersection(vals):
+            # Replies given with another prompt, model or embedder are stale
+            self.action_clear_semantic_cache()
+        return res
+
     # --- Bot Partner Management ---
 
+    @api.model
+    @tools.ormcache('livechat_channel_id', 'include_odoobot')
+    def _get_ai_bot_partner_ids(self, livechat_channel_id, include_odoobot=False):
+        """
+        Return the ids of the partners posting as a bot in a livechat channel.
+
+        Cached per process so that the message-post hot path does no
+        lookup; the cache is cleared when ai_bot_partner_id changes.
+
+        Args:
+            livechat_channel_id (int): ID of the im_livechat.channel
+            include_odoobot (bool): Also include OdooBot (base.partner_root)
+
+        Returns:
+            frozenset: The channel's bot partner and the default AI bot partner
+        """
+        partner_ids = set()
+        channel = self.sudo().browse(livechat_channel_id).exists()
+        if channel.ai_bot_partner_id:
+            partner_ids.add(channel.ai_bot_partner_id.id)
+        default_bot = self.env.ref('im_livechat_ai.partner_ai_bot', raise_if_not_found=False)
+        if default_bot:
+            partner_ids.add(default_bot.id)
+        if include_odoobot:
+            odoobot = self.env.ref('base.partner_root', raise_if_not_found=False)
+            if odoobot:
+                partner_ids.add(odoobot.id)
+        return frozenset(partner_ids)
+
+    def _sync_ai_bot_partner(self):
+        """
+        Create or rename the bot partners when the channel config is saved.
+
+        Keeping this out of the reply path means replies only read
+        ai_bot_partner_id: no partner write (and row lock) per reply, and
+        no partner created concurrently by background threads.
+        """
+        for channel in self:
+            channel._get_or_create_bot_partner()
+
+    def _get_ai_bot_author(self):
+        """
+        Return the partner posting the AI replies of this channel.
+
+        Read-only: falls back to the default AI bot if the channel has no
+        bot partner (e.g. it was deleted since the config was saved).
+        """
+        self.ensure_one()
+        return (
+            self.ai_bot_partner_id
+            or self.env.ref('im_livechat_ai.partner_ai_bot', raise_if_not_found=False)
+            or self.env.ref('base.partner_root')
+        )
+
     def _get_or_create_bot_partner(self):
         """
         Get or create the bot partner for this channel.
@@ -185,6 +485,140 @@ class ImLivechatChannel(models.Model):
         self.write({'ai_bot_partner_id': partner.id})
         return partner
 
+    # --- Similar Questions Cache ---
+
+    @api.model
+    def _get_semantic_embedder_selection(self):
+        return semantic_cache.get_embedder_selection()
+
+    def _get_semantic_cache_attachment(self):
+        self.ensure_one()
+        return self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', '=', self.id),
+            ('res_field', '=', 'ai_semantic_cache_data'),
+        ], limit=1)
+
+    def _load_semantic_cache(self, embedder):
+        """
+        Return the process cache of similar questions, reloaded from the
+        filestore when another worker saved a newer version.
+
+        Pairs added in this process and not saved yet are merged into the
+        stored version rather than overwritten by it.
+        """
+        self.ensure_one()
+        cache = semantic_cache.get_cache(self.id, embedder)
+        attachment = self._get_semantic_cache_attachment()
+        checksum = attachment.checksum or None
+        if checksum == cache.checksum:
+            return cache
+        loaded = attachment and semantic_cache.SemanticCache.loads(attachment.raw, embedder)
+        if cache.dirty:
+            cache.rebase(loaded or None, checksum)
+            return cache
+        if not loaded:
+            loaded = semantic_cache.SemanticCache(embedder.name, embedder.dim)
+        loaded.mark_saved(0, checksum)
+        semantic_cache.set_cache(self.id, loaded)
+        return loaded
+
+    def _save_semantic_cache(self, embedder):
+        """
+        Store new question/answer pairs in the filestore, at most every SAVE_INTERVAL.
+
+        The pairs are first merged into the stored version, so that the
+        pairs saved by other workers in the meantime are kept. They only
+        count as saved once the transaction storing them is committed.
+        """
+        self.ensure_one()
+        cache = semantic_cache.get_cache(self.id, embedder)
+        if not cache.should_save():
+            return
+        # Serialize the savers of the channel: each one merges into the
+        # version committed by the previous one
+        self.env.cr.execute("SELECT id FROM im_livechat_channel WHERE id = %s FOR NO KEY UPDATE", [self.id])
+        cache = self._load_semantic_cache(embedder)
+        version, data = cache.dumps()
+        self.sudo().ai_semantic_cache_data = base64.b64encode(data)
+        checksum = self._get_semantic_cache_attachment().checksum
+        self.env.cr.postcommit.add(functools.partial(cache.mark_saved, version, checksum))
+
+    def _get_semantic_cache_request(self, messages):
+        """
+        Settings of the similar questions lookup for a conversation.
+
+        Only the opening question of a session is looked up: later
+        questions depend on the earlier answers, which a reply given in
+        another session does not know.
+
+        Returns:
+            dict|bool: 'question', 'threshold' and 'embedder', or False
+        """
+        self.ensure_one()
+        if not self.ai_semantic_cache_enabled or not semantic_cache.is_available():
+            return False
+        turns = [m for m in messages if m['role'] != 'system']
+        # A greeting posted by the bot before the visitor writes does not count
+        while turns and turns[0]['role'] == 'assistant':
+            turns.pop(0)
+        if not turns or any(m['role'] != 'user' for m in turns):
+            return False
+        self._load_semantic_cache(semantic_cache.get_embedder(self.ai_semantic_cache_embedder))
+        return {
+            'question': '\n'.join(m['content'] for m in turns),
+            'threshold': self.ai_semantic_cache_threshold,
+            'embedder': self.ai_semantic_cache_embedder,
+        }
+
+    # --- Knowledge Base ---
+
+    def _rebuild_ai_knowledge_index(self):
+        """
+        Chunk the active knowledge base articles and store their BM25 index.
+
+        The index is stored compressed in the filestore; bumping
+        ai_knowledge_index_version makes every process load the new one.
+        """
+        for channel in self.sudo():
+            articles = self.env['im_livechat_ai.knowledge'].sudo().search([
+                ('livechat_channel_id', '=', channel.id),
+            ])
+            for article in articles:
+                chunk_count = len(knowledge_index.chunk_text(article.content))
+                if article.chunk_count != chunk_count:
+                    article.chunk_count = chunk_count
+            index = knowledge_index.KnowledgeIndex.build([(a.name, a.content) for a in articles])
+            channel.write({
+                'ai_knowledge_index': base64.b64encode(index.dumps()) if len(index) else False,
+                'ai_knowledge_index_version': channel.ai_knowledge_index_version + 1,
+            })
+
+    def _get_ai_knowledge_index(self):
+        """Return the channel's knowledge base index, loaded once per version."""
+        self.ensure_one()
+        if not self.ai_knowledge_index_version:
+            return None
+
+        def load():
+            data = self.sudo().ai_knowledge_index
+            return knowledge_index.KnowledgeIndex.loads(base64.b64decode(data)) if data else None
+
+        return knowledge_index.index_cache.get((self.id, self.ai_knowledge_index_version), load)
+
+    def _search_ai_knowledge(self, query):
+        """
+        Return the knowledge base chunks most relevant to a question.
+
+        Returns:
+            list: (title, text, score) tuples, best first
+        """
+        self.ensure_one()
+        index = self._get_ai_knowledge_index()
+        if not index or not query:
+            return []
+        return index.search(query, max(1, min(self.ai_knowledge_top_k or knowledge_index.DEFAULT_TOP_K, 10)))
+
     # --- Response Processing ---
 
     @staticmethod
@@ -214,9 +648,11 @@ class ImLivechatChannel(models.Model):
 
     def _trigger_ai_response(self, discuss_channel, message):
         """
-        Trigger AI response asynchronously in a separate thread.
+        Queue an AI response for the session as a durable job.
 
         This method is non-blocking to avoid slowing down chat operations.
+        The job is committed together with the visitor's message and then
+        processed by the AI worker pool (see im_livechat_ai.job).
 
         Args:
             discuss_channel (discuss.channel): The livechat session
@@ -234,24 +670,84 @@ class ImLivechatChannel(models.Model):
             )
             return
 
-        # Capture IDs and config for thread context
-        channel_id = self.id
-        discuss_channel_id = discuss_channel.id
-        db_name = self.env.cr.dbname
+        self.env['im_livechat_ai.job']._enqueue(self, discuss_channel, message)
+
+    @api.model
+    def _get_ai_worker_pool(self):
+        """
+        Return the process-wide AI worker pool configured from system parameters.
+
+        Parameters (Settings > Technical > System Parameters):
+        - im_livechat_ai.worker_pool_size: max concurrent AI jobs per process
+        - im_livechat_ai.worker_queue_size: max jobs waiting for a worker
+        - im_livechat_ai.worker_queue_policy: 'reject' (shed load) or
+          'block' (wait briefly for a free slot) when the queue is full
 
-        thread = threading.Thread(
-            target=self._process_ai_response,
-            args=(db_name, channel_id, discuss_channel_id),
-            daemon=True,
+        Returns:
+            AIWorkerPool: The shared pool
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        try:
+            max_workers = int(ICP.get_param('im_livechat_ai.worker_pool_size', worker_pool.DEFAULT_MAX_WORKERS))
+            max_queue = int(ICP.get_param('im_livechat_ai.worker_queue_size', worker_pool.DEFAULT_MAX_QUEUE))
+        except ValueError:
+            _logger.warning("Invalid AI worker pool parameters, using defaults")
+            max_workers, max_queue = worker_pool.DEFAULT_MAX_WORKERS, worker_pool.DEFAULT_MAX_QUEUE
+        policy = ICP.get_param('im_livechat_ai.worker_queue_policy', worker_pool.POLICY_REJECT)
+        return worker_pool.get_worker_pool(
+            max_workers=max(1, max_workers),
+            max_queue=max(1, max_queue),
+            policy=policy,
         )
-        thread.start()
 
-    def _process_ai_response(self, db_name, channel_id, discuss_channel_id, test_env=None):
+    @api.model
+    def _get_ai_worker_pool_stats(self):
+        """Return active/queued/rejected counters of this process' AI worker pool."""
+        return self._get_ai_worker_pool().stats()
+
+    @api.model
+    def _get_ai_async_engine(self):
+        """
+        Return the process-wide async engine, if enabled in system parameters.
+
+        Parameters (Settings > Technical > System Parameters):
+        - im_livechat_ai.llm_engine: 'thread' (default) runs each AI job in
+          a worker pool thread; 'async' multiplexes the jobs' LLM calls on
+          one asyncio event loop per process (requires httpx)
+        - im_livechat_ai.async_max_in_flight: max concurrent AI jobs per
+          process on the async engine
+
+        Returns:
+            AsyncLLMEngine|None: None when the thread engine is used
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        if ICP.get_param('im_livechat_ai.llm_engine', async_engine.ENGINE_THREAD) != async_engine.ENGINE_ASYNC:
+            return None
+        if not async_engine.is_available():
+            _logger.warning("AI async engine requires the httpx library, using worker threads")
+            return None
+        try:
+            max_in_flight = int(ICP.get_param(
+                'im_livechat_ai.async_max_in_flight', async_engine.DEFAULT_MAX_IN_FLIGHT,
+            ))
+        except ValueError:
+            _logger.warning("Invalid AI async engine parameters, using defaults")
+            max_in_flight = async_engine.DEFAULT_MAX_IN_FLIGHT
+        return async_engine.get_engine(max_in_flight=max(1, max_in_flight))
+
+    def _process_ai_response(self, db_name, channel_id, discuss_channel_id, test_env=None, job_id=None):
         """
         Process AI response in a background thread.
 
-        Opens a new database cursor, builds conversation context,
-        calls the LLM API with retry logic, and posts the response.
+        The pipeline runs in three phases so that a database connection is
+        only held while the database is actually used:
+
+        1. Read the channel config and conversation context in a short
+           transaction (_prepare_ai_request).
+        2. Call the LLM API, including retries and their delays, with no
+           cursor held (_execute_ai_request).
+        3. Post the reply and write the API logs in a second short
+           transaction (_finalize_ai_response).
 
         Args:
             db_name (str): Database name
@@ -259,11 +755,104 @@ class ImLivechatChannel(models.Model):
             discuss_channel_id (int): ID of the discuss.channel session
             test_env (api.Environment|None): If provided, use this environment
                 instead of creating a new cursor. Used for testing only.
+            job_id (int|None): The im_livechat_ai.job being processed, completed
+                in the same transaction that posts the reply
         """
         if test_env is not None:
             self._do_process_ai_response(test_env, channel_id, discuss_channel_id)
             return
 
+        try:
+            request = self._run_ai_transaction(
+                self._prepare_ai_request, channel_id, discuss_channel_id, job_id,
+            )
+            if not request:
+                if job_id:
+                    self._run_ai_transaction(self._finish_ai_job, job_id, 'cancelled')
+                return
+            request['job_id'] = job_id
+            publisher = None
+            if request['stream']:
+                publisher = streaming.ThrottledPublisher(
+                    lambda text: self._run_ai_transaction(self._publish_partial_reply, request, text)
+                )
+            result = self._execute_ai_request(
+                request,
+                on_partial_reply=publisher,
+                reserve_rate_limit=lambda config, tokens: self._run_ai_transaction(
+                    self._reserve_rate_limit, config, tokens,
+                ),
+                renew_lease=(lambda seconds: self._run_ai_transaction(
+                    self._renew_ai_job_lease, job_id, seconds,
+                )) if job_id else None,
+            )
+            self._run_ai_transaction(self._finalize_ai_response, request, result)
+        except Exception as e:
+            _logger.error("Unexpected error in AI response thread: %s", e, exc_info=True)
+            if job_id:
+                self._run_ai_transaction(self._release_ai_job, job_id, str(e))
+
+    async def _process_ai_response_async(self, engine, channel_id, discuss_channel_id, job_id=None):
+        """
+        Run the pipeline of _process_ai_response on the async engine.
+
+        The prepare and finalize transactions run in the engine's DB
+        threads, the LLM call on its event loop (see
+        _execute_ai_request_async).
+
+        Args:
+            engine (AsyncLLMEngine): The engine running this coroutine
+            channel_id (int): ID of the im_livechat.channel
+            discuss_channel_id (int): ID of the discuss.channel session
+            job_id (int|None): The im_livechat_ai.job being processed
+        """
+        try:
+            request = await engine.run_db(
+                self._run_ai_transaction, self._prepare_ai_request, channel_id, discuss_channel_id, job_id,
+            )
+            if not request:
+                if job_id:
+                    await engine.run_db(self._run_ai_transaction, self._finish_ai_job, job_id, 'cancelled')
+                return
+            request['job_id'] = job_id
+            publisher = None
+            if request['stream']:
+                publisher = streaming.ThrottledPublisher(
+                    lambda text: self._run_ai_transaction(self._publish_partial_reply, request, text)
+                )
+            result = await self._execute_ai_request_async(request, engine, on_partial_reply=publisher)
+            await engine.run_db(self._run_ai_transaction, self._finalize_ai_response, request, result)
+        except Exception as e:
+            _logger.error("Unexpected error in async AI job: %s", e, exc_info=True)
+            if job_id:
+                await engine.run_db(self._run_ai_transaction, self._release_ai_job, job_id, str(e))
+
+    def _finish_ai_job(self, env, job_id, state='done'):
+        """Mark a queued job as finished, if it still exists."""
+        job = env['im_livechat_ai.job'].browse(job_id).exists()
+        if job:
+            job._mark_done(state)
+
+    def _renew_ai_job_lease(self, env, job_id, seconds):
+        """Keep a queued job leased for the next seconds (see im_livechat_ai.job._renew_lease)."""
+        env['im_livechat_ai.job'].browse(job_id)._renew_lease(seconds)
+
+    def _release_ai_job(self, env, job_id, error):
+        """Return a queued job to the queue after an unexpected error."""
+        job = env['im_livechat_ai.job'].browse(job_id).exists()
+        if job:
+            job._release(error)
+
+    def _run_ai_transaction(self, func, *args):
+        """
+        Run func(env, *args) in its own short transaction and commit it.
+
+        Serialization failures (e.g. with the main thread's message_post
+        updating last_interest_dt) are retried with exponential backoff.
+
+        Returns:
+            The return value of func, or None if all attempts failed
+        """
         max_commit_retries = 5
         for commit_attempt in range(max_commit_retries):
             try:
@@ -272,9 +861,9 @@ class ImLivechatChannel(models.Model):
                     # the main thread's message_post updating last_interest_dt
                     cr.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
                     env = api.Environment(cr, SUPERUSER_ID, {})
-                    self._do_process_ai_response(env, channel_id, discuss_channel_id)
+                    result = func(env, *args)
                     cr.commit()
-                return  # Success
+                return result
             except psycopg2.errors.SerializationFailure:
                 if commit_attempt < max_commit_retries - 1:
                     backoff = 1.0 * (2 ** commit_attempt)  # 1s, 2s, 4s, 8s
@@ -286,62 +875,321 @@ class ImLivechatChannel(models.Model):
                     time.sleep(backoff)
                 else:
                     _logger.error("Serialization failure in AI thread after %d attempts", max_commit_retries)
-            except Exception as e:
-                _logger.error("Unexpected error in AI response thread: %s", e, exc_info=True)
-                return
+        return None
 
     def _do_process_ai_response(self, env, channel_id, discuss_channel_id):
         """
         Core logic for processing an AI response.
 
-        Separated from _process_ai_response to allow testing without
-        a separate database cursor.
+        Runs the three phases of _process_ai_response within a single
+        environment, to allow testing without a separate database cursor.
+
+        Args:
+            env (api.Environment): Environment to use
+            channel_id (int): ID of the im_livechat.channel
+            discuss_channel_id (int): ID of the discuss.channel session
+        """
+        request = self._prepare_ai_request(env, channel_id, discuss_channel_id)
+        if not request:
+            return
+        publisher = None
+        if request['stream']:
+            publisher = streaming.ThrottledPublisher(
+                lambda text: self._publish_partial_reply(env, request, text)
+            )
+        result = self._execute_ai_request(
+            request,
+            on_partial_reply=publisher,
+            reserve_rate_limit=lambda config, tokens: self._reserve_rate_limit(env, config, tokens),
+        )
+        self._finalize_ai_response(env, request, result)
+
+    def _prepare_ai_request(self, env, channel_id, discuss_channel_id, job_id=None):
+        """
+        Phase 1: read everything the LLM call needs into plain Python data.
 
         Args:
             env (api.Environment): Environment to use
             channel_id (int): ID of the im_livechat.channel
             discuss_channel_id (int): ID of the discuss.channel session
+            job_id (int|None): The im_livechat_ai.job being processed
+
+        Returns:
+            dict|None: The request context, or None if there is nothing to answer
         """
         channel = env['im_livechat.channel'].browse(channel_id)
         if not channel.exists():
             _logger.warning("AI response: channel %s no longer exists", channel_id)
-            return
+            return None
 
         discuss_channel = env['discuss.channel'].browse(discuss_channel_id)
         if not discuss_channel.exists():
             _logger.warning("AI response: session %s no longer exists", discuss_channel_id)
-            return
+            return None
 
-        # Build conversation messages (with retry if visitor msg not yet committed)
+        job = env['im_livechat_ai.job'].browse(job_id).exists() if job_id else None
+        if job and job._is_superseded():
+            _logger.info("AI response: job %s superseded by a newer message, skipped", job_id)
+            return None
+
+        # Jobs are dispatched after the visitor's message is committed, and
+        # claimed in a new transaction, so the message is always visible here
         messages = discuss_channel._build_llm_messages(channel)
-        user_messages = [m for m in messages if m.get('role') == 'user']
-        if not user_messages:
-            # Visitor message may not be committed yet — wait and retry
-            for wait_attempt in range(5):
-                time.sleep(0.5 * (wait_attempt + 1))
-                env.cr.rollback()  # Reset transaction to see new commits
-                discuss_channel = env['discuss.channel'].browse(discuss_channel_id)
-                messages = discuss_channel._build_llm_messages(channel)
-                user_messages = [m for m in messages if m.get('role') == 'user']
-                if user_messages:
-                    break
-            if not user_messages:
-                _logger.warning(
-                    "AI response: no user messages found in channel %s after retries",
-                    discuss_channel_id,
+        if not any(m.get('role') == 'user' for m in messages):
+            _logger.warning("AI response: no user messages found in channel %s", discuss_channel_id)
+            return None
+
+        config = channel._get_llm_request_config()
+        endpoints = channel._get_llm_endpoint_configs(config)
+        # Pick up circuit state changes made by other processes
+        circuit_settings = env['llm.circuit.breaker']._get_settings()
+        for endpoint in endpoints:
+            env['llm.circuit.breaker']._get_breaker(endpoint, circuit_settings)
+        return {
+            'channel_id': channel_id,
+            'discuss_channel_id': discuss_channel_id,
+            'messages': messages,
+            'config': config,
+            'endpoints': endpoints,
+            'routing_policy': channel.ai_routing_policy,
+            'max_retries': max(1, min(channel.ai_max_retries or 3, 10)),
+            'retry_delay': max(1, min(channel.ai_retry_delay or 2, 30)),
+            'retry_budget_ratio': channel._get_retry_budget_ratio(),
+            'circuit': circuit_settings,
+            'cache': channel.ai_response_cache_enabled and {
+                'ttl': channel.ai_response_cache_ttl,
+                'turns': channel.ai_response_cache_turns,
+            },
+            'semantic': channel._get_semantic_cache_request(messages),
+            'stream': channel.ai_stream_enabled,
+        }
+
+    def _execute_ai_request(self, request, on_partial_reply=None, reserve_rate_limit=None, renew_lease=None):
+        """
+        Phase 2: call the LLM API with retries. Must not touch the database.
+
+        Drives _iter_ai_request with blocking calls: the HTTP request
+        through the shared requests sessions, waits with time.sleep. See
+        _execute_ai_request_async for the asyncio counterpart.
+
+        Args:
+            request (dict): Request context returned by _prepare_ai_request
+            on_partial_reply (callable|None): Called with the visible text
+                received so far when the request is streamed
+            reserve_rate_limit (callable|None): Called with an endpoint
+                config and the estimated tokens of a call; returns the
+                seconds to wait, or False if the rate limit is saturated
+            renew_lease (callable|None): Called with the seconds of lease
+                the job needs before each call and wait (see
+                _get_ai_step_lease)
+
+        Returns:
+            dict: See _iter_ai_request
+        """
+        steps = self._iter_ai_request(request, rate_limited=reserve_rate_limit is not None)
+        value = error = None
+        while True:
+            try:
+                step = steps.throw(error) if error is not None else steps.send(value)
+            except StopIteration as stop:
+                return stop.value
+            value = error = None
+            if renew_lease and step[0] != STEP_RESERVE:
+                renew_lease(self._get_ai_step_lease(step))
+            if step[0] == STEP_SLEEP:
+                time.sleep(step[1])
+            elif step[0] == STEP_RESERVE:
+                value = reserve_rate_limit(step[1], step[2])
+            else:
+                try:
+                    if request.get('stream') and on_partial_reply:
+                        value = self._stream_llm_request(step[1], step[2], on_partial_reply)
+                    else:
+                        value = self._send_llm_request(step[1], step[2])
+                except Exception as e:
+                    error = e
+
+    async def _execute_ai_request_async(self, request, engine, on_partial_reply=None):
+        """
+        Phase 2 on the async engine: drives _iter_ai_request without a thread.
+
+        Calls are sent with the engine's httpx clients and waits are
+        asyncio sleeps, so hundreds of calls can be in flight at once.
+        Rate limit reservations and lease renewals run in the engine's DB
+        threads. Streamed calls still read their response in a thread, as
+        each chunk is published through its own transaction.
+
+        Args:
+            request (dict): Request context returned by _prepare_ai_request
+            engine (AsyncLLMEngine): The engine running this coroutine
+            on_partial_reply (callable|None): See _execute_ai_request
+
+        Returns:
+            dict: See _iter_ai_request
+        """
+        steps = self._iter_ai_request(request, rate_limited=True)
+        value = error = None
+        while True:
+            try:
+                step = steps.throw(error) if error is not None else steps.send(value)
+            except StopIteration as stop:
+                return stop.value
+            value = error = None
+            if request.get('job_id') and step[0] != STEP_RESERVE:
+                await engine.run_db(
+                    self._run_ai_transaction, self._renew_ai_job_lease, request['job_id'],
+                    self._get_ai_step_lease(step),
                 )
-                return
+            if step[0] == STEP_SLEEP:
+                await asyncio.sleep(step[1])
+            elif step[0] == STEP_RESERVE:
+                value = await engine.run_db(self._run_ai_transaction, self._reserve_rate_limit, step[1], step[2])
+            else:
+                try:
+                    if request.get('stream') and on_partial_reply:
+                        value = await engine.run_blocking(
+                            self._stream_llm_request, step[1], step[2], on_partial_reply,
+                        )
+                    else:
+                        value = await self._send_llm_request_async(engine, step[1], step[2])
+                except Exception as e:
+                    error = e
+
+    @staticmethod
+    def _get_ai_step_lease(step):
+        """
+        Seconds of lease a queued job needs to carry out a step of
+        _iter_ai_request: a wait is followed by a call, and a call may
+        take up to LLM_REQUEST_TIMEOUT.
+        """
+        if step[0] == STEP_SLEEP:
+            return step[1] + LLM_REQUEST_TIMEOUT + JOB_LEASE_MARGIN
+        return LLM_REQUEST_TIMEOUT + JOB_LEASE_MARGIN
+
+    def _iter_ai_request(self, request, rate_limited=False):
+        """
+        Retry logic of phase 2, as a generator of the steps to carry out.
+
+        Yields (STEP_CALL, config, messages) to have a call sent; the
+        response JSON is sent back, or the call's exception is thrown in.
+        Yields (STEP_SLEEP, seconds) to wait and, when rate_limited,
+        (STEP_RESERVE, config, tokens) to reserve a call; the seconds to
+        wait, or False, are sent back. Keeping the I/O out lets the thread
+        and asyncio engines share this logic.
+
+        Retries follow the channel's RetryPolicy: exponential backoff from
+        ai_retry_delay with full jitter, or the provider's Retry-After.
+        Errors that cannot succeed on a second try (bad request,
+        authentication...) are not retried, and retries are refused once
+        the channel's retry budget for this process is spent. While the
+        endpoint's circuit breaker is open, no call is made at all.
+
+        Endpoints with a rate limit get each call reserved, and the call
+        waits for its turn; no call is made when the wait would exceed
+        rate_limiter.MAX_QUEUE_WAIT.
+
+        With the response cache enabled, a reply cached for the same
+        question is returned without calling the API; with the similar
+        questions cache, so is the reply to the most similar previous
+        opening question above the channel's threshold.
 
-        # Read config values
-        max_retries = max(1, min(channel.ai_max_retries or 3, 10))
-        retry_delay = max(1, min(channel.ai_retry_delay or 2, 30))
+        Args:
+            request (dict): Request context returned by _prepare_ai_request
+            rate_limited (bool): Whether to reserve calls in the rate limits
 
+        Returns:
+            dict: 'reply' (str|None), 'attempts' (list of API log values in
+                call order), 'error' (last error message, if any) and
+                'rate_limit_releases' ((config, tokens) reserved but unused)
+        """
+        config = request['config']
+        messages = request['messages']
+        max_retries = request['max_retries']
+        policy = retry.RetryPolicy(request['retry_delay'])
+        budget = retry.get_retry_budget(
+            request['channel_id'], request.get('retry_budget_ratio', retry.DEFAULT_BUDGET_RATIO),
+        )
+        cache_key = None
+        if request.get('cache'):
+            cache_key = response_cache.make_cache_key(config, messages, request['cache']['turns'])
+            cached_reply = response_cache.response_cache.get(cache_key)
+            if cached_reply:
+                return {
+                    'reply': cached_reply,
+                    'attempts': [{
+                        'status': 'cache_hit',
+                        'timestamp': fields.Datetime.now(),
+                        'response_time': 0.0,
+                        'retry_count': 0,
+                    }],
+                    'error': None,
+                }
+        semantic = request.get('semantic')
+        if semantic:
+            embedder = semantic_cache.get_embedder(semantic['embedder'])
+            question_vector = embedder.embed(semantic['question'])
+            faq_cache = semantic_cache.get_cache(request['channel_id'], embedder)
+            answer, matched_question, score = faq_cache.lookup(question_vector, semantic['threshold'])
+            if answer:
+                return {
+                    'reply': answer,
+                    'attempts': [{
+                        'status': 'cache_hit',
+                        'timestamp': fields.Datetime.now(),
+                        'response_payload': {'similar_question': matched_question, 'similarity': round(score, 4)},
+                        'response_time': 0.0,
+                        'retry_count': 0,
+                    }],
+                    'error': None,
+                }
+
+        endpoints = endpoint_router.order_endpoints(
+            request.get('endpoints') or [config], request.get('routing_policy'),
+        )
+        current = 0
+        config = endpoints[current]
+        breaker = self._get_endpoint_breaker(request, config)
+        attempts = []
         last_error = None
+        final_error = None
+        releases = []
+        estimated_tokens = None
 
         for attempt in range(max_retries):
+            if not breaker.allow_request():
+                fallback = self._get_next_open_endpoint(request, endpoints, current)
+                if fallback is None:
+                    _logger.warning(
+                        "AI API circuit open for channel %s (%s), failing fast",
+                        request['channel_id'], config['base_url'],
+                    )
+                    final_error = f'Circuit breaker open for {config["base_url"]}. Last error: {last_error}'
+                    break
+                current = fallback
+                config = endpoints[current]
+                breaker = self._get_endpoint_breaker(request, config)
+            reserved_tokens = 0
+            if rate_limited and (config.get('rpm_limit') or config.get('tpm_limit')):
+                if estimated_tokens is None:
+                    estimated_tokens = rate_limiter.estimate_tokens(config, messages)
+                wait = yield (STEP_RESERVE, config, estimated_tokens)
+                if wait is None:
+                    # The reservation transaction failed: nothing was reserved
+                    # and the call must not go out unmetered
+                    breaker.release()
+                    final_error = f'Rate limit of {config["base_url"]} could not be reserved. Last error: {last_error}'
+                    break
+                if wait is False:
+                    breaker.release()
+                    final_error = f'Rate limit of {config["base_url"]} saturated. Last error: {last_error}'
+                    break
+                reserved_tokens = estimated_tokens
+                if wait:
+                    yield (STEP_SLEEP, wait)
+            budget.record_request()
             start_time = time.time()
             try:
-                response_data = channel._call_llm_api(messages)
+                response_data = yield (STEP_CALL, config, messages)
                 response_time = time.time() - start_time
 
                 # Extract response content and strip reasoning tags
@@ -350,76 +1198,281 @@ class ImLivechatChannel(models.Model):
                 if not ai_reply:
                     raise ValueError("Empty response from LLM API")
 
+                breaker.record_success()
+                endpoint_router.latency_tracker.record(config, response_time)
+                if cache_key:
+                    response_cache.response_cache.put(cache_key, ai_reply, request['cache']['ttl'])
+                if semantic:
+                    faq_cache.add(semantic['question'], ai_reply, question_vector)
                 # Extract token usage
                 usage = response_data.get('usage', {})
-
-                # Post AI reply to chat
-                channel._create_bot_message(env, discuss_channel, ai_reply)
-
-                # Log success
-                channel._create_api_log(
-                    env,
-                    channel_id=channel_id,
-                    discuss_channel_id=discuss_channel_id,
-                    model_name=channel.ai_model,
-                    status='success',
-                    request_payload=messages,
-                    response_payload=response_data,
-                    prompt_tokens=usage.get('prompt_tokens', 0),
-                    completion_tokens=usage.get('completion_tokens', 0),
-                    total_tokens=usage.get('total_tokens', 0),
-                    response_time=response_time,
-                    retry_count=attempt,
-                )
-                return
+                if reserved_tokens:
+                    releases.append((config, reserved_tokens - (usage.get('total_tokens') or reserved_tokens)))
+                attempts.append({
+                    'status': 'success',
+                    'timestamp': fields.Datetime.now(),
+                    'response_payload': response_data,
+                    'prompt_tokens': usage.get('prompt_tokens', 0),
+                    'completion_tokens': usage.get('completion_tokens', 0),
+                    'total_tokens': usage.get('total_tokens', 0),
+                    'cached_tokens': self._get_cached_prompt_tokens(usage),
+                    'response_time': response_time,
+                    'retry_count': attempt,
+                    **self._get_endpoint_log_values(config),
+                })
+                return {'reply': ai_reply, 'attempts': attempts, 'error': None, 'rate_limit_releases': releases}
 
             except Exception as e:
                 response_time = time.time() - start_time
+                if reserved_tokens:
+                    # A failed call uses a request but (almost) no tokens
+                    releases.append((config, reserved_tokens))
+                provider_failure = circuit_breaker.is_provider_failure(e)
+                if provider_failure:
+                    breaker.record_failure()
+                    endpoint_router.latency_tracker.record_failure(config)
+                elif isinstance(e, (requests.RequestException, ValueError)):
+                    breaker.record_success()  # the provider answered
+                else:
+                    breaker.release()
                 last_error = str(e)
                 # For HTTP errors, include response body for debugging
                 if isinstance(e, requests.HTTPError) and e.response is not None:
                     last_error = f"{e} | Response: {e.response.text[:500]}"
                 _logger.warning(
                     "AI API call failed for channel %s (attempt %s/%s): %s",
-                    channel_id, attempt + 1, max_retries, last_error,
+                    request['channel_id'], attempt + 1, max_retries, last_error,
                 )
 
-                # Log retry attempt
-                if attempt < max_retries - 1:
-                    channel._create_api_log(
-                        env,
-                        channel_id=channel_id,
-                        discuss_channel_id=discuss_channel_id,
-                        model_name=channel.ai_model,
-                        status='retry',
-                        request_payload=messages,
-                        response_payload=None,
-                        response_time=response_time,
-                        error_message=last_error,
-                        retry_count=attempt + 1,
+                if attempt >= max_retries - 1:
+                    final_error = f'All {max_retries} retries exhausted. Last error: {last_error}'
+                    break
+                if not policy.should_retry(e):
+                    final_error = f'Not retryable (HTTP {retry.get_status_code(e)}): {last_error}'
+                    break
+                # Timeouts, 5xx and 429 are retried on the next endpoint, if any
+                failover = provider_failure and len(endpoints) > 1
+                if breaker.state == circuit_breaker.STATE_OPEN and not failover:
+                    final_error = f'Circuit breaker opened for {config["base_url"]}. Last error: {last_error}'
+                    break
+                if not budget.try_acquire_retry():
+                    _logger.warning(
+                        "AI retry budget of channel %s exhausted (%s), giving up",
+                        request['channel_id'], budget.stats(),
                     )
-                    time.sleep(retry_delay)
+                    final_error = f'Retry budget exhausted. Last error: {last_error}'
+                    break
+
+                # Log retry attempt
+                attempts.append({
+                    'status': 'retry',
+                    'timestamp': fields.Datetime.now(),
+                    'response_time': response_time,
+                    'error_message': last_error,
+                    'retry_count': attempt + 1,
+                    **self._get_endpoint_log_values(config),
+                })
+                if failover:
+                    current = (current + 1) % len(endpoints)
+                    config = endpoints[current]
+                    breaker = self._get_endpoint_breaker(request, config)
+                    _logger.info("AI API of channel %s failing over to %s", request['channel_id'], config['base_url'])
+                    if current:
+                        # Another provider: no reason to wait before calling it
+                        continue
+                yield (STEP_SLEEP, policy.compute_delay(attempt, e))
+
+        attempts.append({
+            'status': 'error',
+            'timestamp': fields.Datetime.now(),
+            'error_message': final_error,
+            'retry_count': attempt + 1,
+            **self._get_endpoint_log_values(config),
+        })
+        return {'reply': None, 'attempts': attempts, 'error': last_error, 'rate_limit_releases': releases}
+
+    def _reserve_rate_limit(self, env, config, tokens):
+        """Reserve a call in the rate limit of its API key (see llm.rate.limit._reserve)."""
+        return env['llm.rate.limit']._reserve(config, tokens)
+
+    @staticmethod
+    def _get_cached_prompt_tokens(usage):
+        """
+        Return the prompt tokens the provider read from its prompt cache.
+
+        OpenAI reports them in prompt_tokens_details.cached_tokens,
+        DeepSeek in prompt_cache_hit_tokens and Anthropic-compatible
+        endpoints in cache_read_input_tokens.
+        """
+        details = usage.get('prompt_tokens_details') or {}
+        return (
+            details.get('cached_tokens')
+            or usage.get('prompt_cache_hit_tokens')
+            or usage.get('cache_read_input_tokens')
+            or 0
+        )
+
+    @staticmethod
+    def _get_endpoint_breaker(request, config):
+        """Return the process circuit breaker of one endpoint of a request."""
+        return circuit_breaker.get_breaker(config['base_url'], config['model'], **request.get('circuit', {}))
+
+    @classmethod
+    def _get_request_breaker(cls, request):
+        """Return the process circuit breaker of the endpoint a request is sent to."""
+        return cls._get_endpoint_breaker(request, request['config'])
+
+    @classmethod
+    def _get_next_open_endpoint(cls, request, endpoints, current):
+        """Return the index of the next endpoint whose circuit lets a call through, or None."""
+        for offset in range(1, len(endpoints)):
+            index = (current + offset) % len(endpoints)
+            if cls._get_endpoint_breaker(request, endpoints[index]).allow_request():
+                return index
+        return None
+
+    @staticmethod
+    def _get_endpoint_log_values(config):
+        """Which endpoint served a call, as _create_api_log arguments."""
+        return {
+            'endpoint_id': config.get('endpoint_id') or False,
+            'api_base_url': config['base_url'],
+            'model_name': config['model'],
+        }
+
+    def _finalize_ai_response(self, env, request, result):
+        """
+        Phase 3: post the reply (or the fallback message) and write the API logs.
+
+        Args:
+            env (api.Environment): Environment to use
+            request (dict): Request context returned by _prepare_ai_request
+            result (dict): Outcome returned by _execute_ai_request
+        """
+        channel_id = request['channel_id']
+        discuss_channel_id = request['discuss_channel_id']
+        for config in request.get('endpoints') or [request['config']]:
+            env['llm.circuit.breaker']._save_breaker(config, self._get_endpoint_breaker(request, config))
+        for config, tokens in result.get('rate_limit_releases', ()):
+            env['llm.rate.limit']._release(config, tokens=tokens)
+        job = env['im_livechat_ai.job'].browse(request.get('job_id')).exists()
+        superseded = bool(job) and job._is_superseded()
+        if job:
+            job._mark_done('cancelled' if superseded else 'done')
+        channel = env['im_livechat.channel'].browse(channel_id)
+        if not channel.exists():
+            _logger.warning("AI response: channel %s deleted during the LLM call", channel_id)
+            return
+
+        discuss_channel = env['discuss.channel'].browse(discuss_channel_id)
+        stream_message = self._get_stream_message(env, request)
+        if not discuss_channel.exists():
+            _logger.warning("AI response: session %s deleted during the LLM call", discuss_channel_id)
+        elif superseded and not stream_message:
+            # A newer job answers the whole burst; this reply would arrive out of date
+            _logger.info("AI response: dropping superseded reply for session %s", discuss_channel_id)
+        else:
+            # No reply means all retries were exhausted — send the error message
+            body = result['reply'] or channel._get_ai_error_message()
+            if stream_message:
+                channel._update_bot_message(discuss_channel, stream_message, body)
+            else:
+                channel._create_bot_message(env, discuss_channel, body)
+            if channel.ai_summary_enabled and result['reply']:
+                discuss_channel._schedule_ai_summary_refresh(channel)
+        if request.get('semantic'):
+            channel._save_semantic_cache(semantic_cache.get_embedder(request['semantic']['embedder']))
+
+        for attempt_vals in result['attempts']:
+            log_vals = dict(attempt_vals, response_payload=attempt_vals.get('response_payload'))
+            log_vals.setdefault('model_name', request['config']['model'])
+            channel._create_api_log(
+                env,
+                channel_id=channel_id,
+                discuss_channel_id=discuss_channel_id,
+                request_payload=request['messages'],
+                **log_vals,
+            )
+
+    def _get_stream_message(self, env, request):
+        """Return the bot message created for a streamed reply, if it still exists."""
+        if not request.get('stream_message_id'):
+            return env['mail.message']
+        return env['mail.message'].browse(request['stream_message_id']).exists()
+
+    def _publish_partial_reply(self, env, request, text):
+        """
+        Show the partial text of a streamed reply in the chat.
+
+        The first call posts a placeholder bot message; later calls update
+        its body, which is broadcast to the visitor over the bus.
 
-        # All retries exhausted — send error message to visitor
-        error_msg = channel.ai_error_message or _(
+        Args:
+            env (api.Environment): Environment to use
+            request (dict): Request context; receives 'stream_message_id'
+            text (str): Visible reply text received so far (may be empty)
+        """
+        channel = env['im_livechat.channel'].browse(request['channel_id'])
+        discuss_channel = env['discuss.channel'].browse(request['discuss_channel_id'])
+        if not channel.exists() or not discuss_channel.exists():
+            return
+        if request.get('job_id'):
+            # A streamed reply may outlast LLM_REQUEST_TIMEOUT, chunk after chunk
+            env['im_livechat_ai.job'].browse(request['job_id'])._renew_lease(
+                LLM_REQUEST_TIMEOUT + JOB_LEASE_MARGIN,
+            )
+        body = text or streaming.STREAM_PLACEHOLDER
+        message = self._get_stream_message(env, request)
+        if message:
+            channel._update_bot_message(discuss_channel, message, body)
+        else:
+            message = channel._create_bot_message(env, discuss_channel, body)
+            request['stream_message_id'] = message.id
+
+    @api.model
+    def _get_retry_budget_ratio(self):
+        """Share of recent requests a channel may retry, per process."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        try:
+            return max(0.0, float(ICP.get_param('im_livechat_ai.retry_budget_ratio', retry.DEFAULT_BUDGET_RATIO)))
+        except ValueError:
+            return retry.DEFAULT_BUDGET_RATIO
+
+    def _get_ai_error_message(self):
+        """Return the fallback message posted when no AI reply can be produced."""
+        self.ensure_one()
+        return self.ai_error_message or _(
             'Sorry, the AI assistant is temporarily unavailable. '
             'Please try again later or leave your contact information.'
         )
-        channel._create_bot_message(env, discuss_channel, error_msg)
-
-        # Log final failure
-        channel._create_api_log(
-            env,
-            channel_id=channel_id,
-            discuss_channel_id=discuss_channel_id,
-            model_name=channel.ai_model,
-            status='error',
-            request_payload=messages,
-            response_payload=None,
-            response_time=None,
-            error_message=f'All {max_retries} retries exhausted. Last error: {last_error}',
-            retry_count=max_retries,
-        )
+
+    def _get_llm_request_config(self):
+        """
+        Snapshot the connection settings used by _send_llm_request.
+
+        Returns:
+            dict: base_url, api_key, model, temperature, max_tokens,
+                rpm_limit and tpm_limit
+        """
+        self.ensure_one()
+        return {
+            'base_url': self.ai_api_base_url,
+            'api_key': self.ai_api_key,
+            'model': self.ai_model,
+            'temperature': self.ai_temperature,
+            'max_tokens': self.ai_max_tokens,
+            'rpm_limit': self.ai_rate_limit_rpm,
+            'tpm_limit': self.ai_rate_limit_tpm,
+        }
+
+    def _get_llm_endpoint_configs(self, config=None):
+        """
+        Return the request settings of every endpoint of the channel: its
+        own API settings first, then its active fallback endpoints.
+        """
+        self.ensure_one()
+        config = config or self._get_llm_request_config()
+        return [config] + [endpoint._get_request_config(config) for endpoint in self.ai_endpoint_ids]
 
     def _call_llm_api(self, messages):
         """
@@ -436,32 +1489,96 @@ class ImLivechatChannel(models.Model):
             ValueError: On invalid response format
         """
         self.ensure_one()
+        return self._send_llm_request(self._get_llm_request_config(), messages)
+
+    @staticmethod
+    def _send_llm_request(config, messages):
+        """
+        Send a chat completions request using a config snapshot.
+
+        Static so it can run without a database cursor (see
+        _execute_ai_request).
+
+        Args:
+            config (dict): Settings returned by _get_llm_request_config
+            messages (list): List of message dicts with 'role' and 'content' keys
+
+        Returns:
+            dict: The API response JSON
 
-        url = self.ai_api_base_url.strip().rstrip('/')
+        Raises:
+            requests.RequestException: On HTTP errors
+            ValueError: On invalid response format
+        """
+        session = http_session.session_pool.get(config['base_url'], config['api_key'])
+        response = session.post(
+            ImLivechatChannel._get_llm_request_url(config),
+            json=ImLivechatChannel._get_llm_request_payload(config, messages),
+            headers=ImLivechatChannel._get_llm_request_headers(config),
+            timeout=LLM_REQUEST_TIMEOUT,
+        )
+        return ImLivechatChannel._parse_llm_response(response)
+
+    @staticmethod
+    async def _send_llm_request_async(engine, config, messages):
+        """
+        Send a chat completions request with the async engine's HTTP client.
+
+        Same contract as _send_llm_request: errors are raised as requests
+        exceptions, so retries and circuit breakers treat them alike.
+        """
+        response = await engine.post(
+            config['base_url'],
+            config['api_key'],
+            ImLivechatChannel._get_llm_request_url(config),
+            ImLivechatChannel._get_llm_request_payload(config, messages),
+            ImLivechatChannel._get_llm_request_headers(config),
+            LLM_REQUEST_TIMEOUT,
+        )
+        return ImLivechatChannel._parse_llm_response(response)
+
+    @staticmethod
+    def _get_llm_request_url(config):
+        url = config['base_url'].strip().rstrip('/')
         if '/chat/completions' not in url:
             url = url + '/chat/completions'
+        return url
 
+    @staticmethod
+    def _get_llm_request_headers(config, stream=False):
         headers = {
             'Content-Type': 'application/json',
-            'Authorization': f'Bearer {self.ai_api_key}',
+            'Authorization': f'Bearer {config["api_key"]}',
         }
+        if stream:
+            headers['Accept'] = 'text/event-stream'
+        return headers
 
+    @staticmethod
+    def _get_llm_request_payload(config, messages, stream=False):
         payload = {
-            'model': self.ai_model,
+            'model': config['model'],
             'messages': messages,
         }
+        if stream:
+            payload['stream'] = True
+            payload['stream_options'] = {'include_usage': True}
 
-        if self.ai_temperature is not None:
-            payload['temperature'] = self.ai_temperature
-        if self.ai_max_tokens:
-            payload['max_tokens'] = self.ai_max_tokens
+        if config['temperature'] is not None:
+            payload['temperature'] = config['temperature']
+        if config['max_tokens']:
+            payload['max_tokens'] = config['max_tokens']
+        return payload
 
-        response = requests.post(
-            url,
-            json=payload,
-            headers=headers,
-            timeout=180,
-        )
+    @staticmethod
+    def _parse_llm_response(response):
+        """
+        Check a chat completions response and return its JSON.
+
+        Raises:
+            requests.HTTPError: On HTTP errors
+            ValueError: On invalid response format
+        """
         if response.status_code != 200:
             _logger.warning(
                 "LLM API error response (HTTP %s): %s",
@@ -475,6 +1592,77 @@ class ImLivechatChannel(models.Model):
 
         return data
 
+    @staticmethod
+    def _stream_llm_request(config, messages, on_text):
+        """
+        Send a streamed chat completions request (server-sent events).
+
+        Reasoning blocks are filtered out incrementally, so on_text only
+        ever receives text that may be shown to the visitor. It is called
+        once with an empty string when the provider accepts the request.
+
+        Args:
+            config (dict): Settings returned by _get_llm_request_config
+            messages (list): List of message dicts with 'role' and 'content' keys
+            on_text (callable): Called with the visible text received so far
+
+        Returns:
+            dict: A response shaped like a non-streamed completion, with the
+                raw reply in choices[0].message.content
+
+        Raises:
+            requests.RequestException: On HTTP errors
+            ValueError: If the stream contains no choices
+        """
+        session = http_session.session_pool.get(config['base_url'], config['api_key'])
+        response = session.post(
+            ImLivechatChannel._get_llm_request_url(config),
+            json=ImLivechatChannel._get_llm_request_payload(config, messages, stream=True),
+            headers=ImLivechatChannel._get_llm_request_headers(config, stream=True),
+            timeout=LLM_REQUEST_TIMEOUT,
+            stream=True,
+        )
+        with response:
+            if response.status_code != 200:
+                _logger.warning(
+                    "LLM API error response (HTTP %s): %s",
+                    response.status_code, response.text[:1000],
+                )
+            response.raise_for_status()
+            on_text('')
+
+            think_filter = streaming.ThinkTagFilter()
+            raw_parts = []
+            visible = ''
+            usage = {}
+            model = config['model']
+            got_choices = False
+            for event in streaming.iter_sse_events(response.iter_lines(decode_unicode=True)):
+                if event.get('usage'):
+                    usage = event['usage']
+                model = event.get('model') or model
+                for choice in event.get('choices') or []:
+                    got_choices = True
+                    delta = (choice.get('delta') or {}).get('content') or ''
+                    if delta:
+                        raw_parts.append(delta)
+                        visible += think_filter.feed(delta)
+                        on_text(visible)
+
+        if not got_choices:
+            raise ValueError("Invalid API response: stream contained no 'choices'")
+
+        return {
+            'model': model,
+            'choices': [{'message': {'role': 'assistant', 'content': ''.join(raw_parts)}}],
+            'usage': usage,
+        }
+
+    @api.model
+    def _get_llm_session_stats(self):
+        """Return hit/miss and connection reuse counters of this process' HTTP session pool."""
+        return http_session.session_pool.stats()
+
     def _create_bot_message(self, env, discuss_channel, body):
         """
         Post a message to the livechat session as the AI bot.
@@ -486,51 +1674,75 @@ class ImLivechatChannel(models.Model):
             env (api.Environment): Environment with new cursor
             discuss_channel (discuss.channel): The chat session
             body (str): Message body text
+
+        Returns:
+            mail.message: The posted message
         """
         self.ensure_one()
 
-        bot_partner = self._get_or_create_bot_partner()
+        bot_partner = self._get_ai_bot_author()
 
-        # Escape HTML to prevent XSS, then convert newlines for display
-        safe_body = Markup('<br/>').join(
-            Markup.escape(line) for line in body.split('\n')
-        )
-
-        discuss_channel.with_context(mail_create_nosubscribe=True).message_post(
-            body=safe_body,
+        return discuss_channel.with_context(mail_create_nosubscribe=True).message_post(
+            body=self._format_bot_body(body),
             message_type='comment',
             subtype_xmlid='mail.mt_comment',
             author_id=bot_partner.id,
         )
 
+    def _update_bot_message(self, discuss_channel, message, body):
+        """
+        Replace the body of a bot message (e.g. a streamed reply) and notify the chat.
+
+        Args:
+            discuss_channel (discuss.channel): The chat session
+            message (mail.message): The bot message to update
+            body (str): New message body text
+        """
+        discuss_channel._message_update_content(message, self._format_bot_body(body), strict=False)
+
+    @staticmethod
+    def _format_bot_body(body):
+        """Escape HTML to prevent XSS, then convert newlines for display."""
+        return Markup('<br/>').join(
+            Markup.escape(line) for line in body.split('\n')
+        )
+
     def _create_api_log(self, env, channel_id, discuss_channel_id, model_name,
                         status, request_payload, response_payload,
                         prompt_tokens=0, completion_tokens=0, total_tokens=0,
-                        response_time=None, error_message=None, retry_count=0):
+                        response_time=None, error_message=None, retry_count=0,
+                        timestamp=None, cached_tokens=0, endpoint_id=False, api_base_url=None):
         """
-        Create an LLM API log entry.
+        Record an LLM API log entry.
 
-        Uses the provided environment (which should have its own cursor)
-        to ensure logs are persisted independently of the main transaction.
+        The entry is buffered and written in a batch by the log flusher
+        (see llm.api.log._add_log); payloads are serialized there too.
 
         Args:
-            env (api.Environment): Environment to use for creation
+            env (api.Environment): Environment of the current transaction
             channel_id (int): Livechat channel ID
             discuss_channel_id (int): Discuss channel ID
             model_name (str): LLM model name
-            status (str): 'success', 'error', or 'retry'
+            status (str): 'success', 'error', 'retry' or 'cache_hit'
             request_payload (list|None): Messages array sent to API
             response_payload (dict|None): API response data
             prompt_tokens (int): Number of prompt tokens
             completion_tokens (int): Number of completion tokens
             total_tokens (int): Total tokens used
+            cached_tokens (int): Prompt tokens served from the provider's prompt cache
             response_time (float|None): Response time in seconds
             error_message (str|None): Error message if failed
             retry_count (int): Number of retry attempt
+            timestamp (datetime|None): When the call was made (defaults to now)
+            endpoint_id (int|bool): im_livechat_ai.endpoint that served the call
+                (False for the channel's own API settings)
+            api_base_url (str|None): Base URL the call was sent to
         """
         try:
             vals = {
                 'livechat_channel_id': channel_id,
+                'discuss_channel_id': discuss_channel_id,
+                'endpoint_id': endpoint_id,
                 'model': model_name,
                 'status': status,
                 'response_time': response_time,
@@ -539,23 +1751,26 @@ class ImLivechatChannel(models.Model):
                 'prompt_tokens': prompt_tokens or 0,
                 'completion_tokens': completion_tokens or 0,
                 'total_tokens': total_tokens or 0,
+                'cached_tokens': cached_tokens or 0,
+                'api_base_url': api_base_url,
+                'request_payload': request_payload,
+                'response_payload': response_payload,
             }
-
-            # Validate FK references
-            if discuss_channel_id and env['discuss.channel'].browse(discuss_channel_id).exists():
-                vals['discuss_channel_id'] = discuss_channel_id
-
-            if request_payload:
-                vals['request_payload'] = json.dumps(request_payload, ensure_ascii=False, default=str)
-            if response_payload:
-                vals['response_payload'] = json.dumps(response_payload, ensure_ascii=False, default=str)
-
-            env['llm.api.log'].create(vals)
+            if timestamp:
+                vals['timestamp'] = timestamp
+            env['llm.api.log']._add_log(vals)
         except Exception as log_error:
             _logger.error("Failed to create API log: %s", log_error, exc_info=True)
 
     # --- UI Action Methods ---
 
+    def action_clear_semantic_cache(self):
+        """Forget the replies stored for similar questions."""
+        for channel in self:
+            semantic_cache.drop_cache(channel.id)
+        # Other workers reload the (now missing) stored cache on their next request
+        self.sudo().write({'ai_semantic_cache_data': False})
+
     def action_test_ai_connection(self):
         """
         Test the AI API connection by sending a simple request.
@@ -1,12 +1,37 @@
 # -*- coding: utf-8 -*-
 
+import functools
 import logging
+import time
 from datetime import timedelta
 
-from odoo import fields, models
+from odoo import api, fields, models, SUPERUSER_ID
+from odoo.modules.registry import Registry
+
+from ..tools import log_buffer
 
 _logger = logging.getLogger(__name__)
 
+# Columns written by _insert_logs, besides the create/write metadata
+INSERT_COLUMNS = (
+    'timestamp', 'livechat_channel_id', 'discuss_channel_id', 'model', 'api_base_url', 'endpoint_id',
+    'status', 'request_payload_ref', 'response_payload_ref', 'prompt_tokens', 'completion_tokens',
+    'total_tokens', 'cached_tokens', 'response_time', 'error_message', 'retry_count',
+)
+REFERENCE_COLUMNS = ('livechat_channel_id', 'discuss_channel_id', 'endpoint_id')
+COUNTER_COLUMNS = ('prompt_tokens', 'completion_tokens', 'total_tokens', 'cached_tokens', 'retry_count')
+
+DEFAULT_RETENTION_DAYS = 30
+CLEANUP_BATCH_SIZE = 5000
+# Seconds of deletes per cleanup run; the scheduled action continues later
+CLEANUP_TIME_BUDGET = 240
+
+
+def _write_buffered_logs(db_name, rows):
+    """Writer of the log buffer of a database: one transaction per batch."""
+    with Registry(db_name).cursor() as cr:
+        api.Environment(cr, SUPERUSER_ID, {})['llm.api.log']._insert_logs(rows)
+
 
 class LLMApiLog(models.Model):
     """
@@ -51,6 +76,16 @@ class LLMApiLog(models.Model):
         string='Model',
         help='The LLM model name used for this call',
     )
+    api_base_url = fields.Char(
+        string='API Base URL',
+        help='The endpoint this call was sent to',
+    )
+    endpoint_id = fields.Many2one(
+        comodel_name='im_livechat_ai.endpoint',
+        string='Fallback Endpoint',
+        ondelete='set null',
+        help='The fallback endpoint that served this call (empty for the channel API)',
+    )
 
     # Status
     status = fields.Selection(
@@ -58,6 +93,7 @@ class LLMApiLog(models.Model):
             ('success', 'Success'),
             ('error', 'Error'),
             ('retry', 'Retry'),
+            ('cache_hit', 'Cache Hit'),
         ],
         string='Status',
         required=True,
@@ -65,15 +101,29 @@ class LLMApiLog(models.Model):
         help='Status of the API call',
     )
 
-    # Payload Data
+    # Payload Data, stored in llm.api.payload and only loaded when displayed
     request_payload = fields.Text(
         string='Request Payload',
+        compute='_compute_payloads',
+        inverse='_inverse_request_payload',
         help='The messages array sent to the LLM API (JSON)',
     )
     response_payload = fields.Text(
         string='Response Payload',
+        compute='_compute_payloads',
+        inverse='_inverse_response_payload',
         help='The response received from the LLM API (JSON)',
     )
+    request_payload_ref = fields.Text(
+        string='Request Payload Reference',
+        readonly=True,
+        help='Technical: llm.api.payload blobs of the request',
+    )
+    response_payload_ref = fields.Text(
+        string='Response Payload Reference',
+        readonly=True,
+        help='Technical: llm.api.payload blob of the response',
+    )
 
     # Token Usage
     prompt_tokens = fields.Integer(
@@ -91,6 +141,11 @@ class LLMApiLog(models.Model):
         default=0,
         help='Total number of tokens used',
     )
+    cached_tokens = fields.Integer(
+        string='Cached Prompt Tokens',
+        default=0,
+        help='Prompt tokens the provider served from its prompt cache (usually billed at a discount)',
+    )
 
     # Performance
     response_time = fields.Float(
@@ -109,24 +164,199 @@ class LLMApiLog(models.Model):
         help='Number of retry attempts made',
     )
 
-    def _cleanup_old_logs(self):
+    @api.depends('request_payload_ref', 'response_payload_ref')
+    def _compute_payloads(self):
+        texts = self.env['llm.api.payload']._load(
+            self.mapped('request_payload_ref') + self.mapped('response_payload_ref')
+        )
+        for log in self:
+            log.request_payload = texts.get(log.request_payload_ref, False)
+            log.response_payload = texts.get(log.response_payload_ref, False)
+
+    def _inverse_request_payload(self):
+        references = self.env['llm.api.payload']._store(self.mapped('request_payload'))
+        for log, reference in zip(self, references):
+            log.request_payload_ref = reference
+
+    def _inverse_response_payload(self):
+        references = self.env['llm.api.payload']._store(self.mapped('response_payload'))
+        for log, reference in zip(self, references):
+            log.response_payload_ref = reference
+
+    @api.model
+    def _add_log(self, vals):
         """
-        Cleanup API logs older than 30 days.
+        Record an API call; the row is written later, in a batch.
+
+        Log rows are buffered per process and written by a flusher thread
+        with one multi-row INSERT (see tools.log_buffer), instead of one
+        ORM create per attempt inside the reply transaction. Rows are
+        queued when the current transaction commits, and their payloads
+        are serialized and stored by the flusher. In test mode, rows are
+        written immediately in the current transaction.
+
+        Parameters (Settings > Technical > System Parameters):
+        - im_livechat_ai.log_batch_size: rows per INSERT
+        - im_livechat_ai.log_flush_interval: max seconds a row waits
+
+        Args:
+            vals (dict): Values of the log; payloads may be lists or dicts
+        """
+        vals = dict(vals)
+        vals.setdefault('timestamp', fields.Datetime.now())
+        if self.env.registry.in_test_mode():
+            self._insert_logs([vals])
+        else:
+            # Only calls of committed transactions are logged: a transaction
+            # retried after a serialization failure must not log them twice
+            self.env.cr.postcommit.add(functools.partial(self._get_log_buffer().add, vals))
+
+    @api.model
+    def _get_log_buffer(self):
+        ICP = self.env['ir.config_parameter'].sudo()
+        try:
+            batch_size = int(ICP.get_param('im_livechat_ai.log_batch_size', log_buffer.DEFAULT_BATCH_SIZE))
+            flush_interval = float(ICP.get_param(
+                'im_livechat_ai.log_flush_interval', log_buffer.DEFAULT_FLUSH_INTERVAL,
+            ))
+        except ValueError:
+            _logger.warning("Invalid LLM API log buffer parameters, using defaults")
+            batch_size, flush_interval = log_buffer.DEFAULT_BATCH_SIZE, log_buffer.DEFAULT_FLUSH_INTERVAL
+        db_name = self.env.cr.dbname
+        return log_buffer.get_buffer(
+            db_name, functools.partial(_write_buffered_logs, db_name), batch_size, flush_interval,
+        )
+
+    @api.model
+    def _insert_logs(self, rows):
+        """
+        Write log values with a single multi-row INSERT.
+
+        References to records deleted in the meantime are cleared, with
+        one query per referenced model rather than one per row. The
+        payloads of all rows are stored in llm.api.payload together.
+
+        Args:
+            rows (list): Dicts of log values, as given to _add_log
+        """
+        if not rows:
+            return
+        cr = self.env.cr
+        for column in REFERENCE_COLUMNS:
+            existing = set()
+            ids = list({row[column] for row in rows if row.get(column)})
+            if ids:
+                table = self.env[self._fields[column].comodel_name]._table
+                cr.execute('SELECT id FROM "%s" WHERE id = ANY(%%s)' % table, [ids])
+                existing = {row_id for row_id, in cr.fetchall()}
+            for row in rows:
+                if row.get(column) not in existing:
+                    row[column] = None
+
+        # Rows kept for a retry after a failed write are stored again as
+        # a whole: their blobs may have been rolled back with them
+        references = self.env['llm.api.payload']._store(
+            [row.get('request_payload') for row in rows] + [row.get('response_payload') for row in rows]
+        )
+        for row, request_ref, response_ref in zip(rows, references, references[len(rows):]):
+            row['request_payload_ref'] = request_ref
+            row['response_payload_ref'] = response_ref
+
+        now = fields.Datetime.now()
+        values = []
+        for row in rows:
+            for column in COUNTER_COLUMNS:
+                row[column] = row.get(column) or 0
+            values.append(
+                tuple(row.get(column) for column in INSERT_COLUMNS) + (self.env.uid, now, self.env.uid, now)
+            )
+        cr.execute(
+            'INSERT INTO llm_api_log (%s, create_uid, create_date, write_uid, write_date) VALUES %s' % (
+                ', '.join(INSERT_COLUMNS), ', '.join(['%s'] * len(values)),
+            ),
+            values,
+        )
+
+    @api.model
+    def _get_retention_days(self):
+        """Days API logs are kept (im_livechat_ai.log_retention_days, default 30)."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        try:
+            return max(1, int(ICP.get_param('im_livechat_ai.log_retention_days', DEFAULT_RETENTION_DAYS)))
+        except ValueError:
+            _logger.warning("Invalid LLM API log retention, using %s days", DEFAULT_RETENTION_DAYS)
+            return DEFAULT_RETENTION_DAYS
+
+    def _cleanup_old_logs(self, batch_size=CLEANUP_BATCH_SIZE, time_budget=CLEANUP_TIME_BUDGET):
+        """
+        Cleanup API logs older than the retention period.
 
         Called by a scheduled action to prevent the log table
-        from growing indefinitely.
+        from growing indefinitely. Logs are deleted with plain SQL in
+        batches of batch_size rows, each committed on its own, so that no
+        record is loaded and no transaction holds more than one batch of
+        locks. Once time_budget seconds are spent, the scheduled action
+        is triggered again to continue. Payload blobs no longer used are
+        deleted the same way.
+
+        Args:
+            batch_size (int): Rows deleted per transaction
+            time_budget (float|None): Seconds after which no new batch is started
 
         Returns:
             int: Number of records deleted
         """
-        cutoff_date = fields.Datetime.now() - timedelta(days=30)
-        old_logs = self.search([('timestamp', '<', cutoff_date)])
-        count = len(old_logs)
+        retention_days = self._get_retention_days()
+        cutoff_date = fields.Datetime.now() - timedelta(days=retention_days)
+        started = time.monotonic()
+        self.flush_model()
+
+        count, done = self._delete_in_batches("""
+            DELETE FROM llm_api_log
+             WHERE id IN (SELECT id FROM llm_api_log WHERE timestamp < %s LIMIT %s)
+        """, cutoff_date, batch_size, started, time_budget)
+        if done:
+            # A blob's last use is a date: keep one more day of margin
+            blobs, done = self._delete_in_batches("""
+                DELETE FROM llm_api_payload
+                 WHERE id IN (SELECT id FROM llm_api_payload WHERE last_used < %s LIMIT %s)
+            """, cutoff_date.date() - timedelta(days=1), batch_size, started, time_budget)
+            if blobs:
+                _logger.info("Cleaned up %s unused LLM API payload blobs", blobs)
+        self.invalidate_model()
 
         if count > 0:
-            old_logs.unlink()
-            _logger.info("Cleaned up %s LLM API logs older than 30 days", count)
+            _logger.info("Cleaned up %s LLM API logs older than %s days", count, retention_days)
         else:
             _logger.debug("No LLM API logs to clean up")
+        if not done:
+            _logger.info("LLM API log cleanup stopped after %.0fs, continuing later", time.monotonic() - started)
+            cron = self.env.ref('im_livechat_ai.ir_cron_cleanup_llm_api_logs', raise_if_not_found=False)
+            if cron:
+                cron._trigger()
 
         return count
+
+    def _delete_in_batches(self, query, cutoff, batch_size, started, time_budget):
+        """
+        Run a batched DELETE until it deletes less than a full batch.
+
+        Each batch is committed, except in test mode where the test's
+        transaction must be kept.
+
+        Returns:
+            tuple: (rows deleted, whether all matching rows were deleted)
+        """
+        cr = self.env.cr
+        deleted = 0
+        while True:
+            if time_budget is not None and time.monotonic() - started > time_budget:
+                return deleted, False
+            cr.execute(query, [cutoff, batch_size])
+            # Read before the commit, whose hooks may run other queries
+            batch_deleted = cr.rowcount
+            deleted += batch_deleted
+            if not self.env.registry.in_test_mode():
+                cr.commit()
+            if batch_deleted < batch_size:
+                return deleted, True
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import psycopg2
+
+from odoo import api, fields, models
+
+from ..tools import payload_store
+
+
+class LLMApiPayload(models.Model):
+    """
+    Content-addressed store of the payloads of llm.api.log.
+
+    Payloads are cut into blobs (see tools.payload_store.split), stored
+    once per distinct content and zlib-compressed when large. A request
+    payload repeats the system prompt and the whole history at every
+    turn and retry; with blobs, each message is stored once instead.
+
+    Blobs are shared and never referenced by foreign keys: last_used is
+    refreshed (at most daily) whenever a log uses a blob again, and
+    blobs unused for longer than the log retention are deleted with
+    the logs.
+    """
+    _name = 'llm.api.payload'
+    _description = 'LLM API Payload'
+    _log_access = False
+
+    key = fields.Char(string='Key', required=True, readonly=True, index=True)
+    compressed = fields.Boolean(string='Compressed', readonly=True)
+    size = fields.Integer(string='Size (bytes)', readonly=True, help='Uncompressed size')
+    content = fields.Binary(string='Content', attachment=False, readonly=True)
+    last_used = fields.Date(string='Last Used', readonly=True, index=True)
+
+    _sql_constraints = [
+        ('key_uniq', 'unique(key)', 'A payload blob with this key already exists.'),
+    ]
+
+    @api.model
+    def _store(self, payloads):
+        """
+        Store payloads and return their references.
+
+        Blobs that already exist are only marked as used today; new
+        blobs are compressed and inserted with one multi-row INSERT.
+
+        Args:
+            payloads (list): Payloads (list, dict, JSON text or None)
+
+        Returns:
+            list: One reference (str or None) per payload
+        """
+        references = []
+        blobs = {}
+        for payload in payloads:
+            reference, payload_blobs = payload_store.split(payload)
+            references.append(reference)
+            blobs.update(payload_blobs)
+        if not blobs:
+            return references
+
+        cr = self.env.cr
+        today = fields.Date.today()
+        cr.execute("SELECT key FROM llm_api_payload WHERE key = ANY(%s)", [list(blobs)])
+        existing = [key for key, in cr.fetchall()]
+        if existing:
+            cr.execute("""
+                UPDATE llm_api_payload SET last_used = %s
+                 WHERE key = ANY(%s) AND last_used < %s
+            """, [today, existing, today])
+        values = []
+        # Sorted keys keep concurrent inserts of the same blobs from deadlocking
+        for key in sorted(set(blobs) - set(existing)):
+            compressed, content = payload_store.pack(blobs[key])
+            values.append((key, compressed, len(blobs[key]), psycopg2.Binary(content), today))
+        if values:
+            cr.execute(
+                "INSERT INTO llm_api_payload (key, compressed, size, content, last_used) VALUES %s"
+                " ON CONFLICT (key) DO NOTHING" % ', '.join(['%s'] * len(values)),
+                values,
+            )
+        return references
+
+    @api.model
+    def _load(self, references):
+        """
+        Rebuild payload texts from their references, in one query.
+
+        Returns:
+            dict: {reference: JSON text, or False if a blob is missing}
+        """
+        references = [reference for reference in references if reference]
+        keys = {key for reference in references for key in payload_store.reference_keys(reference)}
+        if not keys:
+            return {}
+        self.env.cr.execute(
+            "SELECT key, compressed, content FROM llm_api_payload WHERE key = ANY(%s)", [list(keys)],
+        )
+        blobs = {
+            key: payload_store.unpack(compressed, content)
+            for key, compressed, content in self.env.cr.fetchall()
+        }
+        return {reference: payload_store.join(reference, blobs) for reference in references}
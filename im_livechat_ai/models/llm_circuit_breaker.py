@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from datetime import datetime, timezone
+
+from odoo import api, fields, models
+
+from ..tools import circuit_breaker
+
+_logger = logging.getLogger(__name__)
+
+
+def _to_datetime(timestamp):
+    if not timestamp:
+        return False
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+def _to_timestamp(value):
+    if not value:
+        return None
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class LLMCircuitBreaker(models.Model):
+    """
+    Circuit breaker state of an LLM endpoint, shared by all Odoo processes.
+
+    Each process keeps an in-memory breaker per endpoint and model (see
+    tools/circuit_breaker.py) that all its threads consult before calling
+    the provider. State changes are mirrored here when a reply is
+    finalized and loaded back when the next reply is prepared, so a
+    circuit opened by one worker also makes the other workers fail fast.
+    """
+    _name = 'llm.circuit.breaker'
+    _description = 'LLM Circuit Breaker'
+    _order = 'base_url, model'
+    _rec_name = 'base_url'
+
+    base_url = fields.Char(string='API Base URL', required=True, readonly=True)
+    model = fields.Char(string='Model', required=True, readonly=True)
+    state = fields.Selection(
+        selection=[
+            ('closed', 'Closed'),
+            ('open', 'Open'),
+            ('half_open', 'Half-Open'),
+        ],
+        string='State',
+        default='closed',
+        required=True,
+        readonly=True,
+    )
+    failure_count = fields.Integer(
+        string='Consecutive Failures',
+        readonly=True,
+    )
+    opened_at = fields.Datetime(string='Opened On', readonly=True)
+    changed_at = fields.Float(
+        string='Changed At',
+        digits=(16, 3),
+        readonly=True,
+        help='Technical: epoch time of the last state change, used to merge process states',
+    )
+
+    _sql_constraints = [
+        ('endpoint_model_uniq', 'unique(base_url, model)', 'A circuit breaker already exists for this endpoint and model.'),
+    ]
+
+    @api.model
+    def _normalize_key(self, base_url, model):
+        return (base_url or '').strip().rstrip('/').lower(), model or ''
+
+    @api.model
+    def _find(self, base_url, model):
+        base_url, model = self._normalize_key(base_url, model)
+        return self.sudo().search([('base_url', '=', base_url), ('model', '=', model)], limit=1)
+
+    @api.model
+    def _get_settings(self):
+        """Failure threshold and recovery timeout from the system parameters."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        try:
+            threshold = int(ICP.get_param(
+                'im_livechat_ai.circuit_failure_threshold', circuit_breaker.DEFAULT_FAILURE_THRESHOLD))
+            recovery = float(ICP.get_param(
+                'im_livechat_ai.circuit_recovery_timeout', circuit_breaker.DEFAULT_RECOVERY_TIMEOUT))
+        except ValueError:
+            _logger.warning("Invalid LLM circuit breaker parameters, using defaults")
+            threshold, recovery = circuit_breaker.DEFAULT_FAILURE_THRESHOLD, circuit_breaker.DEFAULT_RECOVERY_TIMEOUT
+        return {'failure_threshold': max(1, threshold), 'recovery_timeout': max(1.0, recovery)}
+
+    @api.model
+    def _get_breaker(self, config, settings=None):
+        """
+        Return the process breaker of an endpoint, updated from the shared state.
+
+        Args:
+            config (dict): Settings returned by _get_llm_request_config
+            settings (dict|None): Result of _get_settings
+
+        Returns:
+            CircuitBreaker
+        """
+        breaker = circuit_breaker.get_breaker(
+            config['base_url'], config['model'], **(settings or self._get_settings()),
+        )
+        record = self._find(config['base_url'], config['model'])
+        if record:
+            breaker.load(
+                state=record.state,
+                failure_count=record.failure_count,
+                opened_at=_to_timestamp(record.opened_at),
+                changed_at=record.changed_at,
+            )
+        else:
+            breaker.load()
+        return breaker
+
+    @api.model
+    def _save_breaker(self, config, breaker):
+        """Mirror the local state changes of a breaker to the shared record."""
+        snapshot = breaker.snapshot()
+        if not snapshot['dirty']:
+            return
+        base_url, model = self._normalize_key(config['base_url'], config['model'])
+        self.flush_model()
+        # Upsert: two processes may open the circuit of a new endpoint at once
+        self.env.cr.execute("""
+            INSERT INTO llm_circuit_breaker
+                   (base_url, model, state, failure_count, opened_at, changed_at,
+                    create_uid, create_date, write_uid, write_date)
+            VALUES (%(base_url)s, %(model)s, %(state)s, %(failure_count)s, %(opened_at)s, %(changed_at)s,
+                    %(uid)s, (now() at time zone 'UTC'), %(uid)s, (now() at time zone 'UTC'))
+            ON CONFLICT (base_url, model) DO UPDATE
+               SET state = EXCLUDED.state,
+                   failure_count = EXCLUDED.failure_count,
+                   opened_at = EXCLUDED.opened_at,
+                   changed_at = EXCLUDED.changed_at,
+                   write_uid = EXCLUDED.write_uid,
+                   write_date = EXCLUDED.write_date
+             WHERE llm_circuit_breaker.changed_at IS NULL
+                OR llm_circuit_breaker.changed_at <= EXCLUDED.changed_at
+        """, {
+            'base_url': base_url,
+            'model': model,
+            'state': snapshot['state'],
+            'failure_count': snapshot['failure_count'],
+            'opened_at': _to_datetime(snapshot['opened_at']) or None,
+            'changed_at': snapshot['changed_at'],
+            'uid': self.env.uid,
+        })
+        self.invalidate_model()
+        breaker.mark_saved(snapshot['version'])
+
+    def _get_current_state(self):
+        """State as seen by a new request: an open circuit past its timeout is half-open."""
+        self.ensure_one()
+        if self.state != 'open':
+            return self.state
+        recovery = self._get_settings()['recovery_timeout']
+        opened_at = _to_timestamp(self.opened_at) or 0.0
+        if datetime.now(timezone.utc).timestamp() - opened_at >= recovery:
+            return 'half_open'
+        return 'open'
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import api, fields, models
+
+from ..tools import rate_limiter
+
+_logger = logging.getLogger(__name__)
+
+
+class LLMRateLimit(models.Model):
+    """
+    Token buckets limiting the requests and tokens per minute of an API key.
+
+    Providers enforce RPM/TPM limits per key; bursts above them end in
+    429 errors. Every Odoo process reserves its calls here with a single
+    atomic UPDATE before sending them, and waits until the reservation is
+    covered instead of being rejected by the provider. Buckets refill
+    continuously at limit / 60 per second, computed from the database
+    clock so that all processes and nodes agree.
+    """
+    _name = 'llm.rate.limit'
+    _description = 'LLM Rate Limit'
+    _order = 'key_hint'
+    _rec_name = 'key_hint'
+
+    key_hash = fields.Char(string='API Key Hash', required=True, readonly=True, index=True)
+    key_hint = fields.Char(string='API Key', readonly=True)
+    rpm_limit = fields.Integer(string='Requests / Minute', readonly=True)
+    tpm_limit = fields.Integer(string='Tokens / Minute', readonly=True)
+    request_level = fields.Float(
+        string='Request Bucket',
+        readonly=True,
+        help='Technical: requests left at the last update; negative while calls wait for their turn',
+    )
+    token_level = fields.Float(
+        string='Token Bucket',
+        readonly=True,
+        help='Technical: tokens left at the last update; negative while calls wait for their turn',
+    )
+    updated_at = fields.Float(
+        string='Updated At',
+        digits=(16, 3),
+        readonly=True,
+        help='Technical: database epoch time of the last update',
+    )
+    request_fill = fields.Float(
+        string='Requests Available (%)',
+        compute='_compute_fill',
+        help='Share of the request bucket available now',
+    )
+    token_fill = fields.Float(
+        string='Tokens Available (%)',
+        compute='_compute_fill',
+        help='Share of the token bucket available now',
+    )
+
+    _sql_constraints = [
+        ('key_hash_uniq', 'unique(key_hash)', 'A rate limit already exists for this API key.'),
+    ]
+
+    def _compute_fill(self):
+        for record, levels in zip(self, self._get_fill_levels()):
+            record.request_fill = levels['requests'] * 100
+            record.token_fill = levels['tokens'] * 100
+
+    def _get_fill_levels(self):
+        """
+        Returns:
+            list: {'requests': float, 'tokens': float} per record, the share
+                (0-1) of each bucket available now
+        """
+        if not self:
+            return []
+        self.env.cr.execute("SELECT extract(epoch from clock_timestamp())")
+        now = float(self.env.cr.fetchone()[0])
+        return [{
+            'requests': rate_limiter.fill_level(
+                record.request_level, record.rpm_limit, now - (record.updated_at or now)),
+            'tokens': rate_limiter.fill_level(
+                record.token_level, record.tpm_limit, now - (record.updated_at or now)),
+        } for record in self]
+
+    @api.model
+    def _reserve(self, config, tokens):
+        """
+        Reserve one request and ``tokens`` tokens for a call with an API key.
+
+        Args:
+            config (dict): Request settings with api_key, rpm_limit and tpm_limit
+            tokens (int): Estimated tokens of the call
+
+        Returns:
+            float|bool: Seconds to wait before sending the call, or False if
+                the wait would exceed MAX_QUEUE_WAIT (nothing is reserved then)
+        """
+        rpm_limit = config.get('rpm_limit') or 0
+        tpm_limit = config.get('tpm_limit') or 0
+        if not rpm_limit and not tpm_limit:
+            return 0.0
+        params = {
+            'key_hash': rate_limiter.key_hash(config.get('api_key')),
+            'key_hint': rate_limiter.key_hint(config.get('api_key')),
+            'rpm': rpm_limit,
+            'tpm': tpm_limit,
+            'tokens': tokens if tpm_limit else 0,
+            'uid': self.env.uid,
+        }
+        self.flush_model()
+        self.env.cr.execute("""
+            INSERT INTO llm_rate_limit
+                   (key_hash, key_hint, rpm_limit, tpm_limit, request_level, token_level, updated_at,
+                    create_uid, create_date, write_uid, write_date)
+            VALUES (%(key_hash)s, %(key_hint)s, %(rpm)s, %(tpm)s, %(rpm)s, %(tpm)s,
+                    extract(epoch from clock_timestamp()),
+                    %(uid)s, (now() at time zone 'UTC'), %(uid)s, (now() at time zone 'UTC'))
+            ON CONFLICT (key_hash) DO NOTHING
+        """, params)
+        # Refill for the elapsed time, then take the reservation, in one atomic statement
+        self.env.cr.execute("""
+            UPDATE llm_rate_limit
+               SET rpm_limit = %(rpm)s,
+                   tpm_limit = %(tpm)s,
+                   request_level = LEAST(%(rpm)s, request_level
+                       + GREATEST(0, extract(epoch from clock_timestamp()) - updated_at) * %(rpm)s / 60.0) - 1,
+                   token_level = LEAST(%(tpm)s, token_level
+                       + GREATEST(0, extract(epoch from clock_timestamp()) - updated_at) * %(tpm)s / 60.0)
+                       - %(tokens)s,
+                   updated_at = extract(epoch from clock_timestamp())
+             WHERE key_hash = %(key_hash)s
+         RETURNING request_level, token_level
+        """, params)
+        request_level, token_level = self.env.cr.fetchone()
+        self.invalidate_model()
+        wait = rate_limiter.compute_wait(request_level, token_level, rpm_limit, tpm_limit)
+        if wait > rate_limiter.MAX_QUEUE_WAIT:
+            self._release(config, 1, params['tokens'])
+            _logger.warning(
+                "LLM rate limit of API key %s saturated: next call in %.1fs, giving up",
+                params['key_hint'], wait,
+            )
+            return False
+        return wait
+
+    @api.model
+    def _release(self, config, requests=0, tokens=0):
+        """Give back reserved requests or tokens that were not used."""
+        if not (requests or tokens) or not (config.get('rpm_limit') or config.get('tpm_limit')):
+            return
+        self.flush_model()
+        self.env.cr.execute("""
+            UPDATE llm_rate_limit
+               SET request_level = LEAST(rpm_limit, request_level + %(requests)s),
+                   token_level = LEAST(tpm_limit, token_level + %(tokens)s)
+             WHERE key_hash = %(key_hash)s
+        """, {
+            'key_hash': rate_limiter.key_hash(config.get('api_key')),
+            'requests': requests if config.get('rpm_limit') else 0,
+            'tokens': tokens if config.get('tpm_limit') else 0,
+        })
+        self.invalidate_model()
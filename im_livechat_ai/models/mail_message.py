@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models
+
+from ..tools import context_cache
+
+
+class MailMessage(models.Model):
+    """
+    Drop cached LLM conversation histories when their messages change.
+
+    Other processes notice the change through the count/write_date check
+    of DiscussChannel._get_llm_context_entry; this makes it immediate in
+    the current one, including edits made in the transaction that
+    created the message.
+    """
+    _inherit = 'mail.message'
+
+    def write(self, vals):
+        if {'body', 'author_id', 'message_type', 'model', 'res_id'} & set(vals):
+            self._invalidate_llm_context_cache()
+        res = super().write(vals)
+        if {'model', 'res_id'} & set(vals):
+            self._invalidate_llm_context_cache()
+        return res
+
+    def unlink(self):
+        self._invalidate_llm_context_cache()
+        return super().unlink()
+
+    def _invalidate_llm_context_cache(self):
+        dbname = self.env.cr.dbname
+        for res_id in set(self.sudo().filtered(lambda m: m.model == 'discuss.channel').mapped('res_id')):
+            context_cache.conversation_cache.invalidate((dbname, res_id))
@@ -4,3 +4,18 @@ from . import test_im_livechat_ai
 from . import test_discuss_channel
 from . import test_integration
 from . import test_edge_cases
+from . import test_worker_pool
+from . import test_ai_job
+from . import test_http_session
+from . import test_streaming
+from . import test_retry
+from . import test_circuit_breaker
+from . import test_tokenizer
+from . import test_response_cache
+from . import test_semantic_cache
+from . import test_knowledge
+from . import test_endpoint_router
+from . import test_rate_limit
+from . import test_async_engine
+from . import test_log_buffer
+from . import test_payload_store
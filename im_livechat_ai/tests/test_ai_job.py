@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch
+
+from odoo.exceptions import ValidationError
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.im_livechat_ai.models.im_livechat_channel import ImLivechatChannel, LLM_REQUEST_TIMEOUT
+
+
+class TestImLivechatAiJob(TransactionCase):
+    """Tests for the durable AI reply job queue."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.channel = cls.env['im_livechat.channel'].create({
+            'name': 'Job Test Channel',
+            'ai_enabled': True,
+            'ai_api_base_url': 'https://api.openai.com/v1',
+            'ai_api_key': 'sk-test',
+            'ai_model': 'gpt-4o',
+        })
+        cls.session = cls.env['discuss.channel'].create({
+            'name': 'Job Session',
+            'channel_type': 'livechat',
+            'livechat_channel_id': cls.channel.id,
+        })
+        cls.Job = cls.env['im_livechat_ai.job']
+        # Only consider jobs created by this test
+        cls.Job.search([('state', 'in', ('pending', 'running'))]).write({'state': 'cancelled'})
+
+    def _enqueue(self):
+        return self.Job._enqueue(self.channel, self.session)
+
+    def _expire(self, job):
+        self.env.cr.execute(
+            "UPDATE im_livechat_ai_job SET lease_expiry = (now() at time zone 'UTC') - interval '1 minute' WHERE id = %s",
+            [job.id],
+        )
+        job.invalidate_recordset()
+
+    def test_claim_marks_running_with_lease(self):
+        """Claiming should take the job, count the attempt and set a lease."""
+        job = self._enqueue()
+        claimed = self.Job._claim(limit=1)
+        self.assertEqual([c['id'] for c in claimed], [job.id])
+        self.assertEqual(job.state, 'running')
+        self.assertEqual(job.attempt_count, 1)
+        self.assertTrue(job.lease_expiry)
+
+    def test_running_job_not_claimed_twice(self):
+        """A job with a live lease should not be claimed again."""
+        self._enqueue()
+        self.assertTrue(self.Job._claim(limit=1))
+        self.assertFalse(self.Job._claim(limit=1))
+
+    def test_expired_lease_reclaimed(self):
+        """A job whose worker died should be claimed again once the lease expires."""
+        job = self._enqueue()
+        self.Job._claim(limit=1)
+        self._expire(job)
+        claimed = self.Job._claim(limit=1)
+        self.assertEqual([c['id'] for c in claimed], [job.id])
+        self.assertEqual(job.attempt_count, 2)
+
+    def test_expired_lease_after_last_attempt_fails(self):
+        """An abandoned job that used all its attempts should be failed."""
+        job = self._enqueue()
+        job.max_attempts = 1
+        self.Job._claim(limit=1)
+        self._expire(job)
+        self.assertFalse(self.Job._claim(limit=1))
+        self.assertEqual(job.state, 'failed')
+
+    def _set_lease(self, job, seconds):
+        self.env.cr.execute(
+            "UPDATE im_livechat_ai_job SET lease_expiry = (now() at time zone 'UTC') + make_interval(secs => %s)"
+            " WHERE id = %s",
+            [seconds, job.id],
+        )
+        job.invalidate_recordset()
+
+    def _lease_left(self, job):
+        self.env.cr.execute(
+            "SELECT extract(epoch FROM lease_expiry - (now() at time zone 'UTC')) FROM im_livechat_ai_job"
+            " WHERE id = %s",
+            [job.id],
+        )
+        return self.env.cr.fetchone()[0]
+
+    def test_renewed_lease_not_reclaimed_mid_retry(self):
+        """A job still retrying should keep its lease and not be claimed a second time."""
+        job = self._enqueue()
+        self.Job._claim(limit=1)
+        # The initial lease is nearly spent by earlier attempts
+        self._set_lease(job, 5)
+        self.channel._renew_ai_job_lease(self.env, job.id, 300)
+        self.assertGreaterEqual(self._lease_left(job), 300)
+        self.assertFalse(self.Job._claim(limit=1))
+        self.assertEqual(job.attempt_count, 1)
+
+    def test_renew_lease_never_shortens(self):
+        """Renewing should keep a longer lease, and leave finished jobs alone."""
+        job = self._enqueue()
+        self.Job._claim(limit=1)
+        self._set_lease(job, 1000)
+        job._renew_lease(60)
+        self.assertGreaterEqual(self._lease_left(job), 1000)
+        job._mark_done()
+        job._renew_lease(60)
+        self.assertFalse(job.lease_expiry)
+
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.time.sleep')
+    def test_lease_renewed_before_each_call_and_wait(self, mock_sleep):
+        """The worker should renew its lease before every LLM call and retry wait."""
+        request = {
+            'channel_id': self.channel.id,
+            'discuss_channel_id': self.session.id,
+            'messages': [{'role': 'user', 'content': 'Hi'}],
+            'config': self.channel._get_llm_request_config(),
+            'max_retries': 3,
+            'retry_delay': 1,
+        }
+        renewals = []
+        with patch.object(ImLivechatChannel, '_send_llm_request', side_effect=[
+            Exception('Error 1'),
+            {'choices': [{'message': {'content': 'Hello'}}]},
+        ]):
+            result = self.channel._execute_ai_request(request, renew_lease=renewals.append)
+        self.assertEqual(result['reply'], 'Hello')
+        # Call, wait, call
+        self.assertEqual(len(renewals), 3)
+        self.assertEqual(renewals[0], renewals[2])
+        self.assertGreater(renewals[0], LLM_REQUEST_TIMEOUT)
+        self.assertAlmostEqual(renewals[1], renewals[0] + mock_sleep.call_args.args[0])
+
+    def test_release_requeues_job(self):
+        """Releasing a job with attempts left should make it pending again."""
+        job = self._enqueue()
+        self.Job._claim(limit=1)
+        job._release('boom')
+        self.assertEqual(job.state, 'pending')
+        self.assertEqual(job.last_error, 'boom')
+
+    def test_finalize_completes_job(self):
+        """The transaction posting the reply should also complete the job."""
+        job = self._enqueue()
+        self.Job._claim(limit=1)
+        request = {
+            'channel_id': self.channel.id,
+            'discuss_channel_id': self.session.id,
+            'messages': [{'role': 'user', 'content': 'Hi'}],
+            'config': self.channel._get_llm_request_config(),
+            'job_id': job.id,
+        }
+        result = {'reply': 'Hello!', 'attempts': [], 'error': None}
+        self.channel._finalize_ai_response(self.env, request, result)
+        self.assertEqual(job.state, 'done')
+        self.assertTrue(job.date_done)
+
+    def test_debounce_coalesces_burst(self):
+        """Messages within the debounce window should share one pending job."""
+        self.channel.ai_debounce_delay = 3
+        first = self._enqueue()
+        second = self._enqueue()
+        self.assertEqual(first, second)
+        self.assertEqual(first.coalesced_count, 2)
+        self.assertEqual(self.Job.search_count([('discuss_channel_id', '=', self.session.id)]), 1)
+
+    def test_debounced_job_not_claimed_before_due(self):
+        """A job should not be claimed until its debounce window has passed."""
+        self.channel.ai_debounce_delay = 30
+        job = self._enqueue()
+        self.assertFalse(self.Job._claim(limit=1))
+        job.scheduled_at = '2000-01-01 00:00:00'
+        self.assertEqual([c['id'] for c in self.Job._claim(limit=1)], [job.id])
+
+    def test_no_debounce_creates_one_job_per_message(self):
+        """Without a debounce window every message should get its own job."""
+        self.assertNotEqual(self._enqueue(), self._enqueue())
+
+    def test_superseded_reply_dropped(self):
+        """A running job's reply should be dropped when a newer message arrived."""
+        job = self._enqueue()
+        self.Job._claim(limit=1)
+        newer = self._enqueue()
+        self.assertTrue(job._is_superseded())
+        self.assertFalse(newer._is_superseded())
+        request = {
+            'channel_id': self.channel.id,
+            'discuss_channel_id': self.session.id,
+            'messages': [{'role': 'user', 'content': 'Hi'}],
+            'config': self.channel._get_llm_request_config(),
+            'job_id': job.id,
+        }
+        message_count = len(self.session.message_ids)
+        self.channel._finalize_ai_response(self.env, request, {'reply': 'Stale', 'attempts': [], 'error': None})
+        self.assertEqual(job.state, 'cancelled')
+        self.assertEqual(len(self.session.message_ids), message_count)
+
+    def test_invalid_debounce_delay(self):
+        """The debounce window should be limited to 30 seconds."""
+        with self.assertRaises(ValidationError):
+            self.channel.ai_debounce_delay = 31
+
+    def test_single_flight_per_session(self):
+        """A session's next job should wait until its running job is finished."""
+        first = self._enqueue()
+        second = self._enqueue()
+        self.assertEqual([c['id'] for c in self.Job._claim(limit=2)], [first.id])
+        self.assertFalse(self.Job._claim(limit=1))
+        first._mark_done()
+        self.assertEqual([c['id'] for c in self.Job._claim(limit=1)], [second.id])
+
+    def test_single_flight_does_not_block_other_sessions(self):
+        """Jobs of other sessions should still be claimed while one session is busy."""
+        other_session = self.env['discuss.channel'].create({
+            'name': 'Other Job Session',
+            'channel_type': 'livechat',
+            'livechat_channel_id': self.channel.id,
+        })
+        self._enqueue()
+        self._enqueue()
+        other = self.Job._enqueue(self.channel, other_session)
+        claimed = self.Job._claim(limit=1)
+        self.assertEqual([c['id'] for c in self.Job._claim(limit=1)], [other.id])
+        self.assertEqual(len(claimed), 1)
+
+    def test_single_flight_while_retrying_past_initial_lease(self):
+        """A session's next job should wait for a first job still retrying after its initial lease."""
+        self.env['ir.config_parameter'].sudo().set_param('im_livechat_ai.job_lease_seconds', '60')
+        first = self._enqueue()
+        second = self._enqueue()
+        self.Job._claim(limit=1)
+        # The initial lease is about to run out when the worker waits for a retry
+        self._set_lease(first, 1)
+        self.channel._renew_ai_job_lease(self.env, first.id, ImLivechatChannel._get_ai_step_lease(('sleep', 120)))
+        self.assertGreater(self._lease_left(first), 60)
+        self.assertFalse(self.Job._claim(limit=2))
+        self.assertEqual(second.state, 'pending')
+        first._mark_done()
+        self.assertEqual([c['id'] for c in self.Job._claim(limit=1)], [second.id])
+
+    def test_expired_running_job_does_not_block_session(self):
+        """An abandoned running job should not hold its session forever."""
+        first = self._enqueue()
+        self.Job._claim(limit=1)
+        self._expire(first)
+        second = self._enqueue()
+        claimed = self.Job._claim(limit=2)
+        self.assertEqual([c['id'] for c in claimed], [first.id])
+        first._mark_done()
+        self.assertEqual([c['id'] for c in self.Job._claim(limit=1)], [second.id])
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+import unittest
+from unittest.mock import patch, AsyncMock, MagicMock
+
+import requests
+
+from odoo.tests.common import BaseCase, TransactionCase
+
+from odoo.addons.im_livechat_ai.tools import async_engine
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+@unittest.skipUnless(async_engine.is_available(), "httpx is not installed")
+class TestAsyncEngineTool(BaseCase):
+    """Tests for the asyncio LLM engine."""
+
+    def _make_engine(self, **kwargs):
+        engine = async_engine.AsyncLLMEngine(**kwargs)
+        self.addCleanup(engine.shutdown, 5)
+        return engine
+
+    def test_runs_jobs_concurrently_on_one_thread(self):
+        engine = self._make_engine(max_in_flight=50)
+        release = threading.Event()
+        threads = set()
+        done = threading.Semaphore(0)
+
+        async def job():
+            threads.add(threading.current_thread().name)
+            while not release.is_set():
+                await asyncio.sleep(0.01)
+            done.release()
+
+        for _i in range(50):
+            self.assertTrue(engine.submit(job))
+        # The engine is full: further jobs are refused
+        self.assertFalse(engine.submit(job))
+        self.assertFalse(engine.has_capacity())
+        release.set()
+        for _i in range(50):
+            self.assertTrue(done.acquire(timeout=5))
+        self.assertEqual(len(threads), 1)
+        self.assertEqual(engine.stats()['rejected'], 1)
+
+    def test_notifies_when_a_slot_frees(self):
+        engine = self._make_engine(max_in_flight=1)
+        release = threading.Event()
+        notified = threading.Event()
+
+        async def job():
+            while not release.is_set():
+                await asyncio.sleep(0.01)
+
+        self.assertTrue(engine.submit(job))
+        engine.notify_when_free(notified.set)
+        self.assertFalse(notified.is_set())
+        release.set()
+        self.assertTrue(notified.wait(5))
+
+    def test_http_errors_become_requests_errors(self):
+        response = httpx.Response(
+            429, headers={'Retry-After': '3'}, content=b'slow down',
+            request=httpx.Request('POST', 'https://api.example.com/v1/chat/completions'),
+        )
+        converted = async_engine.to_requests_response(response)
+        with self.assertRaises(requests.HTTPError) as error:
+            converted.raise_for_status()
+        self.assertEqual(error.exception.response.status_code, 429)
+        self.assertEqual(error.exception.response.headers['retry-after'], '3')
+        self.assertEqual(converted.text, 'slow down')
+
+
+@unittest.skipUnless(async_engine.is_available(), "httpx is not installed")
+class TestAsyncEngineFlow(TransactionCase):
+    """Tests for the AI pipeline driven by the async engine."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.channel = cls.env['im_livechat.channel'].create({
+            'name': 'Async Channel',
+            'ai_enabled': True,
+            'ai_api_base_url': 'https://api.openai.com/v1',
+            'ai_api_key': 'sk-async-test',
+            'ai_model': 'gpt-4o',
+            'ai_max_retries': 3,
+        })
+        cls.session = cls.env['discuss.channel'].create({
+            'name': 'Async Session',
+            'channel_type': 'livechat',
+            'livechat_channel_id': cls.channel.id,
+        })
+        cls.env['mail.message'].create({
+            'body': 'Do you ship abroad?',
+            'model': 'discuss.channel',
+            'res_id': cls.session.id,
+            'message_type': 'comment',
+            'author_id': cls.env['res.partner'].create({'name': 'Async Visitor'}).id,
+        })
+
+    def _response(self, status, json_data):
+        return httpx.Response(
+            status, json=json_data,
+            request=httpx.Request('POST', 'https://api.openai.com/v1/chat/completions'),
+        )
+
+    def test_engine_disabled_by_default(self):
+        self.assertIsNone(self.channel._get_ai_async_engine())
+        self.env['ir.config_parameter'].sudo().set_param('im_livechat_ai.llm_engine', 'async')
+        self.assertIsInstance(self.channel._get_ai_async_engine(), async_engine.AsyncLLMEngine)
+
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.asyncio.sleep', new_callable=AsyncMock)
+    def test_retries_without_blocking(self, mock_sleep):
+        request = self.channel._prepare_ai_request(self.env, self.channel.id, self.session.id)
+        engine = async_engine.AsyncLLMEngine()
+        mock_post = AsyncMock(side_effect=[
+            self._response(503, {'error': 'overloaded'}),
+            self._response(200, {
+                'choices': [{'message': {'content': 'Yes, worldwide.'}}],
+                'usage': {'prompt_tokens': 20, 'completion_tokens': 4, 'total_tokens': 24},
+            }),
+        ])
+        with patch.object(httpx.AsyncClient, 'post', mock_post):
+            result = asyncio.run(self.channel._execute_ai_request_async(request, engine))
+
+        self.assertEqual(result['reply'], 'Yes, worldwide.')
+        self.assertEqual([attempt['status'] for attempt in result['attempts']], ['retry', 'success'])
+        self.assertIn('503', result['attempts'][0]['error_message'])
+        mock_sleep.assert_awaited_once()
+        sent = mock_post.call_args
+        self.assertEqual(sent.args[0], 'https://api.openai.com/v1/chat/completions')
+        self.assertEqual(sent.kwargs['json']['model'], 'gpt-4o')
+        self.assertEqual(sent.kwargs['headers']['Authorization'], 'Bearer sk-async-test')
+
+    def test_session_follow_up_drained_after_async_job(self):
+        """A follow-up job skipped while its session was busy should be claimed once the first job ends."""
+        Job = self.env['im_livechat_ai.job']
+        Job.search([('state', 'in', ('pending', 'running'))]).write({'state': 'cancelled'})
+        first = Job._enqueue(self.channel, self.session)
+        second = Job._enqueue(self.channel, self.session)
+        claimed = Job._claim(limit=2)
+        self.assertEqual([c['id'] for c in claimed], [first.id])
+
+        pool = MagicMock()
+        engine = async_engine.AsyncLLMEngine()
+
+        async def process(engine, channel_id, discuss_channel_id, job_id=None):
+            Job.browse(job_id)._mark_done()
+
+        with patch.object(type(self.channel), '_process_ai_response_async', side_effect=process):
+            asyncio.run(Job._run_claimed_job_async(engine, pool, claimed[0]))
+        pool.schedule.assert_called_once_with(0, Job._drain_queue)
+        self.assertEqual([c['id'] for c in Job._claim(limit=1)], [second.id])
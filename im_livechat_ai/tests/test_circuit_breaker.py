@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch, MagicMock
+
+import requests
+
+from odoo.tests.common import BaseCase, TransactionCase
+
+from odoo.addons.im_livechat_ai.tools import circuit_breaker
+from odoo.addons.im_livechat_ai.tools.circuit_breaker import (
+    CircuitBreaker, STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, is_provider_failure,
+)
+
+
+class TestCircuitBreaker(BaseCase):
+    """Tests for the in-process circuit breaker."""
+
+    def setUp(self):
+        super().setUp()
+        self.now = [1000.0]
+        self.breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=30, clock=lambda: self.now[0])
+
+    def test_opens_after_threshold(self):
+        for _i in range(2):
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_success_resets_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+
+    def test_half_open_single_probe(self):
+        """After the timeout, one probe is let through; its outcome decides the state."""
+        for _i in range(3):
+            self.breaker.record_failure()
+        self.now[0] += 31
+        self.assertEqual(self.breaker.state, STATE_HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+
+        self.now[0] += 31
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_load_keeps_unsaved_local_changes(self):
+        """Shared state must not overwrite changes not mirrored yet."""
+        for _i in range(3):
+            self.breaker.record_failure()
+        self.breaker.load()
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+        self.breaker.mark_saved(self.breaker.snapshot()['version'])
+        self.breaker.load()
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+
+    def test_load_adopts_remote_open_state(self):
+        self.breaker.load(state=STATE_OPEN, failure_count=5, opened_at=self.now[0], changed_at=self.now[0])
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_provider_failures(self):
+        """Only unavailability errors should count against the endpoint."""
+        response = MagicMock(status_code=503)
+        self.assertTrue(is_provider_failure(requests.HTTPError(response=response)))
+        self.assertTrue(is_provider_failure(requests.ConnectionError('refused')))
+        response = MagicMock(status_code=401)
+        self.assertFalse(is_provider_failure(requests.HTTPError(response=response)))
+        self.assertFalse(is_provider_failure(ValueError('Empty response from LLM API')))
+
+
+class TestCircuitBreakerFlow(TransactionCase):
+    """The circuit breaker in the AI reply pipeline."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.channel = cls.env['im_livechat.channel'].create({
+            'name': 'Breaker Test Channel',
+            'ai_enabled': True,
+            'ai_api_base_url': 'https://breaker-test.example.com/v1',
+            'ai_api_key': 'sk-test',
+            'ai_model': 'breaker-model',
+            'ai_max_retries': 3,
+            'ai_retry_delay': 1,
+            'ai_error_message': 'AI is unavailable.',
+        })
+        cls.bot_partner = cls.channel._get_or_create_bot_partner()
+        cls.session = cls.env['discuss.channel'].create({
+            'name': 'Breaker Session',
+            'channel_type': 'livechat',
+            'livechat_channel_id': cls.channel.id,
+        })
+        cls.env['mail.message'].create({
+            'body': 'Hello?',
+            'model': 'discuss.channel',
+            'res_id': cls.session.id,
+            'message_type': 'comment',
+            'author_id': cls.env['res.partner'].create({'name': 'Breaker Visitor'}).id,
+        })
+        cls.env['ir.config_parameter'].sudo().set_param('im_livechat_ai.circuit_failure_threshold', 2)
+
+    def setUp(self):
+        super().setUp()
+        config = self.channel._get_llm_request_config()
+        self.breaker = circuit_breaker.get_breaker(config['base_url'], config['model'])
+        self.addCleanup(self.breaker.reset)
+
+    def _process(self):
+        self.channel._process_ai_response(
+            self.env.cr.dbname, self.channel.id, self.session.id, test_env=self.env,
+        )
+
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.time.sleep')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
+    def test_open_circuit_fails_fast(self, mock_post, mock_sleep):
+        """Once the circuit opens, replies post the fallback without calling the API."""
+        mock_post.side_effect = requests.ConnectionError('refused')
+        self._process()
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(self.channel.ai_circuit_state, 'open')
+        shared = self.env['llm.circuit.breaker']._find(self.channel.ai_api_base_url, self.channel.ai_model)
+        self.assertEqual(shared.state, 'open')
+
+        mock_post.reset_mock()
+        self._process()
+        mock_post.assert_not_called()
+        error_log = self.env['llm.api.log'].search([
+            ('livechat_channel_id', '=', self.channel.id),
+            ('status', '=', 'error'),
+        ], order='id desc', limit=1)
+        self.assertIn('Circuit breaker open', error_log.error_message)
+        bot_messages = self.env['mail.message'].search([
+            ('model', '=', 'discuss.channel'),
+            ('res_id', '=', self.session.id),
+            ('author_id', '=', self.bot_partner.id),
+        ])
+        self.assertEqual(len([m for m in bot_messages if 'AI is unavailable.' in m.body]), 2)
+
+    def test_state_shared_across_processes(self):
+        """A circuit opened by another process should be loaded when preparing a reply."""
+        config = self.channel._get_llm_request_config()
+        other_process = CircuitBreaker(failure_threshold=1)
+        other_process.record_failure()
+        self.env['llm.circuit.breaker']._save_breaker(config, other_process)
+        self.assertEqual(self.channel.ai_circuit_state, 'open')
+
+        self.env['llm.circuit.breaker']._get_breaker(config)
+        self.assertEqual(self.breaker.state, STATE_OPEN)
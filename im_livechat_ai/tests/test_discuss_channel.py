@@ -2,8 +2,14 @@
 
 from unittest.mock import patch
 
+import requests
+
+from odoo.exceptions import ValidationError
 from odoo.tests.common import TransactionCase
 
+from odoo.addons.im_livechat_ai.models.im_livechat_channel import ImLivechatChannel
+from odoo.addons.im_livechat_ai.tools.tokenizer import HeuristicTokenizer
+
 
 class TestDiscussChannel(TransactionCase):
     """Tests for discuss.channel AI response triggering and message building."""
@@ -202,6 +208,23 @@ class TestDiscussChannel(TransactionCase):
         # Restore
         self.livechat_channel.write({'ai_max_history': 10})
 
+    def test_history_window_moves_in_steps(self):
+        """The first message sent should stay the same for several turns."""
+        self.livechat_channel.write({'ai_max_history': 8})  # steps of 2 messages
+        for i in range(9):
+            self._create_message(author_id=self.visitor_partner.id, body=f'Message {i}')
+        first = self.session._build_llm_messages(self.livechat_channel)
+        self.assertEqual(first[1]['content'], 'Message 2')
+
+        self._create_message(author_id=self.visitor_partner.id, body='Message 9')
+        second = self.session._build_llm_messages(self.livechat_channel)
+        self.assertEqual(second[:len(first)], first)
+        self.assertEqual(len(second), 1 + 8)
+
+        self._create_message(author_id=self.visitor_partner.id, body='Message 10')
+        third = self.session._build_llm_messages(self.livechat_channel)
+        self.assertEqual(third[1]['content'], 'Message 4')
+
     def test_build_llm_messages_chronological_order(self):
         """Messages should be in chronological order."""
         self._create_message(author_id=self.visitor_partner.id, body='First')
@@ -232,3 +255,179 @@ class TestDiscussChannel(TransactionCase):
 
         # Restore
         self.livechat_channel.write({'ai_system_prompt': 'You are a helpful assistant.'})
+
+    # --- Bot Partner Resolver Tests ---
+
+    def test_bot_partner_ids_cached(self):
+        """Repeated lookups should be served from the ormcache, without env.ref."""
+        Channel = self.env['im_livechat.channel']
+        Channel._get_ai_bot_partner_ids(self.livechat_channel.id, include_odoobot=True)
+        msg = self._create_message(author_id=self.bot_partner.id)
+        with patch.object(type(self.env), 'ref', side_effect=AssertionError('env.ref called')):
+            self.assertFalse(self.session._is_visitor_message(msg))
+
+    def test_bot_partner_ids_invalidated_on_change(self):
+        """Changing the channel's bot partner should refresh the cached ids."""
+        Channel = self.env['im_livechat.channel']
+        self.assertIn(self.bot_partner.id, Channel._get_ai_bot_partner_ids(self.livechat_channel.id))
+        new_bot = self.env['res.partner'].create({'name': 'New Bot'})
+        self.livechat_channel.write({'ai_bot_partner_id': new_bot.id})
+        bot_ids = Channel._get_ai_bot_partner_ids(self.livechat_channel.id)
+        self.assertIn(new_bot.id, bot_ids)
+        self.assertNotIn(self.bot_partner.id, bot_ids)
+        self.assertNotIn(self.env.ref('base.partner_root').id, bot_ids)
+
+    # --- Context Cache Tests ---
+
+    def test_context_cache_appends_new_messages(self):
+        """A new turn should only add the new message to the cached history."""
+        self._create_message(author_id=self.visitor_partner.id, body='<p>First</p>')
+        first = self.session._get_llm_context_entry()
+        self._create_message(author_id=self.bot_partner.id, body='<p>Second &amp; last</p>')
+        with patch('odoo.addons.im_livechat_ai.models.discuss_channel._clean_body',
+                   wraps=lambda body: body) as mock_clean:
+            second = self.session._get_llm_context_entry()
+        self.assertEqual(mock_clean.call_count, 1)
+        self.assertEqual(second.messages[:-1], first.messages)
+        self.assertEqual(second.count, first.count + 1)
+
+    def test_context_cache_invalidated_on_edit(self):
+        """Editing a cached message should rebuild the history."""
+        msg = self._create_message(author_id=self.visitor_partner.id, body='Original')
+        self.session._build_llm_messages(self.livechat_channel)
+        msg.write({'body': 'Edited'})
+        contents = [m['content'] for m in self.session._build_llm_messages(self.livechat_channel)]
+        self.assertIn('Edited', contents)
+        self.assertNotIn('Original', contents)
+
+    def test_context_cache_invalidated_on_delete(self):
+        """Deleting a cached message should remove it from the history."""
+        msg = self._create_message(author_id=self.visitor_partner.id, body='To be deleted')
+        self.session._build_llm_messages(self.livechat_channel)
+        msg.unlink()
+        contents = [m['content'] for m in self.session._build_llm_messages(self.livechat_channel)]
+        self.assertNotIn('To be deleted', contents)
+
+    # --- Token Budget Tests ---
+
+    @patch('odoo.addons.im_livechat_ai.tools.tokenizer.get_tokenizer', return_value=HeuristicTokenizer())
+    def test_token_budget_keeps_newest_messages(self, _mock_tokenizer):
+        """Older messages that do not fit in the token budget should be dropped."""
+        self.livechat_channel.write({
+            'ai_system_prompt': 'Be brief.',
+            'ai_max_tokens': 100,
+            'ai_context_token_budget': 150,
+        })
+        self._create_message(author_id=self.visitor_partner.id, body='old ' * 100)
+        self._create_message(author_id=self.visitor_partner.id, body='Recent question')
+        messages = self.session._build_llm_messages(self.livechat_channel)
+        self.assertEqual(messages[0]['content'], 'Be brief.')
+        self.assertEqual([m['content'] for m in messages[1:]], ['Recent question'])
+
+    @patch('odoo.addons.im_livechat_ai.tools.tokenizer.get_tokenizer', return_value=HeuristicTokenizer())
+    def test_token_budget_truncates_oversized_message(self, _mock_tokenizer):
+        """A single message larger than the budget should be truncated, not dropped."""
+        self.livechat_channel.write({'ai_max_tokens': 100, 'ai_context_token_budget': 200})
+        self._create_message(author_id=self.visitor_partner.id, body='x' * 4000)
+        messages = self.session._build_llm_messages(self.livechat_channel)
+        self.assertEqual(messages[-1]['role'], 'user')
+        self.assertTrue(0 < len(messages[-1]['content']) < 4000)
+
+    @patch('odoo.addons.im_livechat_ai.tools.tokenizer.get_tokenizer', return_value=HeuristicTokenizer())
+    def test_token_budget_drops_messages_in_steps(self, _mock_tokenizer):
+        """Messages over the budget should be dropped a whole step at a time."""
+        self.livechat_channel.write({
+            'ai_system_prompt': 'Be brief.',
+            'ai_max_history': 8,
+            'ai_max_tokens': 100,
+            'ai_context_token_budget': 210,
+        })
+        for i in range(4):
+            self._create_message(author_id=self.visitor_partner.id, body=f'{i} ' + 'word ' * 20)
+        messages = self.session._build_llm_messages(self.livechat_channel)
+        # Three messages (~30 tokens each) fit, one must go: a whole step of two is dropped
+        self.assertEqual(len(messages), 1 + 2)
+        self.assertTrue(messages[1]['content'].startswith('2 '))
+
+    def test_token_budget_must_exceed_max_tokens(self):
+        with self.assertRaises(ValidationError):
+            self.livechat_channel.write({'ai_max_tokens': 1024, 'ai_context_token_budget': 1000})
+
+    # --- Conversation Summary Tests ---
+
+    def _enable_summary(self, threshold=10):
+        self.livechat_channel.write({'ai_summary_enabled': True, 'ai_summary_threshold': threshold})
+
+    def test_summary_replaces_covered_messages(self):
+        """Messages covered by the summary should be replaced by it in the context."""
+        self._enable_summary()
+        old = self._create_message(author_id=self.visitor_partner.id, body='My order is 42')
+        self._create_message(author_id=self.visitor_partner.id, body='Still waiting')
+        self.session.write({'ai_summary': 'Visitor asked about order 42.', 'ai_summary_message_id': old.id})
+        messages = self.session._build_llm_messages(self.livechat_channel)
+        contents = [m['content'] for m in messages]
+        self.assertEqual(messages[1]['role'], 'system')
+        self.assertIn('Visitor asked about order 42.', messages[1]['content'])
+        self.assertNotIn('My order is 42', contents)
+        self.assertIn('Still waiting', contents)
+
+    def test_summary_threshold(self):
+        """A refresh should only be needed past the threshold, keeping the recent half."""
+        self._enable_summary(threshold=10)
+        for i in range(10):
+            self._create_message(author_id=self.visitor_partner.id, body='Message %s' % i)
+        self.assertFalse(self.session._get_messages_to_summarize(self.livechat_channel))
+        self._create_message(author_id=self.visitor_partner.id, body='Message 10')
+        to_summarize = self.session._get_messages_to_summarize(self.livechat_channel)
+        self.assertEqual([m[2] for m in to_summarize], ['Message %s' % i for i in range(6)])
+
+    def test_summary_saved_after_refresh(self):
+        """A summarization round should store the summary and what it covers."""
+        self._enable_summary(threshold=10)
+        for i in range(11):
+            self._create_message(author_id=self.visitor_partner.id, body='Message %s' % i)
+        request = self.session._prepare_ai_summary(self.env, self.livechat_channel.id, self.session.id)
+        self.assertIn('Visitor: Message 0', request['messages'][1]['content'])
+        response = {'choices': [{'message': {'content': 'The visitor sent numbered messages.'}}]}
+        self.session._save_ai_summary(self.env, request, 'The visitor sent numbered messages.', response, None)
+        self.assertEqual(self.session.ai_summary, 'The visitor sent numbered messages.')
+        self.assertEqual(self.session.ai_summary_message_id, request['covered_message_id'])
+        self.assertFalse(self.session._get_messages_to_summarize(self.livechat_channel))
+
+        # A concurrent refresh based on the old summary must not overwrite it
+        self.session._save_ai_summary(self.env, dict(request, covered_message_id=1), 'Stale', None, None)
+        self.assertEqual(self.session.ai_summary, 'The visitor sent numbered messages.')
+
+    def _summary_request(self):
+        self._enable_summary(threshold=10)
+        self.livechat_channel.ai_rate_limit_tpm = 100000
+        for i in range(11):
+            self._create_message(author_id=self.visitor_partner.id, body='Message %s' % i)
+        request = self.session._prepare_ai_summary(self.env, self.livechat_channel.id, self.session.id)
+        breaker = ImLivechatChannel._get_request_breaker(request)
+        breaker.reset()
+        self.addCleanup(breaker.reset)
+        return request
+
+    def test_summary_postponed_when_rate_limited(self):
+        """A summary should not be sent while the rate limit of its key is saturated."""
+        request = self._summary_request()
+        with patch.object(ImLivechatChannel, '_send_llm_request') as mock_send:
+            self.assertIsNone(self.session._execute_ai_summary(request, lambda config, tokens: False))
+            self.assertIsNone(self.session._execute_ai_summary(request, lambda config, tokens: None))
+        mock_send.assert_not_called()
+
+    def test_summary_failure_recorded(self):
+        """A failed summary call should count on the breaker and give its tokens back."""
+        request = self._summary_request()
+        reserved = []
+        with patch.object(ImLivechatChannel, '_send_llm_request', side_effect=requests.ConnectionError('down')):
+            result = self.session._execute_ai_summary(
+                request, lambda config, tokens: reserved.append(tokens) or 0.0,
+            )
+        summary, _response_data, error = result
+        self.assertFalse(summary)
+        self.assertIn('down', error)
+        self.assertEqual(request['rate_limit_release'], reserved[0])
+        breaker = ImLivechatChannel._get_request_breaker(request)
+        self.assertEqual(breaker.snapshot()['failure_count'], 1)
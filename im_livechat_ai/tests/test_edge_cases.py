@@ -315,7 +315,7 @@ class TestCallLlmApiEdgeCases(TransactionCase):
 
     # --- URL construction edge cases ---
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_url_with_trailing_slash(self, mock_post):
         """Trailing slash should be stripped before appending path."""
         self.channel.write({'ai_api_base_url': 'https://api.openai.com/v1/'})
@@ -330,7 +330,7 @@ class TestCallLlmApiEdgeCases(TransactionCase):
         self.assertEqual(called_url, 'https://api.openai.com/v1/chat/completions')
         self.assertNotIn('//', called_url.replace('https://', ''))
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_url_with_whitespace(self, mock_post):
         """Leading/trailing whitespace in URL should be stripped."""
         self.channel.write({'ai_api_base_url': '  https://api.openai.com/v1  '})
@@ -347,7 +347,7 @@ class TestCallLlmApiEdgeCases(TransactionCase):
 
     # --- Response format edge cases ---
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_no_choices_key(self, mock_post):
         """Response without choices key should raise ValueError."""
         mock_response = MagicMock()
@@ -360,7 +360,7 @@ class TestCallLlmApiEdgeCases(TransactionCase):
         with self.assertRaises(ValueError):
             self.channel._call_llm_api([{'role': 'user', 'content': 'test'}])
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_choices_is_none(self, mock_post):
         """choices=None should raise ValueError."""
         mock_response = MagicMock()
@@ -375,7 +375,7 @@ class TestCallLlmApiEdgeCases(TransactionCase):
 
     # --- HTTP error codes ---
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_http_401_unauthorized(self, mock_post):
         """401 should raise HTTPError."""
         mock_response = MagicMock()
@@ -389,7 +389,7 @@ class TestCallLlmApiEdgeCases(TransactionCase):
         with self.assertRaises(requests.HTTPError):
             self.channel._call_llm_api([{'role': 'user', 'content': 'test'}])
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_http_429_rate_limited(self, mock_post):
         """429 should raise HTTPError."""
         mock_response = MagicMock()
@@ -403,7 +403,7 @@ class TestCallLlmApiEdgeCases(TransactionCase):
         with self.assertRaises(requests.HTTPError):
             self.channel._call_llm_api([{'role': 'user', 'content': 'test'}])
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_http_500_server_error(self, mock_post):
         """500 should raise HTTPError."""
         mock_response = MagicMock()
@@ -417,14 +417,14 @@ class TestCallLlmApiEdgeCases(TransactionCase):
         with self.assertRaises(requests.HTTPError):
             self.channel._call_llm_api([{'role': 'user', 'content': 'test'}])
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_connection_timeout(self, mock_post):
         """Timeout should raise requests.Timeout."""
         mock_post.side_effect = requests.Timeout('Connection timed out')
         with self.assertRaises(requests.Timeout):
             self.channel._call_llm_api([{'role': 'user', 'content': 'test'}])
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_connection_refused(self, mock_post):
         """ConnectionError should propagate."""
         mock_post.side_effect = requests.ConnectionError('Connection refused')
@@ -433,7 +433,7 @@ class TestCallLlmApiEdgeCases(TransactionCase):
 
     # --- Payload construction ---
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_temperature_zero_included(self, mock_post):
         """Temperature 0.0 should be included in payload (not falsy-skipped)."""
         self.channel.write({'ai_temperature': 0.0})
@@ -451,7 +451,7 @@ class TestCallLlmApiEdgeCases(TransactionCase):
         # Restore
         self.channel.write({'ai_temperature': 0.7})
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_max_tokens_zero_excluded(self, mock_post):
         """Max tokens 0 should NOT be included in payload."""
         self.channel.write({'ai_max_tokens': 0})
@@ -468,7 +468,7 @@ class TestCallLlmApiEdgeCases(TransactionCase):
         # Restore
         self.channel.write({'ai_max_tokens': 1024})
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_authorization_header_format(self, mock_post):
         """Authorization header should be Bearer token format."""
         mock_response = MagicMock()
@@ -482,7 +482,7 @@ class TestCallLlmApiEdgeCases(TransactionCase):
         self.assertTrue(headers['Authorization'].startswith('Bearer '))
         self.assertIn('sk-test-key', headers['Authorization'])
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_timeout_is_60_seconds(self, mock_post):
         """Request timeout should be 60 seconds."""
         mock_response = MagicMock()
@@ -779,7 +779,7 @@ class TestDoProcessAiResponseEdgeCases(TransactionCase):
 
     # --- Channel/session not found ---
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_channel_not_found(self, mock_post):
         """Should return early if channel ID doesn't exist."""
         self.channel._do_process_ai_response(
@@ -790,7 +790,7 @@ class TestDoProcessAiResponseEdgeCases(TransactionCase):
         # Should not have called API
         mock_post.assert_not_called()
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_session_not_found(self, mock_post):
         """Should return early if session ID doesn't exist."""
         self.channel._do_process_ai_response(
@@ -803,7 +803,7 @@ class TestDoProcessAiResponseEdgeCases(TransactionCase):
     # --- Empty AI response (only think tags) ---
 
     @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.time.sleep')
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_only_think_tags_triggers_retry(self, mock_post, mock_sleep):
         """Response with only think tags (empty after strip) should retry."""
         self._add_visitor_msg()
@@ -846,7 +846,7 @@ class TestDoProcessAiResponseEdgeCases(TransactionCase):
     # --- All retries exhausted sends error message ---
 
     @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.time.sleep')
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_all_retries_exhausted_sends_error(self, mock_post, mock_sleep):
         """When all retries fail, error message should be posted."""
         self._add_visitor_msg()
@@ -877,7 +877,7 @@ class TestDoProcessAiResponseEdgeCases(TransactionCase):
     # --- HTTPError includes response body in log ---
 
     @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.time.sleep')
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_http_error_body_captured(self, mock_post, mock_sleep):
         """HTTPError response body should be captured in log."""
         self._add_visitor_msg()
@@ -1046,21 +1046,21 @@ class TestActionTestConnectionEdgeCases(TransactionCase):
             self.channel.action_test_ai_connection()
         self.channel.write({'ai_enabled': True})
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_timeout_raises_user_error(self, mock_post):
         mock_post.side_effect = requests.Timeout('timed out')
         with self.assertRaises(UserError) as ctx:
             self.channel.action_test_ai_connection()
         self.assertIn('timed out', str(ctx.exception).lower())
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_connection_error_raises_user_error(self, mock_post):
         mock_post.side_effect = requests.ConnectionError('refused')
         with self.assertRaises(UserError) as ctx:
             self.channel.action_test_ai_connection()
         self.assertIn('connect', str(ctx.exception).lower())
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_think_tags_stripped_in_test(self, mock_post):
         """Test connection should strip think tags from reply."""
         mock_response = MagicMock()
@@ -1077,7 +1077,7 @@ class TestActionTestConnectionEdgeCases(TransactionCase):
         self.assertNotIn('<think>', msg)
         self.assertIn('OK', msg)
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_very_long_reply_truncated(self, mock_post):
         """Reply in notification should be truncated to 100 chars."""
         long_reply = 'A' * 500
@@ -1095,7 +1095,7 @@ class TestActionTestConnectionEdgeCases(TransactionCase):
         # The reply portion is truncated to 100 chars
         self.assertNotIn('A' * 101, msg)
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_missing_usage_shows_na(self, mock_post):
         """Missing usage info should show N/A."""
         mock_response = MagicMock()
@@ -1171,17 +1171,17 @@ class TestTriggerAiResponseEdgeCases(TransactionCase):
             'livechat_channel_id': cls.channel.id,
         })
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.threading.Thread')
-    def test_disabled_no_thread(self, mock_thread):
-        """Disabled AI should not create thread."""
+    @patch('odoo.addons.im_livechat_ai.tools.worker_pool.AIWorkerPool.submit')
+    def test_disabled_no_thread(self, mock_submit):
+        """Disabled AI should not submit a job."""
         self.channel.write({'ai_enabled': False})
         self.channel._trigger_ai_response(self.session, MagicMock())
-        mock_thread.assert_not_called()
+        mock_submit.assert_not_called()
         self.channel.write({'ai_enabled': True})
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.threading.Thread')
-    def test_missing_url_no_thread(self, mock_thread):
-        """Missing URL should not create thread."""
+    @patch('odoo.addons.im_livechat_ai.tools.worker_pool.AIWorkerPool.submit')
+    def test_missing_url_no_thread(self, mock_submit):
+        """Missing URL should not submit a job."""
         original_url = self.channel.ai_api_base_url
         self.channel.write({'ai_enabled': False})
         self.channel.write({'ai_api_base_url': False})
@@ -1189,18 +1189,35 @@ class TestTriggerAiResponseEdgeCases(TransactionCase):
         # Directly call with the channel state
         self.channel.ai_enabled = True  # bypass constraint temporarily
         self.channel._trigger_ai_response(self.session, MagicMock())
-        mock_thread.assert_not_called()
+        mock_submit.assert_not_called()
         # Restore
         self.channel.write({'ai_enabled': False})
         self.channel.write({'ai_api_base_url': original_url})
         self.channel.write({'ai_enabled': True})
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.threading.Thread')
-    def test_thread_is_daemon(self, mock_thread):
-        """Thread should be daemon."""
-        self.channel._trigger_ai_response(self.session, MagicMock())
-        mock_thread.assert_called_once()
-        self.assertTrue(mock_thread.call_args[1].get('daemon', False))
+    def test_job_enqueued(self):
+        """A visitor message should queue a pending job for the session."""
+        message = self.env['mail.message'].create({
+            'body': 'Hello',
+            'model': 'discuss.channel',
+            'res_id': self.session.id,
+            'message_type': 'comment',
+        })
+        self.channel._trigger_ai_response(self.session, message)
+        job = self.env['im_livechat_ai.job'].search([('discuss_channel_id', '=', self.session.id)])
+        self.assertEqual(len(job), 1)
+        self.assertEqual(job.state, 'pending')
+        self.assertEqual(job.message_id, message)
+
+    @patch('odoo.addons.im_livechat_ai.tools.worker_pool.AIWorkerPool.submit')
+    def test_saturated_pool_leaves_job_pending(self, mock_submit):
+        """A dispatch refused by a saturated pool should leave the job queued."""
+        mock_submit.return_value = False
+        self.channel._trigger_ai_response(self.session, self.env['mail.message'])
+        job = self.env['im_livechat_ai.job'].search([('discuss_channel_id', '=', self.session.id)])
+        job._dispatch()
+        mock_submit.assert_called_once()
+        self.assertEqual(job.state, 'pending')
 
 
 class TestIsVisitorMessageEdgeCases(TransactionCase):
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch, MagicMock
+
+import requests
+
+from odoo.tests.common import BaseCase, TransactionCase
+
+from odoo.addons.im_livechat_ai.tools import endpoint_router
+from odoo.addons.im_livechat_ai.tools.endpoint_router import LatencyTracker, order_endpoints
+
+FAST = {'base_url': 'https://fast.example.com/v1', 'model': 'm'}
+SLOW = {'base_url': 'https://slow.example.com/v1', 'model': 'm'}
+NEW = {'base_url': 'https://new.example.com/v1', 'model': 'm'}
+
+
+class TestEndpointRouterTool(BaseCase):
+    """Tests for latency tracking and endpoint ordering."""
+
+    def test_ewma(self):
+        tracker = LatencyTracker(alpha=0.5)
+        self.assertIsNone(tracker.get(FAST))
+        tracker.record(FAST, 2.0)
+        tracker.record(FAST, 4.0)
+        self.assertAlmostEqual(tracker.get(FAST), 3.0)
+        tracker.record_failure(FAST)
+        self.assertGreater(tracker.get(FAST), 30.0)
+
+    def test_priority_keeps_order(self):
+        tracker = LatencyTracker()
+        tracker.record(SLOW, 10.0)
+        tracker.record(FAST, 1.0)
+        self.assertEqual(order_endpoints([SLOW, FAST], 'priority', tracker), [SLOW, FAST])
+
+    def test_latency_prefers_fast_then_unmeasured_first(self):
+        tracker = LatencyTracker()
+        tracker.record(SLOW, 10.0)
+        tracker.record(FAST, 1.0)
+        self.assertEqual(order_endpoints([SLOW, FAST], 'latency', tracker), [FAST, SLOW])
+        self.assertEqual(order_endpoints([SLOW, FAST, NEW], 'latency', tracker), [NEW, FAST, SLOW])
+
+    def test_latency_weight(self):
+        tracker = LatencyTracker()
+        tracker.record(SLOW, 3.0)
+        tracker.record(FAST, 2.0)
+        heavy = dict(SLOW, weight=2)
+        self.assertEqual(order_endpoints([FAST, heavy], 'latency', tracker), [heavy, FAST])
+
+
+class TestEndpointFailover(TransactionCase):
+    """Failover between the endpoints of a channel."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.livechat_channel = cls.env['im_livechat.channel'].create({
+            'name': 'Failover Test Channel',
+            'ai_enabled': True,
+            'ai_api_base_url': 'https://primary.example.com/v1',
+            'ai_api_key': 'sk-primary',
+            'ai_model': 'gpt-4o',
+        })
+        cls.fallback = cls.env['im_livechat_ai.endpoint'].create({
+            'livechat_channel_id': cls.livechat_channel.id,
+            'base_url': 'https://fallback.example.com/v1',
+            'api_key': 'sk-fallback',
+            'model': 'deepseek-chat',
+        })
+        cls.visitor_partner = cls.env['res.partner'].create({'name': 'Failover Visitor'})
+        cls.session = cls.env['discuss.channel'].create({
+            'name': 'Failover Session',
+            'channel_type': 'livechat',
+            'livechat_channel_id': cls.livechat_channel.id,
+        })
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(endpoint_router.latency_tracker.reset)
+        self.env['mail.message'].create({
+            'body': 'Hello',
+            'model': 'discuss.channel',
+            'res_id': self.session.id,
+            'message_type': 'comment',
+            'author_id': self.visitor_partner.id,
+        })
+
+    def _respond(self, url, **kwargs):
+        if 'primary' in url:
+            error_response = MagicMock(status_code=503, text='overloaded')
+            raise requests.HTTPError('503 Service Unavailable', response=error_response)
+        response = MagicMock(status_code=200)
+        response.json.return_value = {
+            'choices': [{'message': {'content': 'Served by the fallback'}}],
+            'usage': {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15},
+        }
+        return response
+
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.time.sleep')
+    def test_5xx_fails_over_without_waiting(self, mock_sleep, mock_post):
+        mock_post.side_effect = self._respond
+        self.livechat_channel._process_ai_response(
+            self.env.cr.dbname, self.livechat_channel.id, self.session.id, test_env=self.env,
+        )
+
+        self.assertEqual(mock_post.call_count, 2)
+        mock_sleep.assert_not_called()
+        logs = self.env['llm.api.log'].search([('discuss_channel_id', '=', self.session.id)], order='id')
+        self.assertEqual(logs.mapped('status'), ['retry', 'success'])
+        self.assertEqual(logs[0].api_base_url, 'https://primary.example.com/v1')
+        self.assertFalse(logs[0].endpoint_id)
+        self.assertEqual(logs[1].endpoint_id, self.fallback)
+        self.assertEqual(logs[1].model, 'deepseek-chat')
+        self.assertGreater(endpoint_router.latency_tracker.get({
+            'base_url': 'https://primary.example.com/v1', 'model': 'gpt-4o',
+        }), 0)
+
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.time.sleep')
+    def test_archived_endpoint_not_used(self, mock_sleep, mock_post):
+        self.fallback.active = False
+        mock_post.side_effect = self._respond
+        self.livechat_channel._process_ai_response(
+            self.env.cr.dbname, self.livechat_channel.id, self.session.id, test_env=self.env,
+        )
+        self.assertTrue(all('primary' in call.args[0] for call in mock_post.call_args_list))
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch
+
+from odoo.tests.common import BaseCase, TransactionCase
+
+from odoo.addons.im_livechat_ai.tools import http_session
+from odoo.addons.im_livechat_ai.tools.http_session import LLMSessionPool
+
+
+class TestLLMSessionPool(BaseCase):
+    """Tests for the per-endpoint HTTP session pool."""
+
+    def test_session_reused_for_same_endpoint(self):
+        """The same URL and key should share one session."""
+        pool = LLMSessionPool()
+        first = pool.get('https://api.openai.com/v1', 'sk-a')
+        second = pool.get('https://api.openai.com/v1/', 'sk-a')
+        self.assertIs(first, second)
+        stats = pool.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_new_key_gets_new_session(self):
+        """A rotated API key should not reuse the old session."""
+        pool = LLMSessionPool()
+        first = pool.get('https://api.openai.com/v1', 'sk-a')
+        second = pool.get('https://api.openai.com/v1', 'sk-b')
+        self.assertIsNot(first, second)
+
+    def test_invalidate_closes_sessions(self):
+        """Invalidating an endpoint should drop all of its sessions."""
+        pool = LLMSessionPool()
+        pool.get('https://api.openai.com/v1', 'sk-a')
+        pool.get('https://api.openai.com/v1', 'sk-b')
+        pool.get('https://api.deepseek.com/v1', 'sk-c')
+        self.assertEqual(pool.invalidate('https://api.openai.com/v1'), 2)
+        self.assertEqual(pool.stats()['sessions'], 1)
+
+    def test_lru_eviction(self):
+        """Sessions beyond max_sessions should be evicted, oldest first."""
+        pool = LLMSessionPool(max_sessions=2)
+        first = pool.get('https://a.example.com/v1', 'k')
+        pool.get('https://b.example.com/v1', 'k')
+        pool.get('https://c.example.com/v1', 'k')
+        self.assertEqual(pool.stats()['sessions'], 2)
+        self.assertIsNot(pool.get('https://a.example.com/v1', 'k'), first)
+
+
+class TestSessionInvalidationOnWrite(TransactionCase):
+    """Changing the endpoint config should invalidate pooled sessions."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.channel = cls.env['im_livechat.channel'].create({
+            'name': 'Session Test Channel',
+            'ai_enabled': True,
+            'ai_api_base_url': 'https://api.openai.com/v1',
+            'ai_api_key': 'sk-old',
+            'ai_model': 'gpt-4o',
+        })
+
+    @patch.object(http_session.session_pool, 'invalidate')
+    def test_key_change_invalidates(self, mock_invalidate):
+        self.channel.write({'ai_api_key': 'sk-new'})
+        mock_invalidate.assert_called_once_with('https://api.openai.com/v1')
+
+    @patch.object(http_session.session_pool, 'invalidate')
+    def test_unrelated_change_keeps_sessions(self, mock_invalidate):
+        self.channel.write({'ai_temperature': 0.2})
+        mock_invalidate.assert_not_called()
@@ -86,11 +86,48 @@ class TestImLivechatChannel(TransactionCase):
 
     def test_get_or_create_bot_partner_creates_new(self):
         """Should create a new partner when none exists."""
-        self.assertFalse(self.channel.ai_bot_partner_id)
-        partner = self.channel._get_or_create_bot_partner()
+        channel = self.env['im_livechat.channel'].create({'name': 'AI Disabled Channel'})
+        self.assertFalse(channel.ai_bot_partner_id)
+        partner = channel._get_or_create_bot_partner()
         self.assertTrue(partner.exists())
         self.assertEqual(partner.name, 'AI Assistant')
-        self.assertEqual(self.channel.ai_bot_partner_id.id, partner.id)
+        self.assertEqual(channel.ai_bot_partner_id.id, partner.id)
+
+    def test_bot_partner_synced_on_save(self):
+        """Saving an AI-enabled config should create and rename the bot partner."""
+        self.assertEqual(self.channel.ai_bot_partner_id.name, 'AI Assistant')
+        self.channel.write({'ai_bot_name': 'Support Bot'})
+        self.assertEqual(self.channel.ai_bot_partner_id.name, 'Support Bot')
+
+        channel = self.env['im_livechat.channel'].create({'name': 'Enabled Later'})
+        self.assertFalse(channel.ai_bot_partner_id)
+        channel.write({
+            'ai_enabled': True,
+            'ai_api_base_url': 'https://api.openai.com/v1',
+            'ai_api_key': 'sk-test-key-12345',
+            'ai_model': 'gpt-4o',
+        })
+        self.assertTrue(channel.ai_bot_partner_id)
+
+    def test_bot_partner_synced_with_partner_change(self):
+        """Changing the bot partner and its name together should rename the new partner."""
+        partner = self.env['res.partner'].create({'name': 'Existing Contact'})
+        self.channel.write({'ai_bot_partner_id': partner.id, 'ai_bot_name': 'Sales Bot'})
+        self.assertEqual(partner.name, 'Sales Bot')
+        self.assertIn(partner.id, self.channel._get_ai_bot_partner_ids(self.channel.id))
+
+    def test_bot_reply_does_not_write_partner(self):
+        """Posting a reply should only read the bot partner."""
+        session = self.env['discuss.channel'].create({
+            'name': 'Reply Session',
+            'channel_type': 'livechat',
+            'livechat_channel_id': self.channel.id,
+        })
+        partner = self.channel.ai_bot_partner_id
+        with patch.object(type(self.env['res.partner']), 'write', side_effect=AssertionError('partner written')), \
+                patch.object(type(self.env['res.partner']), 'create', side_effect=AssertionError('partner created')):
+            message = self.channel._create_bot_message(self.env, session, 'Hello')
+        self.assertEqual(message.author_id, partner)
 
     def test_get_or_create_bot_partner_returns_existing(self):
         """Should return existing partner on subsequent calls."""
@@ -107,7 +144,7 @@ class TestImLivechatChannel(TransactionCase):
 
     # --- API Call Tests (mocked) ---
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_call_llm_api_success(self, mock_post):
         """Successful API call should return response data."""
         mock_response = MagicMock()
@@ -129,7 +166,7 @@ class TestImLivechatChannel(TransactionCase):
         call_args = mock_post.call_args
         self.assertTrue(call_args[0][0].endswith('/chat/completions'))
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_call_llm_api_url_construction(self, mock_post):
         """API URL should append /chat/completions if not present."""
         mock_response = MagicMock()
@@ -143,7 +180,7 @@ class TestImLivechatChannel(TransactionCase):
         called_url = mock_post.call_args[0][0]
         self.assertEqual(called_url, 'https://api.openai.com/v1/chat/completions')
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_call_llm_api_url_no_double_path(self, mock_post):
         """Should not double-append /chat/completions."""
         self.channel.write({'ai_api_base_url': 'https://api.example.com/v1/chat/completions'})
@@ -159,7 +196,7 @@ class TestImLivechatChannel(TransactionCase):
         called_url = mock_post.call_args[0][0]
         self.assertEqual(called_url, 'https://api.example.com/v1/chat/completions')
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_call_llm_api_empty_choices(self, mock_post):
         """Empty choices should raise ValueError."""
         mock_response = MagicMock()
@@ -171,7 +208,7 @@ class TestImLivechatChannel(TransactionCase):
         with self.assertRaises(ValueError):
             self.channel._call_llm_api([{'role': 'user', 'content': 'test'}])
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_call_llm_api_sends_correct_payload(self, mock_post):
         """Should send correct model, messages, temperature, max_tokens."""
         mock_response = MagicMock()
@@ -193,7 +230,7 @@ class TestImLivechatChannel(TransactionCase):
 
     # --- Test Connection Action ---
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_action_test_connection_success(self, mock_post):
         """Successful test should return success notification."""
         mock_response = MagicMock()
@@ -316,3 +353,40 @@ class TestLLMApiLog(TransactionCase):
 
         count = self.env['llm.api.log']._cleanup_old_logs()
         self.assertEqual(count, 5)
+
+    def test_cleanup_retention_configurable(self):
+        """The retention period should come from im_livechat_ai.log_retention_days."""
+        self.env['ir.config_parameter'].sudo().set_param('im_livechat_ai.log_retention_days', '7')
+        old_log = self.env['llm.api.log'].create({
+            'status': 'success',
+            'timestamp': fields.Datetime.now() - timedelta(days=8),
+        })
+        recent_log = self.env['llm.api.log'].create({
+            'status': 'success',
+            'timestamp': fields.Datetime.now() - timedelta(days=6),
+        })
+        self.env['llm.api.log']._cleanup_old_logs()
+        self.assertFalse(old_log.exists())
+        self.assertTrue(recent_log.exists())
+
+    def test_cleanup_in_batches(self):
+        """Cleanup should delete all expired logs, a batch at a time."""
+        logs = self.env['llm.api.log'].create([{
+            'status': 'success',
+            'timestamp': fields.Datetime.now() - timedelta(days=40),
+        } for _i in range(5)])
+        count = self.env['llm.api.log']._cleanup_old_logs(batch_size=2)
+        self.assertGreaterEqual(count, 5)
+        self.assertFalse(logs.exists())
+
+    def test_cleanup_time_budget(self):
+        """Cleanup out of time should stop and schedule the next run."""
+        log = self.env['llm.api.log'].create({
+            'status': 'success',
+            'timestamp': fields.Datetime.now() - timedelta(days=40),
+        })
+        cron = self.env.ref('im_livechat_ai.ir_cron_cleanup_llm_api_logs')
+        count = self.env['llm.api.log']._cleanup_old_logs(time_budget=-1)
+        self.assertEqual(count, 0)
+        self.assertTrue(log.exists())
+        self.assertTrue(self.env['ir.cron.trigger'].search([('cron_id', '=', cron.id)]))
@@ -2,6 +2,8 @@
 
 from unittest.mock import patch, MagicMock
 
+import requests
+
 from odoo.tests.common import TransactionCase
 
 
@@ -38,7 +40,7 @@ class TestAIIntegration(TransactionCase):
 
     # --- Full Flow Tests ---
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_full_flow_success(self, mock_post):
         """Full flow: visitor message → AI API call → bot reply → log created."""
         mock_response = MagicMock()
@@ -75,7 +77,7 @@ class TestAIIntegration(TransactionCase):
         self.assertTrue(len(logs) >= 1)
         self.assertEqual(logs[0].total_tokens, 60)
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_full_flow_api_failure_sends_error_message(self, mock_post):
         """When API fails all retries, error message should be sent to visitor."""
         mock_post.side_effect = Exception("API connection failed")
@@ -103,7 +105,7 @@ class TestAIIntegration(TransactionCase):
         ])
         self.assertTrue(len(error_logs) >= 1)
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.time.sleep')
     def test_retry_then_success(self, mock_sleep, mock_post):
         """Should succeed after failed retries."""
@@ -148,9 +150,77 @@ class TestAIIntegration(TransactionCase):
         # Verify sleep was called between retries
         self.assertEqual(mock_sleep.call_count, 2)
 
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.time.sleep')
+    def test_auth_error_not_retried(self, mock_sleep, mock_post):
+        """A 401 should fail at once instead of using all retries."""
+        error_response = MagicMock()
+        error_response.status_code = 401
+        error_response.text = '{"error": "invalid_api_key"}'
+        mock_post.side_effect = requests.HTTPError('401 Unauthorized', response=error_response)
+
+        self.livechat_channel._process_ai_response(
+            self.env.cr.dbname,
+            self.livechat_channel.id,
+            self.session.id,
+            test_env=self.env,
+        )
+
+        self.assertEqual(mock_post.call_count, 1)
+        mock_sleep.assert_not_called()
+        error_log = self.env['llm.api.log'].search([
+            ('livechat_channel_id', '=', self.livechat_channel.id),
+            ('status', '=', 'error'),
+        ], order='id desc', limit=1)
+        self.assertIn('Not retryable', error_log.error_message)
+
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
+    def test_llm_call_runs_outside_transactions(self, mock_post):
+        """The LLM call should run between two short transactions, with no cursor held."""
+        self.env['mail.message'].create({
+            'body': 'Where is my order?',
+            'model': 'discuss.channel',
+            'res_id': self.session.id,
+            'message_type': 'comment',
+            'author_id': self.visitor_partner.id,
+        })
+        events = []
+        mock_response = MagicMock()
+        mock_response.json.return_value = {
+            'choices': [{'message': {'content': 'On its way.'}}],
+            'usage': {},
+        }
+        mock_response.raise_for_status = MagicMock()
+
+        def fake_post(*args, **kwargs):
+            events.append('http')
+            return mock_response
+
+        def fake_transaction(func, *args):
+            events.append('begin %s' % func.__name__)
+            result = func(self.env, *args)
+            events.append('commit %s' % func.__name__)
+            return result
+
+        mock_post.side_effect = fake_post
+        with patch.object(type(self.livechat_channel), '_run_ai_transaction', side_effect=fake_transaction):
+            self.livechat_channel._process_ai_response(
+                self.env.cr.dbname,
+                self.livechat_channel.id,
+                self.session.id,
+            )
+
+        self.assertEqual(events, [
+            'begin _prepare_ai_request',
+            'commit _prepare_ai_request',
+            'http',
+            'begin _finalize_ai_response',
+            'commit _finalize_ai_response',
+        ])
+
     # --- Multi-Channel Isolation Tests ---
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_multi_channel_isolation(self, mock_post):
         """Each channel should use its own API config."""
         channel_b = self.env['im_livechat.channel'].create({
@@ -175,6 +245,13 @@ class TestAIIntegration(TransactionCase):
             'channel_type': 'livechat',
             'livechat_channel_id': channel_b.id,
         })
+        self.env['mail.message'].create({
+            'body': 'Hello',
+            'model': 'discuss.channel',
+            'res_id': session_b.id,
+            'message_type': 'comment',
+            'author_id': self.visitor_partner.id,
+        })
 
         channel_b._process_ai_response(
             self.env.cr.dbname,
@@ -191,6 +268,22 @@ class TestAIIntegration(TransactionCase):
         sent_payload = mock_post.call_args[1]['json']
         self.assertEqual(sent_payload['model'], 'MiniMax-Text-01')
 
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.time.sleep')
+    def test_no_visitor_message_no_polling(self, mock_sleep, mock_post):
+        """A session without visitor messages is skipped at once, without waiting for commits."""
+        empty_session = self.env['discuss.channel'].create({
+            'name': 'Empty Session',
+            'channel_type': 'livechat',
+            'livechat_channel_id': self.livechat_channel.id,
+        })
+        request = self.livechat_channel._prepare_ai_request(
+            self.env, self.livechat_channel.id, empty_session.id,
+        )
+        self.assertIsNone(request)
+        mock_sleep.assert_not_called()
+        mock_post.assert_not_called()
+
     def test_disabled_channel_no_trigger(self):
         """Disabled channel should not trigger AI response."""
         self.livechat_channel.write({'ai_enabled': False})
@@ -229,7 +322,7 @@ class TestAIIntegration(TransactionCase):
 
     # --- Log Creation Tests ---
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_log_records_token_usage(self, mock_post):
         """Logs should record token usage from API response."""
         mock_response = MagicMock()
@@ -256,7 +349,47 @@ class TestAIIntegration(TransactionCase):
         self.assertEqual(log.completion_tokens, 50)
         self.assertEqual(log.total_tokens, 150)
 
-    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
+    def test_log_records_cached_prompt_tokens(self, mock_post):
+        """Logs should record the prompt tokens served from the provider's cache."""
+        self.env['mail.message'].create({
+            'body': 'Hello',
+            'model': 'discuss.channel',
+            'res_id': self.session.id,
+            'message_type': 'comment',
+            'author_id': self.visitor_partner.id,
+        })
+        mock_response = MagicMock()
+        mock_response.json.return_value = {
+            'choices': [{'message': {'content': 'Response'}}],
+            'usage': {
+                'prompt_tokens': 2000, 'completion_tokens': 50, 'total_tokens': 2050,
+                'prompt_tokens_details': {'cached_tokens': 1920},
+            },
+        }
+        mock_response.raise_for_status = MagicMock()
+        mock_post.return_value = mock_response
+
+        self.livechat_channel._process_ai_response(
+            self.env.cr.dbname,
+            self.livechat_channel.id,
+            self.session.id,
+            test_env=self.env,
+        )
+
+        log = self.env['llm.api.log'].search([
+            ('livechat_channel_id', '=', self.livechat_channel.id),
+            ('status', '=', 'success'),
+        ], limit=1, order='id desc')
+        self.assertEqual(log.cached_tokens, 1920)
+
+    def test_cached_prompt_tokens_provider_formats(self):
+        get_cached = self.env['im_livechat.channel']._get_cached_prompt_tokens
+        self.assertEqual(get_cached({'prompt_cache_hit_tokens': 640}), 640)
+        self.assertEqual(get_cached({'cache_read_input_tokens': 128}), 128)
+        self.assertEqual(get_cached({'prompt_tokens': 10}), 0)
+
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
     def test_log_records_response_time(self, mock_post):
         """Logs should record response time."""
         mock_response = MagicMock()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests.common import BaseCase, TransactionCase
+
+from odoo.addons.im_livechat_ai.tools.knowledge_index import KnowledgeIndex, chunk_text, tokenize
+
+DOCUMENTS = [
+    ('Shipping', 'We ship to all EU countries within 3 days.\n\nShipping to the US costs 20 EUR.'),
+    ('Opening Hours', 'Our shop opens at 9:00 and closes at 18:00, Monday to Saturday.'),
+    ('Returns', 'Unused items can be returned within 30 days for a full refund.'),
+]
+
+
+class TestKnowledgeIndexTool(BaseCase):
+    """Tests for knowledge base chunking and BM25 search."""
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('How are the opening hours?'), ['opening', 'hour'])
+        self.assertEqual(tokenize('營業時間'), ['營業', '業時', '時間'])
+
+    def test_chunk_text_respects_size(self):
+        text = '\n\n'.join(['Short paragraph.'] * 3 + ['A long sentence here. ' * 20])
+        chunks = chunk_text(text, size=100)
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        self.assertEqual(chunks[0], 'Short paragraph.\n\nShort paragraph.\n\nShort paragraph.')
+        self.assertEqual(chunk_text('  \n\n  '), [])
+
+    def test_search_ranks_relevant_chunk_first(self):
+        index = KnowledgeIndex.build(DOCUMENTS)
+        results = index.search('When does the shop open?', limit=2)
+        self.assertEqual(results[0][0], 'Opening Hours')
+        self.assertEqual(index.search('refund for returned items', limit=1)[0][0], 'Returns')
+        self.assertEqual(index.search('unrelated gibberish'), [])
+
+    def test_dumps_loads_roundtrip(self):
+        index = KnowledgeIndex.build(DOCUMENTS)
+        loaded = KnowledgeIndex.loads(index.dumps())
+        self.assertEqual(loaded.chunks, index.chunks)
+        self.assertEqual(loaded.search('shipping US', 1), index.search('shipping US', 1))
+
+
+class TestKnowledgeBase(TransactionCase):
+    """Tests for knowledge base retrieval in the LLM context."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.livechat_channel = cls.env['im_livechat.channel'].create({
+            'name': 'Knowledge Test Channel',
+            'ai_enabled': True,
+            'ai_api_base_url': 'https://api.openai.com/v1',
+            'ai_api_key': 'sk-test-key',
+            'ai_model': 'gpt-4o',
+            'ai_system_prompt': 'You are a helpful assistant.',
+            'ai_knowledge_top_k': 1,
+        })
+        cls.articles = cls.env['im_livechat_ai.knowledge'].create([
+            {'name': name, 'content': content, 'livechat_channel_id': cls.livechat_channel.id}
+            for name, content in DOCUMENTS
+        ])
+        cls.visitor_partner = cls.env['res.partner'].create({'name': 'Knowledge Visitor'})
+        cls.session = cls.env['discuss.channel'].create({
+            'name': 'Knowledge Session',
+            'channel_type': 'livechat',
+            'livechat_channel_id': cls.livechat_channel.id,
+        })
+
+    def _ask(self, body):
+        self.env['mail.message'].create({
+            'body': body,
+            'model': 'discuss.channel',
+            'res_id': self.session.id,
+            'message_type': 'comment',
+            'author_id': self.visitor_partner.id,
+        })
+        return self.session._build_llm_messages(self.livechat_channel)
+
+    def _knowledge_messages(self, messages):
+        return [m for m in messages if m['role'] == 'system' and m['content'].startswith('Knowledge base')]
+
+    def test_index_built_on_save(self):
+        self.assertTrue(self.livechat_channel.ai_knowledge_index_version)
+        self.assertEqual(self.articles.mapped('chunk_count'), [1, 1, 1])
+
+    def test_relevant_chunk_injected(self):
+        messages = self._ask('How much is shipping to the US?')
+        knowledge = self._knowledge_messages(messages)
+        self.assertEqual(len(knowledge), 1)
+        self.assertIn('### Shipping', knowledge[0]['content'])
+        self.assertNotIn('Opening Hours', knowledge[0]['content'])
+        self.assertEqual(messages[0]['content'], 'You are a helpful assistant.')
+        self.assertEqual(messages[-1]['role'], 'user')
+
+    def test_snippets_placed_after_history(self):
+        """Snippets change every question, so they go after the stable history."""
+        self._ask('How much is shipping to the US?')
+        bot_partner = self.livechat_channel._get_or_create_bot_partner()
+        self.env['mail.message'].create({
+            'body': 'It costs 20 EUR.',
+            'model': 'discuss.channel',
+            'res_id': self.session.id,
+            'message_type': 'comment',
+            'author_id': bot_partner.id,
+        })
+        messages = self._ask('And when do you open?')
+        self.assertEqual([m['role'] for m in messages], ['system', 'user', 'assistant', 'system', 'user'])
+        self.assertIn('### Opening Hours', messages[3]['content'])
+
+    def test_no_match_no_message(self):
+        self.assertFalse(self._knowledge_messages(self._ask('xyzzy')))
+
+    def test_archived_article_not_searched(self):
+        version = self.livechat_channel.ai_knowledge_index_version
+        self.articles.filtered(lambda a: a.name == 'Shipping').active = False
+        self.assertGreater(self.livechat_channel.ai_knowledge_index_version, version)
+        self.assertFalse(self._knowledge_messages(self._ask('How much is shipping to the US?')))
+
+    def test_edit_reindexes(self):
+        self.articles[1].content = 'Parking is free for customers.'
+        knowledge = self._knowledge_messages(self._ask('Is parking free?'))
+        self.assertIn('### Opening Hours', knowledge[0]['content'])
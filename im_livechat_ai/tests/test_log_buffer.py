@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+
+from odoo import fields
+from odoo.tests.common import BaseCase, TransactionCase
+
+from odoo.addons.im_livechat_ai.tools.log_buffer import LogBuffer
+
+
+class TestLogBuffer(BaseCase):
+    """Tests for the batched log writer."""
+
+    def _make_buffer(self, writer, **kwargs):
+        buffer = LogBuffer(writer, **kwargs)
+        self.addCleanup(buffer.close)
+        return buffer
+
+    def test_flushes_full_batch(self):
+        written = threading.Event()
+        batches = []
+
+        def writer(rows):
+            batches.append(rows)
+            written.set()
+
+        buffer = self._make_buffer(writer, batch_size=3, flush_interval=60)
+        buffer.add(1)
+        buffer.add(2)
+        self.assertFalse(written.wait(0.2))
+        buffer.add(3)
+        self.assertTrue(written.wait(5))
+        self.assertEqual(batches, [[1, 2, 3]])
+
+    def test_flushes_after_interval(self):
+        written = threading.Event()
+        batches = []
+
+        def writer(rows):
+            batches.append(rows)
+            written.set()
+
+        buffer = self._make_buffer(writer, batch_size=100, flush_interval=0.2)
+        buffer.add('row')
+        self.assertTrue(written.wait(5))
+        self.assertEqual(batches, [['row']])
+
+    def test_failed_write_is_retried(self):
+        batches = []
+        fail = [True]
+
+        def writer(rows):
+            if fail[0]:
+                raise RuntimeError('database unavailable')
+            batches.append(rows)
+
+        buffer = self._make_buffer(writer, batch_size=2, flush_interval=60)
+        for row in range(30):
+            buffer.add(row)
+        self.assertEqual(buffer.flush(), 0)
+        # Only the most recent rows are kept for the retry
+        self.assertEqual(buffer.stats()['pending'], 20)
+        self.assertEqual(buffer.stats()['dropped'], 10)
+        fail[0] = False
+        self.assertEqual(buffer.flush(), 20)
+        self.assertEqual(batches, [list(range(10, 30))])
+
+    def test_close_writes_pending_rows(self):
+        batches = []
+        buffer = LogBuffer(batches.append, batch_size=100, flush_interval=60)
+        buffer.add('a')
+        buffer.add('b')
+        buffer.close()
+        self.assertEqual(batches, [['a', 'b']])
+        buffer.add('late')
+        self.assertEqual(batches[-1], ['late'])
+
+
+class TestBulkLogInsert(TransactionCase):
+    """Tests for the multi-row INSERT of llm.api.log."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.channel = cls.env['im_livechat.channel'].create({
+            'name': 'Bulk Log Channel',
+            'ai_enabled': True,
+            'ai_api_base_url': 'https://api.openai.com/v1',
+            'ai_api_key': 'sk-test',
+            'ai_model': 'gpt-4o',
+        })
+        cls.session = cls.env['discuss.channel'].create({
+            'name': 'Bulk Log Session',
+            'channel_type': 'livechat',
+            'livechat_channel_id': cls.channel.id,
+        })
+
+    def test_insert_batch(self):
+        deleted_session = self.env['discuss.channel'].create({
+            'name': 'Deleted Session',
+            'channel_type': 'livechat',
+            'livechat_channel_id': self.channel.id,
+        })
+        deleted_id = deleted_session.id
+        deleted_session.unlink()
+        timestamp = fields.Datetime.now()
+        self.env['llm.api.log']._insert_logs([
+            {
+                'timestamp': timestamp,
+                'livechat_channel_id': self.channel.id,
+                'discuss_channel_id': self.session.id,
+                'endpoint_id': False,
+                'model': 'gpt-4o',
+                'status': 'success',
+                'request_payload': [{'role': 'user', 'content': 'Hello'}],
+                'response_payload': {'choices': [{'message': {'content': 'Hi'}}]},
+                'prompt_tokens': 5,
+                'total_tokens': 6,
+            },
+            {
+                'timestamp': timestamp,
+                'livechat_channel_id': self.channel.id,
+                'discuss_channel_id': deleted_id,
+                'model': 'gpt-4o',
+                'status': 'error',
+                'error_message': 'timeout',
+                'prompt_tokens': None,
+            },
+        ])
+        logs = self.env['llm.api.log'].search([('livechat_channel_id', '=', self.channel.id)], order='id')
+        self.assertEqual(logs.mapped('status'), ['success', 'error'])
+        self.assertEqual(logs[0].discuss_channel_id, self.session)
+        self.assertEqual(json.loads(logs[0].request_payload)[0]['content'], 'Hello')
+        self.assertEqual(logs[0].total_tokens, 6)
+        self.assertFalse(logs[1].discuss_channel_id)
+        self.assertFalse(logs[1].response_payload)
+        self.assertEqual(logs[1].prompt_tokens, 0)
+        self.assertEqual(logs[1].create_uid, self.env.user)
+
+    def test_buffer_configuration(self):
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('im_livechat_ai.log_batch_size', '25')
+        ICP.set_param('im_livechat_ai.log_flush_interval', '0.5')
+        buffer = self.env['llm.api.log']._get_log_buffer()
+        self.assertEqual(buffer.batch_size, 25)
+        self.assertEqual(buffer.flush_interval, 0.5)
+        self.assertIs(self.env['llm.api.log']._get_log_buffer(), buffer)
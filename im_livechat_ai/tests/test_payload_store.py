@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+import json
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests.common import BaseCase, TransactionCase
+
+from odoo.addons.im_livechat_ai.tools import payload_store
+
+
+class TestPayloadStoreTool(BaseCase):
+    """Tests for cutting payloads into content-addressed blobs."""
+
+    def test_messages_split_per_item(self):
+        messages = [{'role': 'system', 'content': 'Be nice.'}, {'role': 'user', 'content': 'Hi'}]
+        reference, blobs = payload_store.split(messages)
+        self.assertEqual(len(blobs), 2)
+        self.assertEqual(payload_store.reference_keys(reference), list(blobs))
+        self.assertEqual(payload_store.join(reference, blobs), json.dumps(messages, ensure_ascii=False))
+
+    def test_other_payloads_single_blob(self):
+        reference, blobs = payload_store.split('{"messages": []}')
+        self.assertEqual(list(blobs), [reference])
+        self.assertEqual(payload_store.join(reference, blobs), '{"messages": []}')
+        self.assertEqual(payload_store.split(None), (None, {}))
+
+    def test_missing_blob(self):
+        reference, blobs = payload_store.split([{'role': 'user', 'content': 'Hi'}])
+        self.assertIs(payload_store.join(reference, {}), False)
+
+    def test_pack_compresses_large_blobs_only(self):
+        small = b'{"role": "user"}'
+        self.assertEqual(payload_store.pack(small), (False, small))
+        large = json.dumps({'content': 'shipping policy ' * 200}).encode()
+        compressed, content = payload_store.pack(large)
+        self.assertTrue(compressed)
+        self.assertLess(len(content), len(large) // 10)
+        self.assertEqual(payload_store.unpack(compressed, content), large)
+
+
+class TestPayloadStore(TransactionCase):
+    """Tests for the deduplicated payloads of llm.api.log."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.channel = cls.env['im_livechat.channel'].create({
+            'name': 'Payload Channel',
+            'ai_enabled': True,
+            'ai_api_base_url': 'https://api.openai.com/v1',
+            'ai_api_key': 'sk-test',
+            'ai_model': 'gpt-4o',
+        })
+        cls.system = {'role': 'system', 'content': 'You answer questions about our shop. ' * 50}
+
+    def _log(self, messages, response=None):
+        self.channel._create_api_log(
+            self.env,
+            channel_id=self.channel.id,
+            discuss_channel_id=False,
+            model_name='gpt-4o',
+            status='success',
+            request_payload=messages,
+            response_payload=response,
+        )
+        return self.env['llm.api.log'].search(
+            [('livechat_channel_id', '=', self.channel.id)], order='id desc', limit=1,
+        )
+
+    def _count_blobs(self):
+        self.env.cr.execute("SELECT count(*) FROM llm_api_payload")
+        return self.env.cr.fetchone()[0]
+
+    def test_conversation_shares_blobs(self):
+        before = self._count_blobs()
+        messages = [self.system, {'role': 'user', 'content': 'Do you ship abroad?'}]
+        first = self._log(messages, {'choices': [{'message': {'content': 'Yes'}}]})
+        messages = messages + [
+            {'role': 'assistant', 'content': 'Yes'},
+            {'role': 'user', 'content': 'How long does it take?'},
+        ]
+        second = self._log(messages)
+        retry = self._log(messages)
+        # System prompt, 3 history messages and one response, each stored once
+        self.assertEqual(self._count_blobs() - before, 5)
+        self.assertEqual(second.request_payload_ref, retry.request_payload_ref)
+        self.assertEqual(json.loads(second.request_payload), messages)
+        self.assertEqual(json.loads(first.response_payload)['choices'][0]['message']['content'], 'Yes')
+
+        self.env.cr.execute(
+            "SELECT compressed, size, octet_length(content) FROM llm_api_payload WHERE key = %s",
+            [payload_store.reference_keys(first.request_payload_ref)[0]],
+        )
+        compressed, size, stored_size = self.env.cr.fetchone()
+        self.assertTrue(compressed)
+        self.assertLess(stored_size, size // 10)
+
+    def test_orm_write_goes_to_store(self):
+        log = self.env['llm.api.log'].create({
+            'status': 'error',
+            'response_payload': '{"error": "overloaded"}',
+        })
+        self.assertTrue(log.response_payload_ref)
+        log.invalidate_recordset()
+        self.assertEqual(log.response_payload, '{"error": "overloaded"}')
+        self.assertFalse(log.request_payload)
+
+    def test_cleanup_removes_unused_blobs(self):
+        log = self._log([{'role': 'user', 'content': 'An old question'}])
+        key = payload_store.reference_keys(log.request_payload_ref)[0]
+        old_date = fields.Date.today() - timedelta(days=40)
+        self.env.cr.execute("UPDATE llm_api_payload SET last_used = %s WHERE key = %s", [old_date, key])
+        self.env.cr.execute(
+            "UPDATE llm_api_log SET timestamp = %s WHERE id = %s",
+            [fields.Datetime.now() - timedelta(days=40), log.id],
+        )
+        self.env['llm.api.log'].invalidate_model()
+        self.env['llm.api.log']._cleanup_old_logs()
+        self.assertFalse(log.exists())
+        self.env.cr.execute("SELECT 1 FROM llm_api_payload WHERE key = %s", [key])
+        self.assertFalse(self.env.cr.fetchone())
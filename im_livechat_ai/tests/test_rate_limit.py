@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch, MagicMock
+
+from odoo.tests.common import BaseCase, TransactionCase
+
+from odoo.addons.im_livechat_ai.tools import rate_limiter
+
+
+class TestRateLimiterTool(BaseCase):
+    """Tests for the token bucket arithmetic."""
+
+    def test_compute_wait(self):
+        self.assertEqual(rate_limiter.compute_wait(1, 500, 60, 1000), 0.0)
+        self.assertAlmostEqual(rate_limiter.compute_wait(-2, 500, 60, 1000), 2.0)
+        self.assertAlmostEqual(rate_limiter.compute_wait(0, -500, 60, 1000), 30.0)
+        # Unlimited buckets never wait
+        self.assertEqual(rate_limiter.compute_wait(-5, -5, 0, 0), 0.0)
+
+    def test_fill_level(self):
+        self.assertEqual(rate_limiter.fill_level(-10, 0, 0), 1.0)
+        self.assertAlmostEqual(rate_limiter.fill_level(30, 60, 0), 0.5)
+        self.assertAlmostEqual(rate_limiter.fill_level(30, 60, 15), 0.75)
+        self.assertEqual(rate_limiter.fill_level(-30, 60, 0), 0.0)
+
+    def test_key_hint_hides_key(self):
+        self.assertEqual(rate_limiter.key_hint('sk-abcdefghijkl1234'), 'sk-...1234')
+        self.assertNotIn('abcdef', rate_limiter.key_hash('sk-abcdefghijkl1234'))
+
+
+class TestRateLimit(TransactionCase):
+    """Tests for the shared per-key token buckets."""
+
+    def _config(self, rpm=0, tpm=0, api_key='sk-rate-limit-test'):
+        return {'api_key': api_key, 'rpm_limit': rpm, 'tpm_limit': tpm}
+
+    def test_requests_wait_for_their_turn(self):
+        RateLimit = self.env['llm.rate.limit']
+        config = self._config(rpm=6)
+        for _i in range(6):
+            self.assertEqual(RateLimit._reserve(config, 0), 0.0)
+        # One request every 10 seconds once the burst is spent
+        self.assertAlmostEqual(RateLimit._reserve(config, 0), 10.0, delta=0.5)
+        self.assertAlmostEqual(RateLimit._reserve(config, 0), 20.0, delta=0.5)
+
+    def test_saturated_bucket_refuses_without_reserving(self):
+        RateLimit = self.env['llm.rate.limit']
+        config = self._config(tpm=1000)
+        self.assertEqual(RateLimit._reserve(config, 800), 0.0)
+        self.assertAlmostEqual(RateLimit._reserve(config, 800), 36.0, delta=0.5)
+        self.assertIs(RateLimit._reserve(config, 800), False)
+        record = RateLimit.search([('key_hash', '=', rate_limiter.key_hash(config['api_key']))])
+        self.assertAlmostEqual(record.token_level, -600, delta=20)
+
+    def test_release_refills_and_fill_level(self):
+        RateLimit = self.env['llm.rate.limit']
+        config = self._config(tpm=1000)
+        RateLimit._reserve(config, 800)
+        record = RateLimit.search([('key_hash', '=', rate_limiter.key_hash(config['api_key']))])
+        self.assertEqual(record.key_hint, 'sk-...test')
+        self.assertLess(record.token_fill, 30)
+        RateLimit._release(config, tokens=700)
+        record.invalidate_recordset()
+        self.assertGreater(record.token_fill, 85)
+
+    def test_unlimited_key_not_stored(self):
+        self.assertEqual(self.env['llm.rate.limit']._reserve(self._config(), 1000), 0.0)
+        self.assertFalse(self.env['llm.rate.limit'].search([
+            ('key_hash', '=', rate_limiter.key_hash('sk-rate-limit-test')),
+        ]))
+
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.time.sleep')
+    def test_calls_over_the_limit_are_queued(self, mock_sleep, mock_post):
+        channel = self.env['im_livechat.channel'].create({
+            'name': 'Rate Limited Channel',
+            'ai_enabled': True,
+            'ai_api_base_url': 'https://api.openai.com/v1',
+            'ai_api_key': 'sk-rate-limited-channel',
+            'ai_model': 'gpt-4o',
+            'ai_rate_limit_rpm': 1,
+        })
+        visitor = self.env['res.partner'].create({'name': 'Rate Limit Visitor'})
+        response = MagicMock(status_code=200)
+        response.json.return_value = {
+            'choices': [{'message': {'content': 'Hi'}}],
+            'usage': {'prompt_tokens': 10, 'completion_tokens': 2, 'total_tokens': 12},
+        }
+        mock_post.return_value = response
+
+        for _i in range(2):
+            session = self.env['discuss.channel'].create({
+                'name': 'Rate Limit Session',
+                'channel_type': 'livechat',
+                'livechat_channel_id': channel.id,
+            })
+            self.env['mail.message'].create({
+                'body': 'Hello',
+                'model': 'discuss.channel',
+                'res_id': session.id,
+                'message_type': 'comment',
+                'author_id': visitor.id,
+            })
+            channel._process_ai_response(self.env.cr.dbname, channel.id, session.id, test_env=self.env)
+
+        self.assertEqual(mock_post.call_count, 2)
+        mock_sleep.assert_called_once()
+        self.assertAlmostEqual(mock_sleep.call_args.args[0], 60.0, delta=1.0)
+
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
+    def test_failed_reservation_not_sent(self, mock_post):
+        """A reservation whose transaction failed should neither send the call nor release tokens."""
+        channel = self.env['im_livechat.channel'].create({
+            'name': 'Failed Reservation Channel',
+            'ai_enabled': True,
+            'ai_api_base_url': 'https://api.openai.com/v1',
+            'ai_api_key': 'sk-failed-reservation',
+            'ai_model': 'gpt-4o',
+            'ai_rate_limit_rpm': 10,
+        })
+        config = channel._get_llm_request_config()
+        request = {
+            'channel_id': channel.id,
+            'messages': [{'role': 'user', 'content': 'Hi'}],
+            'config': config,
+            'endpoints': channel._get_llm_endpoint_configs(config),
+            'max_retries': 3,
+            'retry_delay': 1,
+        }
+        result = channel._execute_ai_request(request, reserve_rate_limit=lambda config, tokens: None)
+        mock_post.assert_not_called()
+        self.assertIsNone(result['reply'])
+        self.assertFalse(result['rate_limit_releases'])
+        self.assertIn('could not be reserved', result['attempts'][-1]['error_message'])
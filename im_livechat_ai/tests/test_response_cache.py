@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import uuid
+from unittest.mock import patch, MagicMock
+
+from odoo.tests.common import BaseCase, TransactionCase
+
+from odoo.addons.im_livechat_ai.tools.response_cache import ResponseCache, make_cache_key
+
+CONFIG = {'model': 'gpt-4o', 'temperature': 0.7}
+
+
+class TestResponseCacheTool(BaseCase):
+    """Tests for the exact-match reply cache."""
+
+    def test_key_normalizes_text(self):
+        first = [{'role': 'system', 'content': 'Be nice.'}, {'role': 'user', 'content': 'Opening  hours?'}]
+        second = [{'role': 'system', 'content': 'be nice.'}, {'role': 'user', 'content': ' opening hours? '}]
+        self.assertEqual(make_cache_key(CONFIG, first), make_cache_key(CONFIG, second))
+
+    def test_key_depends_on_prompt_model_and_turns(self):
+        messages = [{'role': 'system', 'content': 'Be nice.'}, {'role': 'user', 'content': 'Hi'}]
+        key = make_cache_key(CONFIG, messages)
+        self.assertNotEqual(key, make_cache_key(dict(CONFIG, model='other'), messages))
+        self.assertNotEqual(key, make_cache_key(dict(CONFIG, temperature=0.1), messages))
+        other_prompt = [dict(messages[0], content='Be rude.'), messages[1]]
+        self.assertNotEqual(key, make_cache_key(CONFIG, other_prompt))
+        longer = messages + [{'role': 'assistant', 'content': 'Hello'}, {'role': 'user', 'content': 'Hi'}]
+        self.assertNotEqual(key, make_cache_key(CONFIG, longer, turns=3))
+        self.assertEqual(key, make_cache_key(CONFIG, longer, turns=1))
+
+    def test_ttl_expiry(self):
+        now = [0.0]
+        cache = ResponseCache(clock=lambda: now[0])
+        cache.put('k', 'reply', ttl=10)
+        self.assertEqual(cache.get('k'), 'reply')
+        now[0] = 11
+        self.assertIsNone(cache.get('k'))
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_entries=2)
+        cache.put('a', 'A')
+        cache.put('b', 'B')
+        cache.get('a')
+        cache.put('c', 'C')
+        self.assertEqual(cache.get('a'), 'A')
+        self.assertIsNone(cache.get('b'))
+
+
+class TestResponseCacheFlow(TransactionCase):
+    """The reply cache in the AI reply pipeline."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.channel = cls.env['im_livechat.channel'].create({
+            'name': 'Cache Test Channel',
+            'ai_enabled': True,
+            'ai_api_base_url': 'https://api.openai.com/v1',
+            'ai_api_key': 'sk-test',
+            'ai_model': 'gpt-4o',
+            # Unique prompt: the cache is shared by the whole process
+            'ai_system_prompt': 'Cache test %s' % uuid.uuid4(),
+            'ai_response_cache_enabled': True,
+        })
+        cls.visitor = cls.env['res.partner'].create({'name': 'Cache Visitor'})
+
+    def _ask(self, question):
+        session = self.env['discuss.channel'].create({
+            'name': 'Cache Session',
+            'channel_type': 'livechat',
+            'livechat_channel_id': self.channel.id,
+        })
+        self.env['mail.message'].create({
+            'body': question,
+            'model': 'discuss.channel',
+            'res_id': session.id,
+            'message_type': 'comment',
+            'author_id': self.visitor.id,
+        })
+        self.channel._process_ai_response(self.env.cr.dbname, self.channel.id, session.id, test_env=self.env)
+        return session
+
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
+    def test_repeated_question_served_from_cache(self, mock_post):
+        response = MagicMock(status_code=200)
+        response.json.return_value = {
+            'choices': [{'message': {'content': 'We open at 9.'}}],
+            'usage': {'prompt_tokens': 20, 'completion_tokens': 5, 'total_tokens': 25},
+        }
+        mock_post.return_value = response
+
+        self._ask('What are your opening hours?')
+        session = self._ask('what are your  opening hours?')
+        self.assertEqual(mock_post.call_count, 1)
+
+        log = self.env['llm.api.log'].search([('discuss_channel_id', '=', session.id)])
+        self.assertEqual(log.status, 'cache_hit')
+        self.assertEqual(log.total_tokens, 0)
+        reply = self.env['mail.message'].search([
+            ('model', '=', 'discuss.channel'),
+            ('res_id', '=', session.id),
+            ('author_id', '=', self.channel.ai_bot_partner_id.id),
+        ])
+        self.assertIn('We open at 9.', reply.body)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import MagicMock
+
+import requests
+
+from odoo.tests.common import BaseCase
+
+from odoo.addons.im_livechat_ai.tools.retry import (
+    RetryBudget, RetryPolicy, is_retryable, parse_retry_after,
+)
+
+
+def _http_error(status, headers=None):
+    response = MagicMock()
+    response.status_code = status
+    response.headers = headers or {}
+    return requests.HTTPError('%s Error' % status, response=response)
+
+
+class TestRetryPolicy(BaseCase):
+    """Tests for the LLM retry policy helpers."""
+
+    def test_retryable_errors(self):
+        """Transient errors should be retried, client errors should not."""
+        self.assertTrue(is_retryable(requests.ConnectionError('reset')))
+        self.assertTrue(is_retryable(requests.Timeout('slow')))
+        self.assertTrue(is_retryable(ValueError('Empty response')))
+        for status in (408, 429, 500, 502, 503):
+            self.assertTrue(is_retryable(_http_error(status)), status)
+        for status in (400, 401, 403, 404, 422):
+            self.assertFalse(is_retryable(_http_error(status)), status)
+
+    def test_retry_after_seconds(self):
+        self.assertEqual(parse_retry_after(_http_error(429, {'Retry-After': '7'})), 7.0)
+
+    def test_retry_after_http_date(self):
+        error = _http_error(503, {'Retry-After': 'Wed, 21 Oct 2015 07:28:30 GMT'})
+        # 1445412480 is 07:28:00 on that day
+        self.assertAlmostEqual(parse_retry_after(error, now=1445412480), 30.0)
+
+    def test_retry_after_missing_or_invalid(self):
+        self.assertIsNone(parse_retry_after(_http_error(429)))
+        self.assertIsNone(parse_retry_after(_http_error(429, {'Retry-After': 'soon'})))
+        self.assertIsNone(parse_retry_after(ValueError('no response')))
+
+    def test_exponential_backoff_with_full_jitter(self):
+        """The delay ceiling should double per retry, capped at max_delay."""
+        policy = RetryPolicy(2, max_delay=10, rand=lambda: 1.0)
+        self.assertEqual([policy.compute_delay(n) for n in range(4)], [2, 4, 8, 10])
+        policy = RetryPolicy(2, rand=lambda: 0.25)
+        self.assertEqual(policy.compute_delay(2), 2.0)
+
+    def test_retry_after_takes_precedence(self):
+        policy = RetryPolicy(2, max_retry_after=30, rand=lambda: 1.0)
+        self.assertEqual(policy.compute_delay(0, _http_error(429, {'Retry-After': '12'})), 12.0)
+        self.assertEqual(policy.compute_delay(0, _http_error(429, {'Retry-After': '600'})), 30.0)
+
+    def test_budget_limits_retries(self):
+        """Retries should be refused beyond the ratio of recent requests."""
+        now = [0.0]
+        budget = RetryBudget(ratio=0.5, min_retries=1, window=10, clock=lambda: now[0])
+        for _i in range(4):
+            budget.record_request()
+        self.assertTrue(budget.try_acquire_retry())
+        self.assertTrue(budget.try_acquire_retry())
+        self.assertFalse(budget.try_acquire_retry())
+        now[0] = 11.0
+        self.assertTrue(budget.try_acquire_retry())
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import unittest
+from unittest.mock import patch, MagicMock
+
+from odoo.tests.common import BaseCase, TransactionCase
+
+from odoo.addons.im_livechat_ai.tools import semantic_cache
+
+
+@unittest.skipUnless(semantic_cache.is_available(), "numpy is not installed")
+class TestSemanticCacheTool(BaseCase):
+    """Tests for the similar questions cache."""
+
+    def setUp(self):
+        super().setUp()
+        self.embedder = semantic_cache.HashingEmbedder()
+
+    def test_embedder_is_deterministic_and_normalized(self):
+        first = self.embedder.embed('What are your opening hours?')
+        second = self.embedder.embed('what are  your opening hours?')
+        self.assertAlmostEqual(float(first @ second), 1.0, places=5)
+        self.assertAlmostEqual(float((first ** 2).sum()), 1.0, places=5)
+
+    def test_paraphrase_closer_than_unrelated_question(self):
+        cache = semantic_cache.SemanticCache('hashing', self.embedder.dim)
+        cache.add('What are your opening hours?', 'From 9 to 5.', self.embedder.embed('What are your opening hours?'))
+        _answer, _question, paraphrase = cache.lookup(self.embedder.embed('When are your opening hours'), 0.0)
+        _answer, _question, unrelated = cache.lookup(self.embedder.embed('How much does shipping cost?'), 0.0)
+        self.assertGreater(paraphrase, 0.8)
+        self.assertLess(unrelated, 0.5)
+
+    def test_lookup_threshold(self):
+        cache = semantic_cache.SemanticCache('hashing', self.embedder.dim)
+        vector = self.embedder.embed('Do you ship abroad?')
+        cache.add('Do you ship abroad?', 'Yes.', vector)
+        self.assertEqual(cache.lookup(vector, 0.9)[0], 'Yes.')
+        self.assertIsNone(cache.lookup(self.embedder.embed('Can I pay by card?'), 0.9)[0])
+
+    def test_duplicate_replaces_and_oldest_evicted(self):
+        cache = semantic_cache.SemanticCache('hashing', self.embedder.dim, max_entries=2)
+        for question, answer in [('one', 'A'), ('one', 'B'), ('two', 'C'), ('three', 'D')]:
+            cache.add(question, answer, self.embedder.embed(question))
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.lookup(self.embedder.embed('one'), 0.99)[0])
+        self.assertEqual(cache.lookup(self.embedder.embed('three'), 0.99)[0], 'D')
+
+    def test_dumps_loads_roundtrip(self):
+        cache = semantic_cache.SemanticCache('hashing', self.embedder.dim)
+        cache.add('Do you ship abroad?', 'Yes.', self.embedder.embed('Do you ship abroad?'))
+        self.assertTrue(cache.dirty)
+        version, data = cache.dumps()
+        cache.mark_saved(version, 'checksum')
+        self.assertFalse(cache.dirty)
+
+        loaded = semantic_cache.SemanticCache.loads(data, self.embedder)
+        self.assertEqual(loaded.lookup(self.embedder.embed('do you ship abroad?'), 0.9)[0], 'Yes.')
+        self.assertIsNone(semantic_cache.SemanticCache.loads(data, semantic_cache.HashingEmbedder(dim=64)))
+        self.assertIsNone(semantic_cache.SemanticCache.loads(b'garbage', self.embedder))
+
+    def test_rebase_keeps_unsaved_pairs(self):
+        stored = semantic_cache.SemanticCache('hashing', self.embedder.dim)
+        stored.add('Do you ship abroad?', 'Yes.', self.embedder.embed('Do you ship abroad?'))
+        cache = semantic_cache.SemanticCache('hashing', self.embedder.dim)
+        cache.add('Old question', 'Saved.', self.embedder.embed('Old question'))
+        cache.mark_saved(cache.dumps()[0], 'old')
+        cache.add('Can I pay by card?', 'Sure.', self.embedder.embed('Can I pay by card?'))
+        cache.rebase(stored, 'new')
+        self.assertEqual(cache.checksum, 'new')
+        self.assertTrue(cache.dirty)
+        self.assertEqual(cache.lookup(self.embedder.embed('Do you ship abroad?'))[0], 'Yes.')
+        self.assertEqual(cache.lookup(self.embedder.embed('Can I pay by card?'))[0], 'Sure.')
+        # Pairs saved before are part of the stored version, or were dropped from it
+        self.assertIsNone(cache.lookup(self.embedder.embed('Old question'))[0])
+        self.assertEqual(len(cache), 2)
+
+
+@unittest.skipUnless(semantic_cache.is_available(), "numpy is not installed")
+class TestSemanticCacheFlow(TransactionCase):
+    """The similar questions cache in the AI reply pipeline."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.channel = cls.env['im_livechat.channel'].create({
+            'name': 'FAQ Test Channel',
+            'ai_enabled': True,
+            'ai_api_base_url': 'https://api.openai.com/v1',
+            'ai_api_key': 'sk-test',
+            'ai_model': 'gpt-4o',
+            'ai_semantic_cache_enabled': True,
+            'ai_semantic_cache_threshold': 0.8,
+        })
+        cls.visitor = cls.env['res.partner'].create({'name': 'FAQ Visitor'})
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(semantic_cache.drop_cache)
+
+    def _post(self, session, body, author):
+        self.env['mail.message'].create({
+            'body': body,
+            'model': 'discuss.channel',
+            'res_id': session.id,
+            'message_type': 'comment',
+            'author_id': author.id,
+        })
+
+    def _ask(self, question, session=None):
+        session = session or self.env['discuss.channel'].create({
+            'name': 'FAQ Session',
+            'channel_type': 'livechat',
+            'livechat_channel_id': self.channel.id,
+        })
+        self._post(session, question, self.visitor)
+        self.channel._process_ai_response(self.env.cr.dbname, self.channel.id, session.id, test_env=self.env)
+        return session
+
+    def _mock_reply(self, mock_post, content):
+        response = MagicMock(status_code=200)
+        response.json.return_value = {
+            'choices': [{'message': {'content': content}}],
+            'usage': {'prompt_tokens': 20, 'completion_tokens': 5, 'total_tokens': 25},
+        }
+        mock_post.return_value = response
+
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
+    def test_paraphrased_opening_question_answered_from_cache(self, mock_post):
+        self._mock_reply(mock_post, 'We open at 9.')
+        self._ask('What are your opening hours?')
+        self.assertTrue(self.channel._get_semantic_cache_attachment(), "New pairs are saved to the filestore")
+
+        session = self._ask('When are your opening hours')
+        self.assertEqual(mock_post.call_count, 1)
+        log = self.env['llm.api.log'].search([('discuss_channel_id', '=', session.id)])
+        self.assertEqual(log.status, 'cache_hit')
+        self.assertEqual(log.total_tokens, 0)
+
+    def test_save_merges_pairs_of_other_workers(self):
+        embedder = semantic_cache.get_embedder(self.channel.ai_semantic_cache_embedder)
+        # Another worker saved a pair this process never saw
+        other = semantic_cache.SemanticCache(embedder.name, embedder.dim)
+        other.add('Do you ship abroad?', 'Yes.', embedder.embed('Do you ship abroad?'))
+        self.channel.sudo().ai_semantic_cache_data = base64.b64encode(other.dumps()[1])
+        cache = semantic_cache.get_cache(self.channel.id, embedder)
+        cache.add('Can I pay by card?', 'Sure.', embedder.embed('Can I pay by card?'))
+
+        self.channel._save_semantic_cache(embedder)
+        stored = semantic_cache.SemanticCache.loads(self.channel._get_semantic_cache_attachment().raw, embedder)
+        self.assertEqual(len(stored), 2)
+        self.assertEqual(stored.lookup(embedder.embed('Do you ship abroad?'))[0], 'Yes.')
+        # Saved only once the transaction commits
+        self.assertTrue(cache.dirty)
+
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
+    def test_follow_up_questions_not_looked_up(self, mock_post):
+        self._mock_reply(mock_post, 'We open at 9.')
+        session = self._ask('What are your opening hours?')
+        self._ask('What are your opening hours?', session=session)
+        self.assertEqual(mock_post.call_count, 2)
+
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
+    def test_changing_prompt_clears_cache(self, mock_post):
+        self._mock_reply(mock_post, 'We open at 9.')
+        self._ask('What are your opening hours?')
+        self.channel.ai_system_prompt = 'Answer in French.'
+        self.assertFalse(self.channel._get_semantic_cache_attachment())
+
+        self._ask('What are your opening hours?')
+        self.assertEqual(mock_post.call_count, 2)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+import json
+from unittest.mock import patch, MagicMock
+
+from odoo.tests.common import BaseCase, TransactionCase
+
+from odoo.addons.im_livechat_ai.tools.streaming import (
+    ThinkTagFilter, ThrottledPublisher, iter_sse_events,
+)
+
+
+class TestStreamingTools(BaseCase):
+    """Tests for SSE parsing, incremental think-tag filtering and throttling."""
+
+    def _filter(self, chunks):
+        think_filter = ThinkTagFilter()
+        outputs = [think_filter.feed(chunk) for chunk in chunks]
+        return outputs, ''.join(outputs) + think_filter.flush()
+
+    def test_sse_events_parsed_until_done(self):
+        lines = [': keep-alive', '', 'data: {"a": 1}', 'data: [DONE]', 'data: {"b": 2}']
+        self.assertEqual(list(iter_sse_events(lines)), [{'a': 1}])
+
+    def test_think_block_split_across_chunks(self):
+        """A tag split over several chunks must never leak reasoning."""
+        outputs, text = self._filter(['<th', 'ink>secret', ' plan</thi', 'nk>Hel', 'lo'])
+        self.assertFalse(any('secret' in out or '<' in out for out in outputs))
+        self.assertEqual(text, 'Hello')
+
+    def test_unterminated_think_hides_rest(self):
+        _outputs, text = self._filter(['Hi', '<think>still reasoning'])
+        self.assertEqual(text, 'Hi')
+
+    def test_angle_bracket_text_released_on_flush(self):
+        _outputs, text = self._filter(['5 <', ' 10 <thi'])
+        self.assertEqual(text, '5 < 10 <thi')
+
+    def test_throttled_publisher(self):
+        published = []
+        now = [0.0]
+        publisher = ThrottledPublisher(published.append, interval=1.0, clock=lambda: now[0])
+        publisher('')
+        publisher('Hel')  # throttled
+        now[0] = 1.5
+        publisher('Hello')
+        publisher('Hello')  # unchanged
+        self.assertEqual(published, ['', 'Hello'])
+
+
+class TestStreamedReply(TransactionCase):
+    """Streaming mode should post a placeholder and update it in place."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.channel = cls.env['im_livechat.channel'].create({
+            'name': 'Streaming Channel',
+            'ai_enabled': True,
+            'ai_api_base_url': 'https://api.openai.com/v1',
+            'ai_api_key': 'sk-test',
+            'ai_model': 'gpt-4o',
+            'ai_stream_enabled': True,
+        })
+        cls.bot_partner = cls.channel._get_or_create_bot_partner()
+        cls.session = cls.env['discuss.channel'].create({
+            'name': 'Streaming Session',
+            'channel_type': 'livechat',
+            'livechat_channel_id': cls.channel.id,
+        })
+        cls.env['mail.message'].create({
+            'body': 'Hello',
+            'model': 'discuss.channel',
+            'res_id': cls.session.id,
+            'message_type': 'comment',
+        })
+
+    def _stream_response(self, deltas, usage=None):
+        lines = ['data: ' + json.dumps({'choices': [{'delta': {'content': delta}}]}) for delta in deltas]
+        if usage:
+            lines.append('data: {"choices": [], "usage": {"total_tokens": %d}}' % usage)
+        lines.append('data: [DONE]')
+        response = MagicMock()
+        response.status_code = 200
+        response.raise_for_status = MagicMock()
+        response.iter_lines.return_value = lines
+        return response
+
+    def _bot_messages(self):
+        return self.env['mail.message'].search([
+            ('res_id', '=', self.session.id),
+            ('model', '=', 'discuss.channel'),
+            ('author_id', '=', self.bot_partner.id),
+        ])
+
+    @patch('odoo.addons.im_livechat_ai.tools.streaming.STREAM_UPDATE_INTERVAL', 0)
+    @patch('odoo.addons.im_livechat_ai.models.im_livechat_channel.requests.Session.post')
+    def test_stream_updates_single_message(self, mock_post):
+        mock_post.return_value = self._stream_response(
+            ['<think>plan', '</think>Hi ', 'there!'], usage=42,
+        )
+        published = []
+        original = type(self.channel)._publish_partial_reply
+
+        def spy(channel_self, env, request, text):
+            published.append(text)
+            return original(channel_self, env, request, text)
+
+        with patch.object(type(self.channel), '_publish_partial_reply', spy):
+            self.channel._process_ai_response(
+                self.env.cr.dbname, self.channel.id, self.session.id, test_env=self.env,
+            )
+
+        self.assertTrue(mock_post.call_args[1]['json']['stream'])
+        self.assertFalse(any('plan' in text for text in published))
+        bot_messages = self._bot_messages()
+        self.assertEqual(len(bot_messages), 1)
+        self.assertIn('Hi there!', bot_messages.body)
+
+        log = self.env['llm.api.log'].search([
+            ('livechat_channel_id', '=', self.channel.id),
+            ('status', '=', 'success'),
+        ], limit=1)
+        self.assertEqual(log.total_tokens, 42)
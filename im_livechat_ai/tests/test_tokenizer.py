@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests.common import BaseCase
+
+from odoo.addons.im_livechat_ai.tools import tokenizer
+from odoo.addons.im_livechat_ai.tools.tokenizer import HeuristicTokenizer
+
+
+class TestTokenizer(BaseCase):
+    """Tests for the token estimators used for context windowing."""
+
+    def test_heuristic_counts(self):
+        counter = HeuristicTokenizer()
+        self.assertEqual(counter.count(''), 0)
+        self.assertEqual(counter.count('abcdefgh'), 2)
+        # CJK text is about one token per character
+        self.assertEqual(counter.count('你好世界'), 4)
+
+    def test_heuristic_truncate(self):
+        counter = HeuristicTokenizer()
+        text = 'word ' * 50
+        truncated = counter.truncate(text, 10)
+        self.assertTrue(text.startswith(truncated))
+        self.assertLessEqual(counter.count(truncated), 10)
+        self.assertEqual(counter.truncate('short', 10), 'short')
+
+    def test_registered_tokenizer_preferred(self):
+        """A registered factory should be used for the models it handles."""
+        custom = HeuristicTokenizer()
+        factory = lambda model: custom if model == 'custom-model' else None  # noqa: E731
+        tokenizer.register_tokenizer(factory)
+        self.addCleanup(tokenizer.get_tokenizer.cache_clear)
+        self.addCleanup(tokenizer._factories.remove, factory)
+        self.assertIs(tokenizer.get_tokenizer('custom-model'), custom)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+from odoo.tests.common import BaseCase
+
+from odoo.addons.im_livechat_ai.tools import worker_pool
+from odoo.addons.im_livechat_ai.tools.worker_pool import AIWorkerPool, POLICY_BLOCK, POLICY_REJECT
+
+
+class TestAIWorkerPool(BaseCase):
+    """Tests for the bounded AI worker pool."""
+
+    def setUp(self):
+        super().setUp()
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def _blocking_job(self):
+        self.started.set()
+        self.release.wait(5)
+
+    def _make_pool(self, **kwargs):
+        pool = AIWorkerPool(**kwargs)
+        self.addCleanup(pool.shutdown, True, 5)
+        self.addCleanup(self.release.set)
+        return pool
+
+    def test_runs_submitted_job(self):
+        """Submitted jobs should run on a worker thread."""
+        pool = self._make_pool(max_workers=1, max_queue=1)
+        done = threading.Event()
+        self.assertTrue(pool.submit(done.set))
+        self.assertTrue(done.wait(5))
+
+    def test_rejects_when_queue_full(self):
+        """With the reject policy, a full queue should shed new jobs."""
+        pool = self._make_pool(max_workers=1, max_queue=1)
+        self.assertTrue(pool.submit(self._blocking_job))
+        self.assertTrue(self.started.wait(5))
+        self.assertTrue(pool.submit(self._blocking_job))  # queued
+        self.assertFalse(pool.submit(self._blocking_job))  # rejected
+
+        stats = pool.stats()
+        self.assertEqual(stats['active'], 1)
+        self.assertEqual(stats['queued'], 1)
+        self.assertEqual(stats['rejected'], 1)
+
+    def test_block_policy_times_out(self):
+        """With the block policy, a full queue should reject after the timeout."""
+        pool = self._make_pool(max_workers=1, max_queue=1, policy=POLICY_BLOCK, block_timeout=0.1)
+        pool.submit(self._blocking_job)
+        self.assertTrue(self.started.wait(5))
+        pool.submit(self._blocking_job)
+        self.assertFalse(pool.submit(self._blocking_job))
+        self.assertEqual(pool.stats()['rejected'], 1)
+
+    def test_worker_count_bounded(self):
+        """The pool should never start more threads than max_workers."""
+        pool = self._make_pool(max_workers=2, max_queue=10)
+        for _i in range(6):
+            pool.submit(self._blocking_job)
+        self.assertLessEqual(pool.stats()['workers'], 2)
+
+    def test_failing_job_counted(self):
+        """Exceptions in jobs should be counted, not kill the worker."""
+        pool = self._make_pool(max_workers=1, max_queue=5)
+        done = threading.Event()
+
+        def boom():
+            raise RuntimeError('boom')
+
+        pool.submit(boom)
+        pool.submit(done.set)
+        self.assertTrue(done.wait(5))
+        pool._queue.join()
+        self.assertEqual(pool.stats()['failed'], 1)
+
+    def test_schedule_runs_in_due_order(self):
+        """Delayed jobs should run once due, earliest first."""
+        pool = self._make_pool(max_workers=1, max_queue=5)
+        order = []
+        done = threading.Event()
+        self.assertTrue(pool.schedule(0.2, lambda: (order.append('late'), done.set())))
+        self.assertTrue(pool.schedule(0.05, order.append, 'early'))
+        self.assertEqual(pool.stats()['scheduled'], 2)
+        self.assertTrue(done.wait(5))
+        self.assertEqual(order, ['early', 'late'])
+
+    def test_schedule_rejected_after_shutdown(self):
+        """A closed pool should refuse delayed jobs and drop pending timers."""
+        pool = self._make_pool(max_workers=1, max_queue=5)
+        pool.schedule(60, self._blocking_job)
+        pool.shutdown(wait=False)
+        self.assertEqual(pool.stats()['scheduled'], 0)
+        self.assertFalse(pool.schedule(1, self._blocking_job))
+
+    def test_unknown_policy_configured_once(self):
+        """An unknown policy should not reconfigure the shared pool on every call."""
+        self.addCleanup(setattr, worker_pool, '_pool', worker_pool._pool)
+        worker_pool._pool = None
+        with self.assertLogs(worker_pool._logger.name, 'WARNING') as logs:
+            pool = worker_pool.get_worker_pool(2, 10, 'drop-oldest', 1)
+            self.addCleanup(pool.shutdown, True, 5)
+            self.assertIs(worker_pool.get_worker_pool(2, 10, 'drop-oldest', 1), pool)
+            self.assertIs(worker_pool.get_worker_pool(2, 10, 'drop-oldest', 1), pool)
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(pool.policy, POLICY_REJECT)
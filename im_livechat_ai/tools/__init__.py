@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+
+from . import worker_pool
+from . import http_session
+from . import streaming
+from . import retry
+from . import circuit_breaker
+from . import context_cache
+from . import tokenizer
+from . import response_cache
+from . import semantic_cache
+from . import knowledge_index
+from . import endpoint_router
+from . import rate_limiter
+from . import async_engine
+from . import log_buffer
+from . import payload_store
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .http_session import _session_key
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+ENGINE_THREAD = 'thread'
+ENGINE_ASYNC = 'async'
+
+DEFAULT_MAX_IN_FLIGHT = 200
+DEFAULT_DB_WORKERS = 4
+DEFAULT_MAX_CLIENTS = 32
+DEFAULT_MAX_CONNECTIONS = 100
+
+
+def is_available():
+    """Whether the async engine can be used (httpx is installed)."""
+    return httpx is not None
+
+
+def to_requests_response(response):
+    """
+    Convert an httpx response into a requests.Response.
+
+    The retry policy, circuit breaker and logging all inspect
+    requests.HTTPError and its response; converting keeps a single code
+    path for both engines.
+    """
+    converted = requests.Response()
+    converted.status_code = response.status_code
+    converted.headers = CaseInsensitiveDict(response.headers)
+    converted._content = response.content
+    converted.encoding = response.encoding
+    converted.url = str(response.url)
+    converted.reason = response.reason_phrase
+    return converted
+
+
+class AsyncLLMEngine:
+    """
+    Event loop multiplexing LLM calls of the current process.
+
+    A single daemon thread runs an asyncio loop; every AI job is a task
+    on that loop, so an in-flight call costs a coroutine rather than a
+    thread and its stack. At most ``max_in_flight`` jobs run at a time.
+
+    Jobs still need the database before and after their call; those
+    short synchronous sections run in a small thread pool of
+    ``db_workers`` threads (see ``run_db``), each opening its own cursor.
+    HTTP clients are kept per endpoint like the requests sessions of
+    http_session, so connections are reused between calls.
+    """
+
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT, db_workers=DEFAULT_DB_WORKERS,
+                 max_clients=DEFAULT_MAX_CLIENTS, name='im_livechat_ai-async'):
+        self.name = name
+        self.pid = os.getpid()
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.db_workers = max(1, int(db_workers))
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._db_executor = None
+        self._clients = OrderedDict()
+        self._waiters = []
+        self._in_flight = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._closed = False
+
+    def _ensure_loop(self):
+        """Start the loop thread on first use; call with the lock held."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._loop = asyncio.new_event_loop()
+        self._db_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.db_workers, thread_name_prefix='%s-db' % self.name,
+        )
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name='%s-loop' % self.name, daemon=True,
+        )
+        self._thread.start()
+
+    def has_capacity(self):
+        with self._lock:
+            return not self._closed and self._in_flight < self.max_in_flight
+
+    def submit(self, coro_fn, *args):
+        """
+        Run the coroutine ``coro_fn(*args)`` on the loop.
+
+        Returns:
+            bool: True if the job was started, False if the engine is full
+        """
+        with self._lock:
+            if self._closed or self._in_flight >= self.max_in_flight:
+                self._rejected += 1
+                return False
+            self._ensure_loop()
+            self._in_flight += 1
+            self._submitted += 1
+            loop = self._loop
+        asyncio.run_coroutine_threadsafe(self._run(coro_fn, args), loop)
+        return True
+
+    async def _run(self, coro_fn, args):
+        try:
+            await coro_fn(*args)
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            _logger.exception("Unhandled error in async AI job")
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._completed += 1
+                waiters, self._waiters = self._waiters, []
+            for callback in waiters:
+                # Callbacks open cursors; keep them off the loop thread
+                self._db_executor.submit(callback)
+
+    def notify_when_free(self, callback):
+        """Call ``callback()`` once, as soon as a running job completes."""
+        with self._lock:
+            if self._in_flight < self.max_in_flight:
+                ready = True
+            else:
+                ready = False
+                self._waiters.append(callback)
+        if ready:
+            callback()
+
+    async def run_db(self, fn, *args):
+        """Run a blocking database section ``fn(*args)`` in the DB threads."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._db_executor, functools.partial(fn, *args),
+        )
+
+    async def run_blocking(self, fn, *args):
+        """Run other blocking work ``fn(*args)`` in the loop's default executor."""
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args))
+
+    def _get_client(self, base_url, api_key):
+        """Return the shared client of an endpoint; only called on the loop thread."""
+        key = _session_key(base_url, api_key)
+        client = self._clients.get(key)
+        if client is not None:
+            self._clients.move_to_end(key)
+            return client
+        client = self._clients[key] = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=DEFAULT_MAX_CONNECTIONS,
+                max_keepalive_connections=DEFAULT_MAX_CONNECTIONS,
+            ),
+        )
+        while len(self._clients) > self.max_clients:
+            _old_key, old_client = self._clients.popitem(last=False)
+            asyncio.get_running_loop().create_task(old_client.aclose())
+        return client
+
+    async def post(self, base_url, api_key, url, payload, headers, timeout):
+        """
+        POST a JSON payload; errors are raised as requests exceptions.
+
+        Returns:
+            requests.Response
+        """
+        client = self._get_client(base_url, api_key)
+        try:
+            response = await client.post(url, json=payload, headers=headers, timeout=timeout)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(str(e)) from e
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(str(e)) from e
+        return to_requests_response(response)
+
+    def stats(self):
+        """
+        Returns:
+            dict: in_flight, submitted, completed, failed, rejected, clients
+                and the configured limits
+        """
+        with self._lock:
+            return {
+                'in_flight': self._in_flight,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'clients': len(self._clients),
+                'max_in_flight': self.max_in_flight,
+                'db_workers': self.db_workers,
+            }
+
+    def format_stats(self):
+        return 'in_flight=%(in_flight)s/%(max_in_flight)s rejected=%(rejected)s' % self.stats()
+
+    def shutdown(self, timeout=None):
+        """Stop accepting jobs, close the HTTP clients and stop the loop."""
+        with self._lock:
+            self._closed = True
+            loop, thread = self._loop, self._thread
+        if loop is None:
+            return
+
+        async def close_clients():
+            for client in list(self._clients.values()):
+                await client.aclose()
+            self._clients.clear()
+
+        try:
+            asyncio.run_coroutine_threadsafe(close_clients(), loop).result(timeout)
+        except Exception:
+            _logger.warning("Could not close the async LLM clients cleanly", exc_info=True)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        self._db_executor.shutdown(wait=False)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine(max_in_flight=DEFAULT_MAX_IN_FLIGHT, db_workers=DEFAULT_DB_WORKERS):
+    """
+    Return the process-wide async engine, creating it on first use.
+
+    Like the worker pool, the engine is recreated after a fork; changed
+    limits apply to the next jobs (the DB threads are sized at start).
+
+    Returns:
+        AsyncLLMEngine|None: None if httpx is not installed
+    """
+    global _engine
+    if not is_available():
+        return None
+    with _engine_lock:
+        if _engine is None or _engine.pid != os.getpid():
+            _engine = AsyncLLMEngine(max_in_flight, db_workers)
+        elif _engine.max_in_flight != max_in_flight:
+            with _engine._lock:
+                _engine.max_in_flight = max(1, int(max_in_flight))
+        return _engine
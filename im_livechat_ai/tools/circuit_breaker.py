@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+import time
+
+import requests
+
+from . import retry
+
+_logger = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RECOVERY_TIMEOUT = 60.0
+
+
+def is_provider_failure(error):
+    """
+    Whether an error means the provider itself is unhealthy.
+
+    Only network errors, timeouts, rate limits and server errors count;
+    a bad request or an empty answer says nothing about availability.
+    """
+    if not isinstance(error, requests.RequestException):
+        return False
+    status = retry.get_status_code(error)
+    return status is None or retry.is_retryable(error)
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker for one LLM endpoint.
+
+    - closed: calls go through; ``failure_threshold`` consecutive provider
+      failures open the circuit.
+    - open: calls fail fast until ``recovery_timeout`` seconds have passed.
+    - half-open: a single probe call is let through; its success closes
+      the circuit, its failure opens it again.
+
+    The breaker is shared by the threads of a process. Every state change
+    bumps ``version`` so the owner can tell which changes still have to be
+    mirrored to the database for the other processes (see
+    ``snapshot``/``mark_saved``/``load``).
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 recovery_timeout=DEFAULT_RECOVERY_TIMEOUT, clock=time.time):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._changed_at = 0.0
+        self._probe_in_flight = False
+        self._version = 0
+        self._saved_version = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == STATE_OPEN and self._clock() - self._opened_at >= self.recovery_timeout:
+            return STATE_HALF_OPEN
+        return self._state
+
+    def _set(self, state, failures):
+        if (state, failures) == (self._state, self._failures):
+            return
+        if state != self._state:
+            _logger.info("LLM circuit breaker: %s -> %s", self._state, state)
+        self._state = state
+        self._failures = failures
+        now = self._clock()
+        if state == STATE_OPEN:
+            self._opened_at = now
+        self._changed_at = now
+        self._version += 1
+
+    def allow_request(self):
+        """
+        Returns:
+            bool: False if the call must fail fast
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == STATE_CLOSED:
+                return True
+            if state == STATE_HALF_OPEN and not self._probe_in_flight:
+                self._set(STATE_HALF_OPEN, self._failures)
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._probe_in_flight = False
+            self._set(STATE_CLOSED, 0)
+
+    def record_failure(self):
+        with self._lock:
+            self._probe_in_flight = False
+            failures = self._failures + 1
+            if self._state == STATE_HALF_OPEN or failures >= self.failure_threshold:
+                self._set(STATE_OPEN, failures)
+            else:
+                self._set(self._state, failures)
+
+    def reset(self):
+        """Close the circuit and forget failures and unsaved changes."""
+        with self._lock:
+            self._state = STATE_CLOSED
+            self._failures = 0
+            self._opened_at = None
+            self._changed_at = 0.0
+            self._probe_in_flight = False
+            self._saved_version = self._version
+
+    def release(self):
+        """Give the half-open probe slot back after a call that proved nothing."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    # --- Cross-process mirroring ---
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self._state,
+                'failure_count': self._failures,
+                'opened_at': self._opened_at,
+                'changed_at': self._changed_at,
+                'version': self._version,
+                'dirty': self._version > self._saved_version,
+            }
+
+    def mark_saved(self, version):
+        with self._lock:
+            self._saved_version = max(self._saved_version, version)
+
+    def load(self, state=STATE_CLOSED, failure_count=0, opened_at=None, changed_at=0.0):
+        """
+        Adopt the state stored by another process if it is more recent.
+
+        Local changes not mirrored yet always win; without them, the
+        stored state is adopted, and a missing record resets the breaker.
+        """
+        with self._lock:
+            if self._version > self._saved_version:
+                return
+            if changed_at and changed_at < self._changed_at:
+                return
+            if (state, failure_count) == (self._state, self._failures):
+                return
+            self._state = state
+            self._failures = failure_count
+            self._opened_at = opened_at if opened_at is not None else self._clock()
+            self._changed_at = changed_at
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(base_url, model, failure_threshold=None, recovery_timeout=None):
+    """Return the process-wide breaker of an endpoint and model, updating its settings if given."""
+    key = ((base_url or '').strip().rstrip('/').lower(), model or '')
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker()
+        if failure_threshold is not None:
+            breaker.failure_threshold = failure_threshold
+        if recovery_timeout is not None:
+            breaker.recovery_timeout = recovery_timeout
+        return breaker
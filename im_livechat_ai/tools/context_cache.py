@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_SESSIONS = 512
+# Upper bound of ai_max_history: older messages are never sent to the LLM
+MAX_MESSAGES_PER_SESSION = 200
+
+
+class ContextEntry:
+    """
+    Cleaned history of one chat session.
+
+    ``messages`` holds ``(message_id, author_id, clean_body)`` tuples in
+    chronological order, truncated to the last MAX_MESSAGES_PER_SESSION;
+    ``count`` and ``max_write_date`` describe all messages up to
+    ``last_id`` and are compared with the database to detect edits and
+    deletions.
+    """
+    __slots__ = ('last_id', 'count', 'max_write_date', 'messages')
+
+    def __init__(self, last_id=0, count=0, max_write_date=None, messages=()):
+        self.last_id = last_id
+        self.count = count
+        self.max_write_date = max_write_date
+        self.messages = list(messages)[-MAX_MESSAGES_PER_SESSION:]
+
+    def extended(self, rows):
+        """
+        Return a new entry with rows appended.
+
+        Args:
+            rows (list): (message_id, author_id, clean_body, write_date)
+                tuples of messages newer than last_id, in id order
+        """
+        if not rows:
+            return self
+        max_write_date = max(
+            [row[3] for row in rows if row[3]] + ([self.max_write_date] if self.max_write_date else []),
+            default=None,
+        )
+        return ContextEntry(
+            last_id=rows[-1][0],
+            count=self.count + len(rows),
+            max_write_date=max_write_date,
+            messages=self.messages + [row[:3] for row in rows],
+        )
+
+
+class ConversationCache:
+    """
+    Process-wide LRU cache of cleaned conversation histories.
+
+    Entries are immutable once stored (``extended`` returns a copy), so
+    they can be shared by the worker threads without holding the lock
+    while building the LLM context.
+    """
+
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            return {'sessions': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+conversation_cache = ConversationCache()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+POLICY_PRIORITY = 'priority'
+POLICY_LATENCY = 'latency'
+
+# Weight of the newest sample in the moving average
+DEFAULT_ALPHA = 0.3
+# A failed call counts as a sample this slow (the request timeout)
+FAILURE_LATENCY = 60.0
+
+
+def endpoint_key(config):
+    return ((config.get('base_url') or '').rstrip('/'), config.get('model') or '')
+
+
+class LatencyTracker:
+    """
+    Exponentially weighted moving average of response times per endpoint.
+
+    Failures are recorded as FAILURE_LATENCY samples, so an endpoint that
+    times out or answers 5xx falls behind the healthy ones and only
+    catches up after several fast replies.
+    """
+
+    def __init__(self, alpha=DEFAULT_ALPHA):
+        self.alpha = alpha
+        self._averages = {}
+        self._lock = threading.Lock()
+
+    def record(self, config, seconds):
+        key = endpoint_key(config)
+        with self._lock:
+            previous = self._averages.get(key)
+            self._averages[key] = seconds if previous is None else (
+                self.alpha * seconds + (1 - self.alpha) * previous
+            )
+
+    def record_failure(self, config):
+        self.record(config, FAILURE_LATENCY)
+
+    def get(self, config):
+        """Returns: float|None: The average response time, None before any call."""
+        with self._lock:
+            return self._averages.get(endpoint_key(config))
+
+    def reset(self):
+        with self._lock:
+            self._averages.clear()
+
+
+def order_endpoints(endpoints, policy=POLICY_PRIORITY, tracker=None):
+    """
+    Return the endpoints in the order they should be tried.
+
+    With the priority policy the configured order is kept: the first
+    endpoint serves all calls and the next ones are fallbacks. With the
+    latency policy, endpoints are sorted by average response time
+    divided by their weight; endpoints without samples come first so
+    that they get measured.
+
+    Args:
+        endpoints (list): Request configs, each with an optional 'weight'
+        policy (str): POLICY_PRIORITY or POLICY_LATENCY
+        tracker (LatencyTracker|None): Defaults to the process tracker
+    """
+    if policy != POLICY_LATENCY or len(endpoints) < 2:
+        return list(endpoints)
+    tracker = tracker or latency_tracker
+
+    def score(item):
+        position, config = item
+        average = tracker.get(config)
+        return (average is not None, (average or 0.0) / max(config.get('weight') or 1, 1), position)
+
+    return [config for _position, config in sorted(enumerate(endpoints), key=score)]
+
+
+latency_tracker = LatencyTracker()
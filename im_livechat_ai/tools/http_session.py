@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import http.cookiejar
+import logging
+import threading
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 16
+DEFAULT_MAX_SESSIONS = 32
+
+
+def _normalize_base_url(base_url):
+    return (base_url or '').strip().rstrip('/').lower()
+
+
+def _session_key(base_url, api_key):
+    # Only a digest of the key is kept in memory as part of the cache key
+    key_digest = hashlib.sha256((api_key or '').encode()).hexdigest()[:16]
+    return _normalize_base_url(base_url), key_digest
+
+
+class LLMSessionPool:
+    """
+    Keep one persistent requests.Session per LLM endpoint.
+
+    Reusing the session keeps TCP/TLS connections to the provider alive
+    between replies instead of paying a new handshake for every message.
+    Sessions are keyed by base URL and a digest of the API key, so a key
+    rotation naturally gets a fresh session in every process; the least
+    recently used sessions are closed beyond ``max_sessions``.
+
+    Sessions are shared by all worker threads: urllib3 connection pools
+    are thread-safe and cookies, the only mutable per-session state, are
+    disabled.
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE, max_sessions=DEFAULT_MAX_SESSIONS):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def _new_session(self):
+        session = requests.Session()
+        # Cookies are the only per-session mutable state; LLM APIs do not need them
+        session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=0,  # retries are handled by the caller
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def get(self, base_url, api_key):
+        """
+        Return the shared session for an endpoint, creating it on a miss.
+
+        Args:
+            base_url (str): The API base URL
+            api_key (str): The API key used with this endpoint
+
+        Returns:
+            requests.Session
+        """
+        key = _session_key(base_url, api_key)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                self._hits += 1
+                self._sessions.move_to_end(key)
+                return session
+            self._misses += 1
+            session = self._sessions[key] = self._new_session()
+            while len(self._sessions) > self.max_sessions:
+                _old_key, old_session = self._sessions.popitem(last=False)
+                old_session.close()
+            return session
+
+    def invalidate(self, base_url=None):
+        """
+        Close and forget the sessions of an endpoint (all sessions if None).
+
+        Returns:
+            int: Number of sessions closed
+        """
+        with self._lock:
+            if base_url is None:
+                keys = list(self._sessions)
+            else:
+                url = _normalize_base_url(base_url)
+                keys = [key for key in self._sessions if key[0] == url]
+            for key in keys:
+                self._sessions.pop(key).close()
+            self._invalidations += len(keys)
+            return len(keys)
+
+    def stats(self):
+        """
+        Return session and connection reuse counters.
+
+        ``hits``/``misses`` count session lookups; ``connections_opened``
+        and ``requests_sent`` come from the urllib3 pools, so their
+        difference is the number of requests that reused a live connection.
+        """
+        with self._lock:
+            connections = requests_sent = 0
+            for session in self._sessions.values():
+                adapter = session.get_adapter('https://')
+                for pool_key in list(adapter.poolmanager.pools.keys()):
+                    pool = adapter.poolmanager.pools.get(pool_key)
+                    if pool is not None:
+                        connections += pool.num_connections
+                        requests_sent += pool.num_requests
+            return {
+                'sessions': len(self._sessions),
+                'hits': self._hits,
+                'misses': self._misses,
+                'invalidations': self._invalidations,
+                'connections_opened': connections,
+                'requests_sent': requests_sent,
+                'connections_reused': max(0, requests_sent - connections),
+            }
+
+
+session_pool = LLMSessionPool()
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+import json
+import math
+import re
+import threading
+import zlib
+from collections import Counter, OrderedDict
+
+from .tokenizer import _WIDE_CHAR_RE
+
+# Chunks are cut at paragraph, then sentence boundaries below this size
+DEFAULT_CHUNK_SIZE = 800
+DEFAULT_TOP_K = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TERM_RE = re.compile(r'\w+')
+_PARAGRAPH_RE = re.compile(r'\n\s*\n')
+_SENTENCE_RE = re.compile(r'(?<=[.!?\u3002\uff01\uff1f])\s*')
+STOP_WORDS = frozenset((
+    'a an and are as at be but by can do does for from has have how i if in is it its me my '
+    'of on or our so that the their there this to was we what when where which who why will '
+    'with you your'
+).split())
+
+
+def tokenize(text):
+    """
+    Index terms of a text: lowercase words without stop words and
+    plural 's', and character bigrams of CJK runs, which have no word
+    separators.
+    """
+    terms = []
+    for word in _TERM_RE.findall((text or '').lower()):
+        if _WIDE_CHAR_RE.search(word):
+            terms.extend(word[i:i + 2] for i in range(max(1, len(word) - 1)))
+        elif word not in STOP_WORDS and (len(word) > 1 or word.isdigit()):
+            if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+                word = word[:-1]
+            terms.append(word)
+    return terms
+
+
+def _split_long(text, size):
+    parts, current = [], ''
+    for sentence in _SENTENCE_RE.split(text):
+        while len(sentence) > size:
+            parts.append(sentence[:size])
+            sentence = sentence[size:]
+        if current and len(current) + len(sentence) + 1 > size:
+            parts.append(current)
+            current = ''
+        current = '%s %s' % (current, sentence) if current else sentence
+    if current:
+        parts.append(current)
+    return parts
+
+
+def chunk_text(text, size=DEFAULT_CHUNK_SIZE):
+    """
+    Split a document into chunks of at most ``size`` characters,
+    merging short paragraphs and cutting long ones at sentence ends.
+    """
+    chunks, current = [], ''
+    for paragraph in _PARAGRAPH_RE.split(text or ''):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        pieces = _split_long(paragraph, size) if len(paragraph) > size else [paragraph]
+        for piece in pieces:
+            if current and len(current) + len(piece) + 2 > size:
+                chunks.append(current)
+                current = ''
+            current = '%s\n\n%s' % (current, piece) if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class KnowledgeIndex:
+    """
+    BM25 inverted index over the knowledge base chunks of a channel.
+
+    ``postings`` maps each term to a flat ``[chunk, tf, chunk, tf, ...]``
+    list; with the chunk lengths it is all BM25 needs, so a search only
+    visits the chunks containing a query term.
+    """
+
+    def __init__(self, chunks, postings, lengths):
+        self.chunks = chunks
+        self.postings = postings
+        self.lengths = lengths
+        self.average_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @classmethod
+    def build(cls, documents, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Args:
+            documents (list): (title, content) pairs
+
+        Returns:
+            KnowledgeIndex: Index of the documents' chunks
+        """
+        chunks, lengths, postings = [], [], {}
+        for title, content in documents:
+            for text in chunk_text(content, chunk_size):
+                index = len(chunks)
+                terms = tokenize('%s\n%s' % (title, text))
+                chunks.append([title, text])
+                lengths.append(len(terms))
+                for term, frequency in Counter(terms).items():
+                    postings.setdefault(term, []).extend((index, frequency))
+        return cls(chunks, postings, lengths)
+
+    def search(self, query, limit=DEFAULT_TOP_K):
+        """
+        Returns:
+            list: Up to ``limit`` (title, text, score) tuples, best first
+        """
+        if not self.chunks:
+            return []
+        count = len(self.chunks)
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            frequency_in_chunks = len(posting) // 2
+            idf = math.log(1 + (count - frequency_in_chunks + 0.5) / (frequency_in_chunks + 0.5))
+            for position in range(0, len(posting), 2):
+                index, tf = posting[position], posting[position + 1]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[index] / (self.average_length or 1))
+                scores[index] = scores.get(index, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [(self.chunks[index][0], self.chunks[index][1], score) for index, score in best]
+
+    def dumps(self):
+        """Serialize the index as zlib-compressed JSON."""
+        payload = {'chunks': self.chunks, 'postings': self.postings, 'lengths': self.lengths}
+        return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode(), 6)
+
+    @classmethod
+    def loads(cls, data):
+        payload = json.loads(zlib.decompress(data).decode())
+        return cls(payload['chunks'], payload['postings'], payload['lengths'])
+
+
+class IndexCache:
+    """Process-wide LRU cache of loaded indexes, keyed by (channel id, version)."""
+
+    def __init__(self, max_channels=64):
+        self.max_channels = max_channels
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """Return the cached index for key, calling loader() on a miss."""
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                return index
+        index = loader()
+        with self._lock:
+            self._entries[key] = index
+            while len(self._entries) > self.max_channels:
+                self._entries.popitem(last=False)
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+index_cache = IndexCache()
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+import atexit
+import logging
+import os
+import threading
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 2.0
+# Rows kept for a retry when the database is unavailable, in batches
+MAX_PENDING_BATCHES = 10
+
+
+class LogBuffer:
+    """
+    In-memory buffer of log rows, written in batches by a flusher thread.
+
+    ``add`` only appends to a list, so the reply transaction no longer
+    pays for the log writes. The flusher thread hands the pending rows to
+    ``writer`` (a single multi-row INSERT) as soon as ``batch_size`` rows
+    are waiting, and at least every ``flush_interval`` seconds otherwise.
+    Rows of a failed write are kept for the next flush, up to
+    MAX_PENDING_BATCHES batches; older rows are dropped beyond that.
+    Pending rows are flushed when the process exits.
+    """
+
+    def __init__(self, writer, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 name='im_livechat_ai-logs'):
+        self.writer = writer
+        self.name = name
+        self.pid = os.getpid()
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.1, float(flush_interval))
+        self._rows = []
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        # Serializes writers: the flusher thread, explicit flushes and exit
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._added = 0
+        self._written = 0
+        self._dropped = 0
+        self._flushes = 0
+        self._failures = 0
+
+    def add(self, row):
+        """Queue a row for the next batch."""
+        with self._lock:
+            if self._closed:
+                closed = True
+            else:
+                closed = False
+                self._rows.append(row)
+                self._added += 1
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._flush_loop, name=self.name, daemon=True)
+                    self._thread.start()
+                if len(self._rows) >= self.batch_size:
+                    self._cond.notify()
+        if closed:
+            # Late rows during shutdown are written directly
+            self._write([row])
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                if not self._closed and len(self._rows) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self):
+        """
+        Write all pending rows now.
+
+        Returns:
+            int: Number of rows written
+        """
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+            if not self._write(rows):
+                with self._lock:
+                    room = self.batch_size * MAX_PENDING_BATCHES - len(self._rows)
+                    kept = rows[-room:] if room > 0 else []
+                    self._dropped += len(rows) - len(kept)
+                    self._rows[:0] = kept
+                return 0
+            return len(rows)
+
+    def _write(self, rows):
+        try:
+            self.writer(rows)
+        except Exception:
+            with self._lock:
+                self._failures += 1
+            _logger.exception("Failed to write %s buffered LLM API logs", len(rows))
+            return False
+        with self._lock:
+            self._written += len(rows)
+            self._flushes += 1
+        return True
+
+    def close(self):
+        """Stop the flusher thread and write the pending rows."""
+        with self._lock:
+            self._closed = True
+            self._cond.notify_all()
+        self.flush()
+
+    def stats(self):
+        """
+        Returns:
+            dict: pending, added, written, dropped, flushes and failures
+        """
+        with self._lock:
+            return {
+                'pending': len(self._rows),
+                'added': self._added,
+                'written': self._written,
+                'dropped': self._dropped,
+                'flushes': self._flushes,
+                'failures': self._failures,
+                'batch_size': self.batch_size,
+                'flush_interval': self.flush_interval,
+            }
+
+
+_buffers = {}
+_buffers_lock = threading.Lock()
+
+
+def get_buffer(key, writer, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+    """
+    Return the process-wide buffer for ``key`` (a database name).
+
+    Buffers are recreated after a fork; rows inherited from the parent
+    process are its own to write.
+    """
+    with _buffers_lock:
+        buffer = _buffers.get(key)
+        if buffer is None or buffer.pid != os.getpid():
+            buffer = _buffers[key] = LogBuffer(writer, batch_size, flush_interval)
+        else:
+            buffer.batch_size = max(1, int(batch_size))
+            buffer.flush_interval = max(0.1, float(flush_interval))
+        return buffer
+
+
+def flush_all():
+    """Write the pending rows of every buffer of this process."""
+    with _buffers_lock:
+        buffers = [buffer for buffer in _buffers.values() if buffer.pid == os.getpid()]
+    for buffer in buffers:
+        buffer.flush()
+
+
+@atexit.register
+def _close_all():
+    with _buffers_lock:
+        buffers = [buffer for buffer in _buffers.values() if buffer.pid == os.getpid()]
+    for buffer in buffers:
+        buffer.close()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import zlib
+
+# Blobs smaller than this are stored as is
+COMPRESS_MIN_SIZE = 256
+COMPRESS_LEVEL = 6
+# Hex digits of sha256 kept as blob key (128 bits)
+KEY_LENGTH = 32
+
+
+def blob_key(data):
+    return hashlib.sha256(data).hexdigest()[:KEY_LENGTH]
+
+
+def pack(data):
+    """
+    Returns:
+        tuple: (compressed, content); content is zlib-compressed only
+            when that makes it smaller
+    """
+    if len(data) >= COMPRESS_MIN_SIZE:
+        compressed = zlib.compress(data, COMPRESS_LEVEL)
+        if len(compressed) < len(data):
+            return True, compressed
+    return False, data
+
+
+def unpack(compressed, content):
+    content = bytes(content)
+    return zlib.decompress(content) if compressed else content
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, default=str).encode()
+
+
+def split(payload):
+    """
+    Cut a payload into content-addressed blobs.
+
+    A list payload (the messages array of a request) is stored as one
+    blob per item, so the system prompt and the history messages are
+    shared by all calls of a conversation and by their retries. Its
+    reference lists the item keys as '[key1,key2,...]'; any other
+    payload is a single blob referenced by its key.
+
+    Args:
+        payload (list|dict|str|None): The payload, or its JSON text
+
+    Returns:
+        tuple: (reference or None, {key: bytes})
+    """
+    if not payload:
+        return None, {}
+    if isinstance(payload, str):
+        try:
+            value = json.loads(payload)
+        except ValueError:
+            value = None
+        if not isinstance(value, list):
+            data = payload.encode()
+            key = blob_key(data)
+            return key, {key: data}
+        payload = value
+    if isinstance(payload, list):
+        blobs = {}
+        keys = []
+        for item in payload:
+            data = _dumps(item)
+            key = blob_key(data)
+            blobs[key] = data
+            keys.append(key)
+        return '[%s]' % ','.join(keys), blobs
+    data = _dumps(payload)
+    key = blob_key(data)
+    return key, {key: data}
+
+
+def reference_keys(reference):
+    """Blob keys used by a reference."""
+    if not reference:
+        return []
+    if reference.startswith('['):
+        return [key for key in reference[1:-1].split(',') if key]
+    return [reference]
+
+
+def join(reference, blobs):
+    """
+    Rebuild the JSON text of a payload from its blobs.
+
+    Returns:
+        str|bool: The payload text, False if a blob is missing
+    """
+    keys = reference_keys(reference)
+    if any(key not in blobs for key in keys):
+        return False
+    if reference.startswith('['):
+        return '[%s]' % ', '.join(blobs[key].decode() for key in keys)
+    return blobs[reference].decode()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+
+from . import tokenizer
+
+# Calls that would have to wait longer than this for their turn fail instead
+MAX_QUEUE_WAIT = 60.0
+
+
+def key_hash(api_key):
+    """Identify an API key without storing it."""
+    return hashlib.sha256((api_key or '').encode()).hexdigest()
+
+
+def key_hint(api_key):
+    """Recognizable but harmless form of an API key, e.g. 'sk-...c3d4'."""
+    api_key = api_key or ''
+    if len(api_key) <= 8:
+        return '...'
+    return '%s...%s' % (api_key[:3], api_key[-4:])
+
+
+def estimate_tokens(config, messages):
+    """
+    Tokens a call may use: the prompt plus the maximum reply length.
+
+    The estimate is reserved before the call and the unused part is
+    given back once the provider reports the actual usage.
+    """
+    counter = tokenizer.get_tokenizer(config.get('model'))
+    prompt = sum(tokenizer.count_message_tokens(counter, message) for message in messages)
+    return prompt + tokenizer.REPLY_OVERHEAD + (config.get('max_tokens') or 0)
+
+
+def compute_wait(request_level, token_level, rpm_limit, tpm_limit):
+    """
+    Seconds until a reservation is covered by the refilling buckets.
+
+    Reservations are taken immediately, letting the bucket levels go
+    negative; a caller then waits until the refill pays its share back.
+    Concurrent callers are thereby spaced evenly instead of all being
+    rejected and retrying at once.
+    """
+    wait = 0.0
+    if rpm_limit and request_level < 0:
+        wait = max(wait, -request_level * 60.0 / rpm_limit)
+    if tpm_limit and token_level < 0:
+        wait = max(wait, -token_level * 60.0 / tpm_limit)
+    return wait
+
+
+def fill_level(level, limit, elapsed):
+    """Bucket level after ``elapsed`` seconds of refill, as a share of its capacity."""
+    if not limit:
+        return 1.0
+    return max(0.0, min(limit, level + elapsed * limit / 60.0)) / limit
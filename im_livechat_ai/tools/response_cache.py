@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_TTL = 3600
+DEFAULT_TURNS = 3
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """Case- and whitespace-insensitive form of a message."""
+    return _WHITESPACE_RE.sub(' ', (text or '').strip().lower())
+
+
+def make_cache_key(config, messages, turns=DEFAULT_TURNS):
+    """
+    Hash what determines a reply: system messages, model, temperature
+    and the last ``turns`` conversation messages.
+
+    Args:
+        config (dict): Settings returned by _get_llm_request_config
+        messages (list): The messages array sent to the LLM
+        turns (int): Number of trailing user/assistant messages to include
+
+    Returns:
+        str: Hex digest usable as cache key
+    """
+    system = [normalize_text(m['content']) for m in messages if m.get('role') == 'system']
+    conversation = [m for m in messages if m.get('role') != 'system']
+    tail = [(m.get('role'), normalize_text(m.get('content'))) for m in conversation[-max(1, turns):]]
+    payload = json.dumps({
+        'model': config.get('model'),
+        'temperature': config.get('temperature'),
+        'system': system,
+        'turns': tail,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of LLM replies with a per-entry TTL.
+
+    Expired entries are dropped when they are looked up; the least
+    recently used entries are evicted beyond ``max_entries``.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, clock=time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Returns:
+            str|None: The cached reply, or None on a miss
+        """
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[1] <= self._clock():
+                del self._entries[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, reply, ttl=DEFAULT_TTL):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (reply, self._clock() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+response_cache = ResponseCache()
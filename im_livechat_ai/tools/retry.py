@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+import collections
+import email.utils
+import random
+import threading
+import time
+
+# Client errors that will fail the same way however often they are sent
+NON_RETRYABLE_STATUS = frozenset({400, 401, 403, 404, 405, 413, 422})
+# Transient statuses: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS = frozenset({408, 409, 425, 429})
+
+DEFAULT_MAX_DELAY = 60.0
+DEFAULT_MAX_RETRY_AFTER = 120.0
+DEFAULT_BUDGET_RATIO = 0.2
+DEFAULT_BUDGET_MIN_RETRIES = 10
+DEFAULT_BUDGET_WINDOW = 60.0
+
+
+def get_status_code(error):
+    """Return the HTTP status of a requests error, or None."""
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error):
+    """
+    Whether an LLM call that raised ``error`` may succeed if sent again.
+
+    Network errors, timeouts, invalid or empty responses, rate limits and
+    server errors are retryable; authentication and request errors are not.
+    """
+    status = get_status_code(error)
+    if status is None:
+        return True
+    if status in NON_RETRYABLE_STATUS:
+        return False
+    return status in RETRYABLE_STATUS or status >= 500
+
+
+def parse_retry_after(error, now=None):
+    """
+    Read the Retry-After header of an HTTP error.
+
+    Both forms of the header are supported: a number of seconds and an
+    HTTP date.
+
+    Returns:
+        float|None: Seconds to wait, or None if the header is absent or invalid
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('Retry-After')
+    if not isinstance(value, str) or not value.strip():
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, retry_at.timestamp() - now)
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter.
+
+    The n-th retry waits a random time between 0 and
+    ``min(max_delay, base_delay * multiplier ** n)``, so that clients hit
+    by the same outage spread their retries instead of retrying in
+    lockstep. A Retry-After header sent by the provider takes precedence,
+    bounded by ``max_retry_after``.
+    """
+
+    def __init__(self, base_delay, max_delay=DEFAULT_MAX_DELAY, multiplier=2.0,
+                 max_retry_after=DEFAULT_MAX_RETRY_AFTER, rand=random.random):
+        self.base_delay = max(0.0, float(base_delay))
+        self.max_delay = max(self.base_delay, float(max_delay))
+        self.multiplier = multiplier
+        self.max_retry_after = max_retry_after
+        self._rand = rand
+
+    def should_retry(self, error):
+        return is_retryable(error)
+
+    def compute_delay(self, retry_number, error=None):
+        """
+        Args:
+            retry_number (int): 0 for the first retry, 1 for the second...
+            error (Exception|None): The error that caused the retry
+
+        Returns:
+            float: Seconds to wait before the retry
+        """
+        retry_after = parse_retry_after(error) if error is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        ceiling = min(self.max_delay, self.base_delay * self.multiplier ** retry_number)
+        return self._rand() * ceiling
+
+
+class RetryBudget:
+    """
+    Cap retries to a fraction of the requests sent in a sliding window.
+
+    Every call counts as a request; a retry is only allowed while retries
+    in the window stay below ``max(min_retries, ratio * requests)``. During
+    an outage this turns a flood of retries (max_retries times the normal
+    load) into a bounded overhead, while isolated failures are still
+    retried.
+    """
+
+    def __init__(self, ratio=DEFAULT_BUDGET_RATIO, min_retries=DEFAULT_BUDGET_MIN_RETRIES,
+                 window=DEFAULT_BUDGET_WINDOW, clock=time.monotonic):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._clock = clock
+        self._requests = collections.deque()
+        self._retries = collections.deque()
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        for events in (self._requests, self._retries):
+            while events and events[0] <= now - self.window:
+                events.popleft()
+
+    def record_request(self):
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            self._requests.append(now)
+
+    def try_acquire_retry(self):
+        """
+        Returns:
+            bool: True if the retry fits in the budget (and is counted)
+        """
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            allowed = max(self.min_retries, self.ratio * len(self._requests))
+            if len(self._retries) >= allowed:
+                return False
+            self._retries.append(now)
+            return True
+
+    def stats(self):
+        with self._lock:
+            self._expire(self._clock())
+            return {'requests': len(self._requests), 'retries': len(self._retries)}
+
+
+_budgets = {}
+_budgets_lock = threading.Lock()
+
+
+def get_retry_budget(channel_id, ratio=DEFAULT_BUDGET_RATIO):
+    """Return the retry budget shared by all replies of a livechat channel in this process."""
+    with _budgets_lock:
+        budget = _budgets.get(channel_id)
+        if budget is None:
+            budget = _budgets[channel_id] = RetryBudget(ratio=ratio)
+        budget.ratio = ratio
+        return budget
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import io
+import json
+import logging
+import re
+import threading
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .response_cache import normalize_text
+from .tokenizer import _WIDE_CHAR_RE
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_THRESHOLD = 0.9
+# Minimum delay between two saves of a channel's cache to the filestore
+SAVE_INTERVAL = 30.0
+# A new question this close to a stored one replaces its answer
+DUPLICATE_THRESHOLD = 0.99
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def is_available():
+    """The semantic cache stores its vectors in NumPy arrays."""
+    return numpy is not None
+
+
+class HashingEmbedder:
+    """
+    Deterministic bag-of-features embedder that needs no model or network.
+
+    Words, word bigrams and character trigrams are hashed into a fixed
+    number of signed buckets, so paraphrases sharing most of their words
+    or word stems land close to each other. CJK text is split into
+    characters and character bigrams since it has no spaces.
+    """
+    name = 'hashing'
+
+    def __init__(self, dim=512):
+        self.dim = dim
+
+    def _features(self, text):
+        text = normalize_text(text)
+        words = []
+        for word in _WORD_RE.findall(text):
+            if _WIDE_CHAR_RE.search(word):
+                words.extend(word)
+            else:
+                words.append(word)
+        features = list(words)
+        features.extend('%s %s' % pair for pair in zip(words, words[1:]))
+        for word in words:
+            if len(word) > 3:
+                padded = '<%s>' % word
+                features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, text):
+        """
+        Returns:
+            numpy.ndarray: L2-normalized float32 vector of length dim
+        """
+        vector = numpy.zeros(self.dim, dtype=numpy.float32)
+        for feature in self._features(text):
+            digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'big')
+            vector[digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norm = numpy.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+_embedders = {'hashing': ('Local hashing (offline)', HashingEmbedder)}
+_embedder_instances = {}
+_embedders_lock = threading.Lock()
+
+
+def register_embedder(name, label, factory):
+    """
+    Register an embedding backend selectable on livechat channels.
+
+    Args:
+        name (str): Technical name stored on the channel
+        label (str): Name shown in the channel form
+        factory (callable): Returns an object with a ``name``, a ``dim``
+            and ``embed(text)`` returning a 1-D NumPy vector
+    """
+    with _embedders_lock:
+        _embedders[name] = (label, factory)
+        _embedder_instances.pop(name, None)
+
+
+def get_embedder_selection():
+    return [(name, label) for name, (label, _factory) in _embedders.items()]
+
+
+def get_embedder(name):
+    """Return the shared instance of an embedding backend."""
+    with _embedders_lock:
+        if name not in _embedder_instances:
+            _label, factory = _embedders.get(name) or _embedders['hashing']
+            _embedder_instances[name] = factory()
+        return _embedder_instances[name]
+
+
+class SemanticCache:
+    """
+    Question/answer pairs of one livechat channel with their embeddings.
+
+    Vectors are rows of a single matrix so a lookup is one matrix-vector
+    product; they are L2-normalized, which makes the product the cosine
+    similarity. The oldest pairs are dropped beyond ``max_entries``.
+
+    Pairs added since the last save are also kept aside, so that they can
+    be merged into a newer version saved by another worker (see rebase).
+    """
+
+    def __init__(self, embedder_name, dim, max_entries=DEFAULT_MAX_ENTRIES, clock=time.monotonic):
+        self.embedder_name = embedder_name
+        self.dim = dim
+        self.max_entries = max_entries
+        self._clock = clock
+        self._vectors = numpy.zeros((0, dim), dtype=numpy.float32)
+        self._questions = []
+        self._answers = []
+        self._lock = threading.Lock()
+        self._version = 0
+        self._unsaved = []
+        self._saved_version = 0
+        self._saved_at = None
+        self.checksum = None
+
+    def __len__(self):
+        return len(self._answers)
+
+    def _best_match(self, vector):
+        if not self._answers:
+            return -1, 0.0
+        scores = self._vectors @ vector
+        index = int(numpy.argmax(scores))
+        return index, float(scores[index])
+
+    def lookup(self, vector, threshold=DEFAULT_THRESHOLD):
+        """
+        Returns:
+            tuple: (answer, question, score) of the most similar stored
+                question, or (None, None, score) below the threshold
+        """
+        with self._lock:
+            index, score = self._best_match(vector)
+            if index < 0 or score < threshold:
+                return None, None, score
+            return self._answers[index], self._questions[index], score
+
+    def add(self, question, answer, vector):
+        with self._lock:
+            self._insert(question, answer, vector)
+            self._version += 1
+            self._unsaved.append((self._version, question, answer, vector))
+
+    def _insert(self, question, answer, vector):
+        index, score = self._best_match(vector)
+        if index >= 0 and score >= DUPLICATE_THRESHOLD:
+            self._questions[index] = question
+            self._answers[index] = answer
+        else:
+            self._vectors = numpy.vstack([self._vectors, vector.astype(numpy.float32)[None, :]])
+            self._questions.append(question)
+            self._answers.append(answer)
+            if len(self._answers) > self.max_entries:
+                excess = len(self._answers) - self.max_entries
+                self._vectors = self._vectors[excess:]
+                del self._questions[:excess]
+                del self._answers[:excess]
+
+    def rebase(self, stored, checksum):
+        """
+        Replace the saved pairs by those of a newer stored version, then
+        add back the pairs not saved yet.
+
+        Args:
+            stored (SemanticCache|None): The stored version (None: no
+                readable stored version)
+            checksum (str|None): Checksum of the stored version
+        """
+        with self._lock:
+            if stored is None:
+                self._vectors = numpy.zeros((0, self.dim), dtype=numpy.float32)
+                self._questions = []
+                self._answers = []
+            else:
+                self._vectors = stored._vectors
+                self._questions = list(stored._questions)
+                self._answers = list(stored._answers)
+            for _version, question, answer, vector in self._unsaved:
+                self._insert(question, answer, vector)
+            self.checksum = checksum
+
+    @property
+    def dirty(self):
+        return self._version != self._saved_version
+
+    def should_save(self):
+        """Whether unsaved pairs exist and the last save is old enough."""
+        with self._lock:
+            return self.dirty and (self._saved_at is None or self._clock() - self._saved_at >= SAVE_INTERVAL)
+
+    def dumps(self):
+        """
+        Returns:
+            tuple: (version, bytes): the compressed .npz payload and the
+                version to pass to mark_saved once it is stored
+        """
+        with self._lock:
+            buffer = io.BytesIO()
+            numpy.savez_compressed(
+                buffer,
+                vectors=self._vectors,
+                meta=numpy.frombuffer(json.dumps({
+                    'embedder': self.embedder_name,
+                    'questions': self._questions,
+                    'answers': self._answers,
+                }).encode(), dtype=numpy.uint8),
+            )
+            return self._version, buffer.getvalue()
+
+    def mark_saved(self, version, checksum):
+        with self._lock:
+            self._unsaved = [pair for pair in self._unsaved if pair[0] > version]
+            self._saved_version = version
+            self._saved_at = self._clock()
+            self.checksum = checksum
+
+    @classmethod
+    def loads(cls, data, embedder, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Rebuild a cache saved by dumps.
+
+        Returns:
+            SemanticCache|None: None if the data is unreadable or was
+                computed by another embedder
+        """
+        try:
+            with numpy.load(io.BytesIO(data)) as archive:
+                vectors = archive['vectors']
+                meta = json.loads(archive['meta'].tobytes().decode())
+        except Exception as e:
+            _logger.warning("Unreadable semantic cache discarded: %s", e)
+            return None
+        if meta.get('embedder') != embedder.name or vectors.shape[1:] != (embedder.dim,):
+            return None
+        cache = cls(embedder.name, embedder.dim, max_entries=max_entries)
+        cache._vectors = vectors.astype(numpy.float32)[-max_entries:]
+        cache._questions = list(meta['questions'])[-max_entries:]
+        cache._answers = list(meta['answers'])[-max_entries:]
+        return cache
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(channel_id, embedder):
+    """Return the process cache of a channel, empty if none was loaded."""
+    with _caches_lock:
+        cache = _caches.get(channel_id)
+        if cache is None or cache.embedder_name != embedder.name or cache.dim != embedder.dim:
+            cache = _caches[channel_id] = SemanticCache(embedder.name, embedder.dim)
+        return cache
+
+
+def set_cache(channel_id, cache):
+    with _caches_lock:
+        _caches[channel_id] = cache
+
+
+def drop_cache(channel_id=None):
+    with _caches_lock:
+        if channel_id is None:
+            _caches.clear()
+        else:
+            _caches.pop(channel_id, None)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Minimum delay between two updates of a streamed message
+STREAM_UPDATE_INTERVAL = 0.5
+# Body of the bot message posted as soon as the provider starts streaming
+STREAM_PLACEHOLDER = '…'
+
+_THINK_OPEN = '<think>'
+_THINK_CLOSE = '</think>'
+
+
+def iter_sse_events(lines):
+    """
+    Parse a server-sent events stream of chat completion chunks.
+
+    Args:
+        lines (iterable): Decoded lines of the HTTP response body
+
+    Yields:
+        dict: The JSON payload of each ``data:`` event, until ``[DONE]``
+    """
+    for line in lines:
+        if not line or not line.startswith('data:'):
+            # Blank separators, comments (": keep-alive") and other fields
+            continue
+        data = line[len('data:'):].strip()
+        if data == '[DONE]':
+            return
+        try:
+            yield json.loads(data)
+        except ValueError:
+            _logger.warning("Ignoring malformed SSE event from LLM API: %s", data[:200])
+
+
+def _partial_tag_length(text, tag):
+    """Length of the longest suffix of text that is a proper prefix of tag."""
+    for length in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:length]):
+            return length
+    return 0
+
+
+class ThinkTagFilter:
+    """
+    Incremental counterpart of ImLivechatChannel._strip_think_tags.
+
+    Feed it the raw chunks of a streamed reply and it returns only the
+    text outside of <think>...</think> blocks. A tag split across chunks
+    is held back until it can be decided, so reasoning never leaks, and
+    an unterminated <think> block hides everything after it.
+    """
+
+    def __init__(self):
+        self._pending = ''
+        self._inside = False
+
+    def feed(self, chunk):
+        """
+        Args:
+            chunk (str): Next raw piece of the reply
+
+        Returns:
+            str: Newly visible text (may be empty)
+        """
+        self._pending += chunk
+        visible = []
+        while self._pending:
+            if self._inside:
+                end = self._pending.find(_THINK_CLOSE)
+                if end == -1:
+                    keep = _partial_tag_length(self._pending, _THINK_CLOSE)
+                    self._pending = self._pending[len(self._pending) - keep:] if keep else ''
+                    break
+                self._pending = self._pending[end + len(_THINK_CLOSE):]
+                self._inside = False
+            else:
+                start = self._pending.find(_THINK_OPEN)
+                if start == -1:
+                    keep = _partial_tag_length(self._pending, _THINK_OPEN)
+                    visible.append(self._pending[:len(self._pending) - keep])
+                    self._pending = self._pending[len(self._pending) - keep:]
+                    break
+                visible.append(self._pending[:start])
+                self._pending = self._pending[start + len(_THINK_OPEN):]
+                self._inside = True
+        return ''.join(visible)
+
+    def flush(self):
+        """Return held-back text that turned out not to be a tag."""
+        pending, self._pending = self._pending, ''
+        return '' if self._inside else pending
+
+
+class ThrottledPublisher:
+    """
+    Forward the growing text of a streamed reply at most every ``interval`` seconds.
+
+    The first call is always forwarded (it creates the placeholder
+    message); unchanged text is never forwarded twice.
+    """
+
+    def __init__(self, publish, interval=None, clock=time.monotonic):
+        self._publish = publish
+        self._interval = STREAM_UPDATE_INTERVAL if interval is None else interval
+        self._clock = clock
+        self._last_emit = None
+        self._last_text = None
+
+    def __call__(self, text):
+        text = (text or '').strip()
+        if text == self._last_text:
+            return
+        now = self._clock()
+        if self._last_emit is not None and now - self._last_emit < self._interval:
+            return
+        self._last_emit = now
+        self._last_text = text
+        self._publish(text)
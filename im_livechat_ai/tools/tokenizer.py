@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+import functools
+import logging
+import math
+import re
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_logger = logging.getLogger(__name__)
+
+# Tokens added by the chat format around every message (role, separators)
+MESSAGE_OVERHEAD = 4
+# Tokens priming the assistant reply
+REPLY_OVERHEAD = 3
+
+# CJK ideographs, kana and hangul are roughly one token per character
+_WIDE_CHAR_RE = re.compile(r'[\u1100-\u11ff\u2e80-\u9fff\ua960-\ua97f\uac00-\ud7ff\uf900-\ufaff\uff00-\uffef]')
+
+
+class HeuristicTokenizer:
+    """
+    Dependency-free token estimator.
+
+    Counts about one token per CJK character and one per four characters
+    of other text, which slightly overestimates BPE tokenizers on prose;
+    overestimating keeps the prompt safely inside the context window.
+    """
+    name = 'heuristic'
+
+    def count(self, text):
+        if not text:
+            return 0
+        wide = len(_WIDE_CHAR_RE.findall(text))
+        return wide + math.ceil((len(text) - wide) / 4)
+
+    def truncate(self, text, max_tokens):
+        """Return the longest prefix of text estimated at max_tokens or less."""
+        if self.count(text) <= max_tokens:
+            return text
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low]
+
+
+class TiktokenTokenizer:
+    """Exact counts for OpenAI-style BPE vocabularies (requires tiktoken)."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.name = encoding.name
+
+    def count(self, text):
+        return len(self.encoding.encode(text or '', disallowed_special=()))
+
+    def truncate(self, text, max_tokens):
+        tokens = self.encoding.encode(text or '', disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return self.encoding.decode(tokens[:max(0, max_tokens)])
+
+
+_factories = []
+
+
+def register_tokenizer(factory):
+    """
+    Register a tokenizer factory, tried before the built-in ones.
+
+    Args:
+        factory (callable): Called with the model name, returns an object
+            with ``count(text)`` and ``truncate(text, max_tokens)``, or
+            None if it does not handle that model
+    """
+    _factories.insert(0, factory)
+    get_tokenizer.cache_clear()
+
+
+def _tiktoken_factory(model):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding('cl100k_base')
+    except Exception as e:
+        # Encodings are downloaded on first use; offline servers fall back
+        _logger.info("tiktoken unavailable for model %s (%s), estimating tokens", model, e)
+        return None
+    return TiktokenTokenizer(encoding)
+
+
+@functools.lru_cache(maxsize=64)
+def get_tokenizer(model):
+    """Return the tokenizer to use for a model name."""
+    for factory in _factories + [_tiktoken_factory]:
+        tokenizer = factory(model or '')
+        if tokenizer is not None:
+            return tokenizer
+    return HeuristicTokenizer()
+
+
+def count_message_tokens(tokenizer, message):
+    """Tokens taken by one chat message, including the format overhead."""
+    return MESSAGE_OVERHEAD + tokenizer.count(message.get('content') or '')
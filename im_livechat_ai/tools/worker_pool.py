@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+POLICY_REJECT = 'reject'
+POLICY_BLOCK = 'block'
+QUEUE_POLICIES = (POLICY_REJECT, POLICY_BLOCK)
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_QUEUE = 100
+DEFAULT_BLOCK_TIMEOUT = 2.0
+
+
+class AIWorkerPool:
+    """
+    Bounded thread pool running AI jobs for the current process.
+
+    Jobs wait in a FIFO queue of at most ``max_queue`` entries and are
+    executed by at most ``max_workers`` daemon threads, which are started
+    lazily as load requires. When the queue is full, the ``policy`` decides
+    what happens to a new job:
+
+    - ``reject``: the job is refused immediately (load shedding).
+    - ``block``: the caller waits up to ``block_timeout`` seconds for a
+      free slot (backpressure), then the job is refused.
+
+    Refused jobs are counted in the ``rejected`` statistic and ``submit``
+    returns False so the caller can apply its own fallback.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_queue=DEFAULT_MAX_QUEUE,
+                 policy=POLICY_REJECT, block_timeout=DEFAULT_BLOCK_TIMEOUT,
+                 name='im_livechat_ai'):
+        self.name = name
+        self.pid = os.getpid()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._active = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._closed = False
+        self._timers = []
+        self._timer_seq = itertools.count()
+        self._timer_cond = threading.Condition(self._lock)
+        self._timer_thread = None
+        self.configure(max_workers, max_queue, policy, block_timeout)
+
+    def configure(self, max_workers, max_queue, policy=POLICY_REJECT,
+                  block_timeout=DEFAULT_BLOCK_TIMEOUT):
+        """Update the pool limits; running jobs are not affected."""
+        if policy not in QUEUE_POLICIES:
+            _logger.warning("Unknown AI worker queue policy %r, using %r", policy, POLICY_REJECT)
+            policy = POLICY_REJECT
+        with self._lock:
+            self.max_workers = max(1, int(max_workers))
+            self.policy = policy
+            self.block_timeout = max(0.0, float(block_timeout))
+            with self._queue.mutex:
+                self._queue.maxsize = max(1, int(max_queue))
+                self._queue.not_full.notify_all()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queue ``fn(*args, **kwargs)`` for execution by a worker thread.
+
+        Returns:
+            bool: True if the job was queued, False if it was rejected
+        """
+        with self._lock:
+            if self._closed:
+                self._rejected += 1
+                return False
+        try:
+            if self.policy == POLICY_BLOCK:
+                self._queue.put((fn, args, kwargs), timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait((fn, args, kwargs))
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            _logger.warning(
+                "AI worker pool %s is saturated, job rejected (%s)",
+                self.name, self.format_stats(),
+            )
+            return False
+
+        with self._lock:
+            self._submitted += 1
+            self._spawn_worker_if_needed()
+        return True
+
+    def schedule(self, delay, fn, *args, **kwargs):
+        """
+        Submit ``fn(*args, **kwargs)`` once ``delay`` seconds have elapsed.
+
+        Delayed jobs are kept in a heap served by a single timer thread,
+        so scheduling does not cost a thread per job. The queue policy
+        applies when the job becomes due.
+        """
+        if delay <= 0:
+            return self.submit(fn, *args, **kwargs)
+        with self._lock:
+            if self._closed:
+                self._rejected += 1
+                return False
+            heapq.heappush(self._timers, (time.monotonic() + delay, next(self._timer_seq), fn, args, kwargs))
+            if self._timer_thread is None or not self._timer_thread.is_alive():
+                self._timer_thread = threading.Thread(
+                    target=self._timer_loop, name='%s-timer' % self.name, daemon=True,
+                )
+                self._timer_thread.start()
+            self._timer_cond.notify()
+        return True
+
+    def _timer_loop(self):
+        while True:
+            with self._lock:
+                while not self._closed and (
+                        not self._timers or self._timers[0][0] > time.monotonic()):
+                    timeout = self._timers[0][0] - time.monotonic() if self._timers else None
+                    self._timer_cond.wait(timeout)
+                if self._closed:
+                    return
+                _due, _seq, fn, args, kwargs = heapq.heappop(self._timers)
+            self.submit(fn, *args, **kwargs)
+
+    def _spawn_worker_if_needed(self):
+        """Start one more worker if queued jobs outnumber idle threads."""
+        self._threads = [t for t in self._threads if t.is_alive()]
+        idle = len(self._threads) - self._active
+        if self._queue.qsize() > idle and len(self._threads) < self.max_workers:
+            thread = threading.Thread(
+                target=self._worker_loop,
+                name='%s-worker-%d' % (self.name, len(self._threads) + 1),
+                daemon=True,
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    def _worker_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            fn, args, kwargs = item
+            with self._lock:
+                self._active += 1
+            try:
+                fn(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self._failed += 1
+                _logger.exception("Unhandled error in AI worker job")
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+                self._queue.task_done()
+            with self._lock:
+                # Shrink back when the pool was reconfigured with fewer workers
+                if len([t for t in self._threads if t.is_alive()]) > self.max_workers:
+                    self._threads.remove(threading.current_thread())
+                    return
+
+    def stats(self):
+        """
+        Return a snapshot of the pool counters.
+
+        Returns:
+            dict: workers, active, queued, submitted, completed, failed,
+                rejected and the configured limits
+        """
+        with self._lock:
+            return {
+                'workers': len([t for t in self._threads if t.is_alive()]),
+                'active': self._active,
+                'queued': self._queue.qsize(),
+                'scheduled': len(self._timers),
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'max_workers': self.max_workers,
+                'max_queue': self._queue.maxsize,
+                'policy': self.policy,
+            }
+
+    def format_stats(self):
+        stats = self.stats()
+        return 'active=%(active)s/%(max_workers)s queued=%(queued)s/%(max_queue)s rejected=%(rejected)s' % stats
+
+    def shutdown(self, wait=True, timeout=None):
+        """Stop accepting jobs and let workers exit once the queue is drained."""
+        with self._lock:
+            self._closed = True
+            threads = list(self._threads)
+            self._timers.clear()
+            self._timer_cond.notify_all()
+        for _thread in threads:
+            # Sentinels bypass maxsize so shutdown never blocks on a full queue
+            with self._queue.mutex:
+                self._queue.queue.append(None)
+                self._queue.unfinished_tasks += 1
+                self._queue.not_empty.notify()
+        if wait:
+            for thread in threads:
+                thread.join(timeout)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool(max_workers=DEFAULT_MAX_WORKERS, max_queue=DEFAULT_MAX_QUEUE,
+                    policy=POLICY_REJECT, block_timeout=DEFAULT_BLOCK_TIMEOUT):
+    """
+    Return the process-wide AI worker pool, creating it on first use.
+
+    The pool is recreated after a fork (prefork workers do not inherit
+    the parent's threads) and reconfigured when the limits change.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = AIWorkerPool(max_workers, max_queue, policy, block_timeout)
+        # Compare normalized limits: configure() warns about an unknown
+        # policy once, not on every call with the same settings
+        elif (_pool.max_workers, _pool._queue.maxsize, _pool.policy, _pool.block_timeout) != (
+                max(1, int(max_workers)), max(1, int(max_queue)),
+                policy if policy in QUEUE_POLICIES else POLICY_REJECT,
+                max(0.0, float(block_timeout))):
+            _pool.configure(max_workers, max_queue, policy, block_timeout)
+        return _pool